@@ -1,9 +1,19 @@
+from typing import Callable, Dict, Optional
+
 from app.gcs_handler import GCSHandler
 from app.anymarket.auth import AnymarketAuth
 from app.anymarket.extract import ExtratorAnymarket
 
-def executar_pipeline(bucket_name: str) -> int:
+# Endpoint -> pasta da partição no raw (usado para checar partições completas)
+PASTAS = {
+    "pedidos": "orders",
+}
+
+def listar_tarefas(bucket_name: str, data_alvo: Optional[str] = None) -> Dict[str, Callable[[], int]]:
+    """Endpoints independentes do pipeline, para execução em paralelo."""
     gcs = GCSHandler(bucket_name)
     auth = AnymarketAuth(gcs)
-    extractor = ExtratorAnymarket(auth, gcs)
-    return extractor.executar_pipeline_diario()
+    extractor = ExtratorAnymarket(auth, gcs, data_alvo)
+    return {
+        "pedidos": extractor.extrair_pedidos,
+    }
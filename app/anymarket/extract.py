@@ -1,149 +1,299 @@
 # app/anymarket/extractor.py
 import requests
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
 from app.config import Config
-from app.gcs_handler import logger
+from app.checkpoint import ExtracaoCheckpointada
+from app.gcs_handler import logger, obter_bucket
+from app.http_cache import obter_cache_respostas, ttl_cache
+from app.http_client import obter_sessao
+from app.metrics import PAGINAS, REGISTROS
+from app.profiling import cronometria_atual, medir, propagar
+from app.rate_limiter import obter_limitador
+from app.writer import obter_formato, salvar_registros
 from .auth import AnymarketAuth
-import json
+from .normalize import carregar_json, normalizar_chaves, normalizar_pares
 
 class ExtratorAnymarket:
     URL_BASE = "https://api.anymarket.com.br/v2"
-    
+    LIMITE_POR_PAGINA = 100
+    MAX_TENTATIVAS_RATE_LIMIT = 10
 
-    def __init__(self, servico_autenticacao, manipulador_gcs):
+    def __init__(self, servico_autenticacao, manipulador_gcs, data_alvo: Optional[str] = None):
         self.auth = servico_autenticacao
         self.gcs = manipulador_gcs
-        # Data D-1 (Ontem)
-        self.data_alvo = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        # Data D-1 (Ontem) por padrão; o backfill informa a data explicitamente
+        self.data_alvo = data_alvo or (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        # Token bucket compartilhado por todas as threads que chamam o AnyMarket
+        self.limitador = obter_limitador("anymarket")
+        # Sessão com pool de conexões e retries de transporte (keep-alive)
+        self.sessao = obter_sessao("anymarket")
 
-        from google.cloud import storage
-        client = storage.Client()
-        self.bucket = client.bucket(Config.BUCKET_NAME)
+        # Mesmo cliente e bucket do GCSHandler (fábrica única do processo)
+        self.bucket = obter_bucket(Config.BUCKET_NAME)
 
-    def _buscar_todas_paginas(self, endpoint: str, parametros: Dict[str, Any]) -> List[Dict]:
+    def _ttl_cache(self, url: str, parametros: Dict[str, Any]) -> float:
         """
-        MÉTODO MOTOR (Adaptado para OFFSET):
-        Diferente do Bling (pagina 1, 2...), o AnyMarket usa offset (0, 100, 200...).
+        Validade no cache de respostas de uma página de `url` (endpoint
+        relativo a URL_BASE). Só consulta limitada dos dois lados
+        (createdAfter e createdBefore) conta como um dia que pode fechar.
         """
-        offset = 0
-        limite = 100
-        dados_coletados = []
-        url = f"{self.URL_BASE}/{endpoint}"
-        
-        cabecalhos = self.auth.obter_cabecalhos()
-        
-        logger.info(f"Iniciando extração AnyMarket: {endpoint} | Offset Inicial: {offset}")
+        limitada = "createdAfter" in parametros and "createdBefore" in parametros
+        return ttl_cache(url[len(self.URL_BASE) + 1:], self.data_alvo if limitada else None)
 
-        while True:
-            # Atualiza os parâmetros de paginação
-            parametros["limit"] = limite
-            parametros["offset"] = offset
+    def _buscar_pagina(self, url: str, cabecalhos: Dict[str, str], parametros: Dict[str, Any], offset: int, limite: int) -> List[Dict]:
+        """
+        Busca uma única página (offset). Retorna a lista de itens (vazia no
+        fim da paginação). Recusa da API e falhas de rede que sobrevivem aos
+        retries da sessão são propagadas.
+        O ritmo vem do limitador de taxa compartilhado; 429 é repetido com
+        backoff até MAX_TENTATIVAS_RATE_LIMIT.
+        """
+        # Cópia própria: várias páginas podem estar em voo ao mesmo tempo
+        parametros = dict(parametros, limit=limite, offset=offset)
 
+        # Página já baixada numa execução anterior: sem limitador nem API
+        cache = obter_cache_respostas()
+        corpo = cache.ler("anymarket", url, parametros) if cache else None
+        if corpo is not None:
+            payload = carregar_json(corpo)
+            return payload.get("content") or payload.get("data", [])
+
+        for tentativa in range(self.MAX_TENTATIVAS_RATE_LIMIT + 1):
             try:
-                resposta = requests.get(url, headers=cabecalhos, params=parametros, timeout=30)
-                
+                self.limitador.adquirir()
+                # Timeout (conexão, leitura); falhas de rede e 5xx já são repetidas pela sessão
+                with medir("anymarket.http"):
+                    resposta = self.sessao.get(url, headers=cabecalhos, params=parametros, timeout=Config.HTTP_TIMEOUT)
+
+                if resposta.status_code == 429:
+                    self.limitador.registrar_limite(resposta.headers, tentativa)
+                    continue
+
                 if resposta.status_code != 200:
                     logger.error(f"Erro API AnyMarket ({resposta.status_code}): {resposta.text}")
-                    break
+                    # Só página 200 vazia é fim dos dados; gravar o resto truncaria o dia
+                    raise RuntimeError(f"Erro {resposta.status_code} no AnyMarket (offset {offset})")
+
+                self.limitador.registrar_sucesso(resposta.headers)
 
-                # AnyMarket retorna os dados dentro de 'content' ou 'data' dependendo do endpoint
-                payload = resposta.json()
+                # AnyMarket retorna os dados dentro de 'content' ou 'data' dependendo do endpoint.
+                # As chaves já saem normalizadas do decoder (sem cópia posterior do registro)
+                with medir("anymarket.decodificar"):
+                    payload = resposta.json(object_pairs_hook=normalizar_pares)
+                if cache:
+                    cache.gravar("anymarket", url, parametros, resposta.content, self._ttl_cache(url, parametros))
                 # Tenta pegar 'content' (padrão v2), se não tiver tenta 'data'
-                itens = payload.get("content") or payload.get("data", [])
+                return payload.get("content") or payload.get("data", [])
+
+            except requests.RequestException as e:
+                # Retries da sessão esgotados: falha a extração em vez de salvar o dia truncado
+                logger.error(f"Erro de rede no AnyMarket (offset {offset}): {e}")
+                raise
+
+        raise RuntimeError(
+            f"Rate limit persistente no AnyMarket (offset {offset}) "
+            f"após {self.MAX_TENTATIVAS_RATE_LIMIT} tentativas"
+        )
+
+    def _iterar_paginas(self, endpoint: str, parametros: Dict[str, Any], concorrencia: Optional[int] = None, offset_inicial: int = 0) -> Iterator[List[Dict]]:
+        """
+        MÉTODO MOTOR (Adaptado para OFFSET, gerador):
+        Diferente do Bling (pagina 1, 2...), o AnyMarket usa offset (0, 100, 200...).
+        Cada página é produzida assim que chega, sem acumular o dia em memória.
+
+        Como os offsets são conhecidos de antemão, com concorrencia > 1 até
+        N páginas ficam em voo ao mesmo tempo (ver `_iterar_paginas_concorrente`).
+        `offset_inicial` permite retomar de um checkpoint.
+        """
+        if concorrencia is None:
+            concorrencia = Config.ANYMARKET_CONCORRENCIA
+
+        url = f"{self.URL_BASE}/{endpoint}"
+        cabecalhos = self.auth.obter_cabecalhos()
+
+        logger.info(f"Iniciando extração AnyMarket: {endpoint} | Offset Inicial: {offset_inicial} | Concorrência: {concorrencia}")
+
+        if Config.MOTOR_EXTRACAO == "async":
+            paginas = self._iterar_paginas_async(url, parametros, offset_inicial)
+        elif concorrencia > 1:
+            paginas = self._iterar_paginas_concorrente(url, cabecalhos, parametros, concorrencia, offset_inicial)
+        else:
+            paginas = self._iterar_paginas_sequencial(url, cabecalhos, parametros, offset_inicial)
+
+        total = 0
+        for offset, itens in paginas:
+            total += len(itens)
+            PAGINAS.inc(api="anymarket", endpoint=endpoint)
+            REGISTROS.inc(len(itens), api="anymarket", endpoint=endpoint)
+            logger.info(f"Offset {offset} baixado: {len(itens)} itens.")
+            yield itens
+
+        logger.info(f"Fim da paginação. Total processado: {total}")
+
+    def _iterar_paginas_async(self, url: str, parametros: Dict[str, Any], offset_inicial: int = 0) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Offsets buscados pelo motor assíncrono: uma janela de
+        Config.ASYNC_CONCORRENCIA_POR_API['anymarket'] offsets em voo num único
+        event loop, entregues em ordem.
+        """
+        from app.async_engine import obter_motor
+
+        motor = obter_motor()
+        limite = self.LIMITE_POR_PAGINA
+        # As páginas rodam no event loop, fora da thread da tarefa
+        cronometria = cronometria_atual()
+
+        async def buscar_pagina(offset: int) -> List[Dict]:
+            params = dict(parametros, limit=limite, offset=offset)
+            # Limitador, requisição e decodificação juntos, com outros offsets em voo
+            with medir("anymarket.pagina_async", cronometria):
+                payload = await motor.buscar_json(
+                    "anymarket", url, params, self.auth.obter_cabecalhos, decodificar=carregar_json,
+                    ttl_cache=self._ttl_cache(url, parametros),
+                )
+            return payload.get("content") or payload.get("data", [])
+
+        yield from motor.iterar(motor.paginar("anymarket", buscar_pagina, inicio=offset_inicial, passo=limite))
+
+    def _iterar_paginas_sequencial(self, url: str, cabecalhos: Dict[str, str], parametros: Dict[str, Any], offset_inicial: int = 0) -> Iterator[Tuple[int, List[Dict]]]:
+        """Uma página por vez, até a primeira página vazia."""
+        offset = offset_inicial
+        limite = self.LIMITE_POR_PAGINA
+
+        while True:
+            itens = self._buscar_pagina(url, cabecalhos, parametros, offset, limite)
+            if not itens:
+                return
+
+            yield offset, itens
+            offset += limite
 
+    def _iterar_paginas_concorrente(self, url: str, cabecalhos: Dict[str, str], parametros: Dict[str, Any], concorrencia: int, offset_inicial: int = 0) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Busca até `concorrencia` offsets em paralelo e os entrega em ordem.
+
+        A janela é uma fila de futures na ordem dos offsets: sempre se espera
+        o mais antigo, e cada página consumida libera a submissão do próximo
+        offset. A ordem de saída é a mesma da versão sequencial.
+
+        Fim da paginação: a primeira página vazia encerra tudo.
+        As páginas especulativas além do fim (no máximo concorrencia - 1) são
+        canceladas se ainda não começaram, ou descartadas se já voltaram.
+        """
+        limite = self.LIMITE_POR_PAGINA
+        proximo_offset = offset_inicial
+        janela = deque()
+        buscar_pagina = propagar(self._buscar_pagina)
+
+        executor = ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="anymarket-offset")
+        try:
+            def submeter():
+                nonlocal proximo_offset
+                futuro = executor.submit(buscar_pagina, url, cabecalhos, parametros, proximo_offset, limite)
+                janela.append((proximo_offset, futuro))
+                proximo_offset += limite
+
+            for _ in range(concorrencia):
+                submeter()
+
+            while janela:
+                offset, futuro = janela.popleft()
+                itens = futuro.result()
                 if not itens:
-                    logger.info(f"Fim da paginação. Total processado: {len(dados_coletados)}")
-                    break
-
-                dados_coletados.extend(itens)
-                logger.info(f"Offset {offset} baixado: {len(itens)} itens.")
-
-                # Prepara para a próxima página
-                offset += limite
-                time.sleep(0.5) # Respeitar limites da API
-
-            except Exception as e:
-                logger.error(f"Erro crítico na extração: {e}")
-                break
-                
-        return dados_coletados
-    
+                    return
+
+                submeter()
+                yield offset, itens
+        finally:
+            # Também cobre o consumidor abandonando o gerador no meio
+            for _, futuro in janela:
+                futuro.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _iterar_registros(self, endpoint: str, parametros: Dict[str, Any]) -> Iterator[Dict]:
+        """Achata as páginas de `_iterar_paginas` em registros individuais."""
+        for itens in self._iterar_paginas(endpoint, parametros):
+            yield from itens
+
     def _normalizar_chaves(self, obj):
-        """Remove hífens das chaves, substituindo por underscore."""
-        if isinstance(obj, dict):
-            return {
-                chave.replace('-', '_'): self._normalizar_chaves(valor)
-                for chave, valor in obj.items()
-            }
-        elif isinstance(obj, list):
-            return [self._normalizar_chaves(item) for item in obj]
-        else:
-            return obj
+        """
+        Remove hífens das chaves, substituindo por underscore. As páginas da
+        API já chegam normalizadas (ver `_buscar_pagina`); isto só serve para
+        dados montados fora do decoder.
+        """
+        with medir("anymarket.normalizar_chaves"):
+            return normalizar_chaves(obj)
 
-    def _salvar_no_gcs(self, dados: List[Dict], pasta: str) -> None:
-        """Persiste dados no GCS com particionamento por data em formato NDJSON."""
-        if not dados:
-            logger.info(f"Nenhum dado para salvar em {pasta}")
-            return
-        
-        if not all(isinstance(d, dict) for d in dados):
-            raise ValueError("Todos os itens devem ser dicionários")
-        
-        caminho = (
+    def _caminho_particao(self, pasta: str) -> str:
+        return (
             f"{Config.CAMINHO_BASE_RAW_ANYMARKET}/{pasta}/"
-            f"data_ref={self.data_alvo}/data.json"
+            f"data_ref={self.data_alvo}/data{obter_formato(pasta).extensao}"
         )
+
+    def _salvar_no_gcs(self, dados: Iterable[Dict], pasta: str) -> int:
+        """
+        Persiste dados no GCS com particionamento por data, no formato
+        configurado para a pasta (Config.FORMATO_SAIDA).
+        Aceita qualquer iterável de registros já normalizados, gravados em
+        streaming. Retorna o número de registros salvos.
+        """
+        caminho = self._caminho_particao(pasta)
         
         try:
-            # ✅ Normaliza os dados ANTES de converter para JSON
-            dados_normalizados = [self._normalizar_chaves(registro) for registro in dados]
-            
-            conteudo_ndjson = '\n'.join(
-                json.dumps(registro, ensure_ascii=False) 
-                for registro in dados_normalizados
-            )
-            
-            blob = self.bucket.blob(caminho)
-            blob.metadata = {'num_registros': str(len(dados))}
-            
-            blob.upload_from_string(
-                conteudo_ndjson,
-                content_type='application/x-ndjson; charset=utf-8'
-            )
-            
-            logger.info(
-                f"✓ Salvos {len(dados)} registros em gs://{Config.BUCKET_NAME}/{caminho}"
-            )
-            
+            total = salvar_registros(self.bucket, caminho, dados, formato=obter_formato(pasta))
         except Exception as e:
             logger.error(f"Erro ao salvar no GCS ({caminho}): {e}")
             raise
 
+        if not total:
+            logger.info(f"Nenhum dado para salvar em {pasta}")
+            return 0
+
+        logger.info(
+            f"✓ Salvos {total} registros em gs://{Config.BUCKET_NAME}/{caminho}"
+        )
+        return total
+
+    def _extrair_particao(self, endpoint: str, parametros: Dict[str, Any], pasta: str) -> int:
+        """
+        Extrai o endpoint e grava a partição do dia. Com checkpoint ativo, a
+        extração é retomável a partir do último offset committado.
+        """
+        if not Config.CHECKPOINT_ATIVO:
+            return self._salvar_no_gcs(self._iterar_registros(endpoint, parametros), pasta)
+
+        extracao = ExtracaoCheckpointada(
+            self.gcs, self.bucket, "anymarket", pasta, self.data_alvo,
+            self._caminho_particao(pasta),
+        )
+        try:
+            return extracao.executar(
+                lambda offset: self._iterar_paginas(endpoint, parametros, offset_inicial=offset),
+                inicio=0,
+                passo=self.LIMITE_POR_PAGINA,
+            )
+        except Exception as e:
+            logger.error(f"Erro ao extrair {pasta} ({self.data_alvo}): {e}")
+            raise
+
     # ---------------------------------------------------------
     # MÉTODOS DE NEGÓCIO
     # ---------------------------------------------------------
 
     def extrair_pedidos(self):
-        """Extrai pedidos criados ontem."""
+        """Extrai os pedidos criados no dia alvo."""
         endpoint = "orders"
         
-        # AnyMarket exige data completa ISO 8601 (ex: 2023-10-27T00:00:00Z)
-        data_iso = f"{self.data_alvo}T00:00:00Z"
-        
+        # AnyMarket exige data completa ISO 8601 (ex: 2023-10-27T00:00:00Z).
+        # Intervalo fechado no dia alvo: partições de datas diferentes não se sobrepõem
         parametros = {
-            "createdAfter": data_iso,
+            "createdAfter": f"{self.data_alvo}T00:00:00Z",
+            "createdBefore": f"{self.data_alvo}T23:59:59Z",
             # Se quiser filtrar por status, adicione aqui: "status": "PAID_WAITING_SHIP"
         }
         
-        dados = self._buscar_todas_paginas(endpoint, parametros)
-        self._salvar_no_gcs(dados, "orders")
-        return len(dados)
-
-    def executar_pipeline_diario(self):
-        logger.info(f"--- Pipeline AnyMarket ({self.data_alvo}) ---")
-        qtd = self.extrair_pedidos()
-        logger.info("--- Pipeline Finalizado ---")
-        return qtd
\ No newline at end of file
+        return self._extrair_particao(endpoint, parametros, "orders")
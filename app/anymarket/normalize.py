@@ -0,0 +1,48 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+# Tradução chave original -> chave normalizada. O AnyMarket repete o mesmo
+# conjunto pequeno de chaves em todos os pedidos; o teto só protege contra
+# payloads que usem valores (ids, SKUs) como chave.
+_TRADUCAO_CHAVES: Dict[str, str] = {}
+MAX_CHAVES_TRADUZIDAS = 10_000
+
+
+def normalizar_chave(chave: str) -> str:
+    """Remove hífens da chave, substituindo por underscore (com cache)."""
+    traduzida = _TRADUCAO_CHAVES.get(chave)
+    if traduzida is None:
+        traduzida = chave.replace('-', '_')
+        if len(_TRADUCAO_CHAVES) < MAX_CHAVES_TRADUZIDAS:
+            _TRADUCAO_CHAVES[chave] = traduzida
+    return traduzida
+
+
+def normalizar_pares(pares: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    """
+    `object_pairs_hook` do json: cada objeto já nasce com as chaves
+    normalizadas, sem uma segunda passada recursiva copiando o registro.
+    Os valores aninhados já chegam normalizados (o decoder monta de dentro
+    para fora).
+    """
+    traducao = _TRADUCAO_CHAVES
+    return {traducao.get(chave) or normalizar_chave(chave): valor for chave, valor in pares}
+
+
+def carregar_json(texto) -> Any:
+    """json.loads com as chaves normalizadas durante a decodificação."""
+    return json.loads(texto, object_pairs_hook=normalizar_pares)
+
+
+def normalizar_chaves(obj: Any) -> Any:
+    """
+    Normalização de um objeto já decodificado (cópia recursiva). O caminho
+    de extração usa `carregar_json`; esta versão fica para dados que não
+    passam pelo decoder.
+    """
+    if isinstance(obj, dict):
+        return {normalizar_chave(chave): normalizar_chaves(valor) for chave, valor in obj.items()}
+    elif isinstance(obj, list):
+        return [normalizar_chaves(item) for item in obj]
+    else:
+        return obj
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from app.config import Config
+from app.metrics import TOKEN_RECUSADO, registrar_http
+from app.gcs_handler import logger
+from app.http_cache import obter_cache_respostas
+from app.rate_limiter import backoff_com_jitter, obter_limitador
+
+STATUS_RETRY_TRANSPORTE = (500, 502, 503, 504)
+
+
+class MotorAsync:
+    """
+    Motor de extração assíncrono (alternativa ao caminho com threads + requests).
+
+    Um único event loop por processo roda numa thread dedicada. Os extratores
+    continuam síncronos por fora: `iterar()` converte um gerador assíncrono em
+    gerador comum, então o writer e o orquestrador não mudam. Por dentro, cada
+    API tem uma sessão aiohttp com pool de conexões e um semáforo que limita
+    quantas requisições ficam em voo; o ritmo continua vindo do mesmo
+    limitador de taxa (token bucket) do caminho síncrono.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="motor-async", daemon=True)
+        self._thread.start()
+        self._sessoes: Dict[str, aiohttp.ClientSession] = {}
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+        self._locks_token: Dict[str, asyncio.Lock] = {}
+        self._cabecalhos: Dict[str, Dict[str, str]] = {}
+
+    # ------------------------------------------------------------------
+    # Ponte síncrona <-> loop
+    # ------------------------------------------------------------------
+
+    def executar(self, coro: Awaitable) -> Any:
+        """Roda uma corrotina no loop do motor e bloqueia até o resultado."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterar(self, agen: AsyncIterator) -> Iterator:
+        """Consome um gerador assíncrono a partir de código síncrono."""
+        try:
+            while True:
+                try:
+                    yield self.executar(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Consumidor saiu no meio (erro no writer, por exemplo): cancela o que está em voo
+            self.executar(agen.aclose())
+
+    # ------------------------------------------------------------------
+    # Recursos por API (criados dentro do loop)
+    # ------------------------------------------------------------------
+
+    def _sessao(self, api: str) -> aiohttp.ClientSession:
+        if api not in self._sessoes:
+            conector = aiohttp.TCPConnector(
+                limit=Config.ASYNC_CONCORRENCIA_POR_API[api],
+                ttl_dns_cache=300,
+            )
+            conexao, leitura = Config.HTTP_TIMEOUT
+            self._sessoes[api] = aiohttp.ClientSession(
+                connector=conector,
+                timeout=aiohttp.ClientTimeout(sock_connect=conexao, sock_read=leitura),
+            )
+        return self._sessoes[api]
+
+    def _semaforo(self, api: str) -> asyncio.Semaphore:
+        if api not in self._semaforos:
+            self._semaforos[api] = asyncio.Semaphore(Config.ASYNC_CONCORRENCIA_POR_API[api])
+        return self._semaforos[api]
+
+    def _lock_token(self, api: str) -> asyncio.Lock:
+        if api not in self._locks_token:
+            self._locks_token[api] = asyncio.Lock()
+        return self._locks_token[api]
+
+    async def _obter_cabecalhos(
+        self,
+        api: str,
+        obter_cabecalhos: Callable[[], Dict[str, str]],
+        usados: Optional[Dict[str, str]] = None,
+        renovar_cabecalhos: Optional[Callable[[Dict[str, str]], Dict[str, str]]] = None,
+    ) -> Dict[str, str]:
+        """
+        Headers de autenticação compartilhados por todas as requisições da API.
+
+        A chamada de `obter_cabecalhos` (que pode ir ao GCS ou renovar o token)
+        roda fora do loop. Com `usados` (após um 401), só a primeira corrotina
+        renova, via `renovar_cabecalhos(usados)` quando a API oferece: as
+        demais, ao obter o lock, encontram headers diferentes dos que falharam
+        e apenas os reaproveitam.
+        """
+        async with self._lock_token(api):
+            atuais = self._cabecalhos.get(api)
+            if atuais is not None and atuais is not usados:
+                return atuais
+            if usados is not None:
+                logger.warning(f"[{api}] Token recusado (401). Renovando...")
+            if usados is not None and renovar_cabecalhos is not None:
+                atuais = await self.loop.run_in_executor(None, renovar_cabecalhos, usados)
+            else:
+                atuais = await self.loop.run_in_executor(None, obter_cabecalhos)
+            self._cabecalhos[api] = atuais
+            return atuais
+
+    # ------------------------------------------------------------------
+    # Requisições
+    # ------------------------------------------------------------------
+
+    async def buscar_json(
+        self,
+        api: str,
+        url: str,
+        parametros: Dict[str, Any],
+        obter_cabecalhos: Callable[[], Dict[str, str]],
+        renovar_cabecalhos: Optional[Callable[[Dict[str, str]], Dict[str, str]]] = None,
+        decodificar: Callable[[bytes], Any] = json.loads,
+        ttl_cache: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        GET com limitador de taxa, semáforo da API, renovação de token em 401
+        e retry com backoff para 429/5xx/falhas de rede.
+        Retorna o payload JSON; recusa da API (4xx) levanta RuntimeError, como
+        no caminho síncrono. `decodificar` substitui o
+        json.loads (ex.: para normalizar chaves durante a decodificação).
+        Com `ttl_cache` (ver app.http_cache.ttl_cache) e o cache de respostas
+        ativo, uma resposta em cache é devolvida sem tocar no limitador.
+        """
+        cache = obter_cache_respostas() if ttl_cache is not None else None
+        if cache is not None:
+            corpo = cache.ler(api, url, parametros)
+            if corpo is not None:
+                return decodificar(corpo)
+
+        limitador = obter_limitador(api)
+        tentativas_429 = 0
+        tentativas_token = 0
+        tentativas_transporte = 0
+
+        while True:
+            cabecalhos = await self._obter_cabecalhos(api, obter_cabecalhos)
+            await asyncio.sleep(limitador.reservar())
+
+            try:
+                async with self._semaforo(api):
+                    inicio = time.perf_counter()
+                    async with self._sessao(api).get(url, params=parametros, headers=cabecalhos) as resposta:
+                        status = resposta.status
+                        if status == 200:
+                            corpo = await resposta.read()
+                        else:
+                            texto = await resposta.text()
+                    registrar_http(api, url, status, time.perf_counter() - inicio)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                tentativas_transporte += 1
+                if tentativas_transporte > Config.HTTP_MAX_RETRIES:
+                    logger.error(f"Erro de rede em {url}: {e}")
+                    raise
+                await asyncio.sleep(backoff_com_jitter(tentativas_transporte))
+                continue
+
+            if status == 200:
+                limitador.registrar_sucesso(resposta.headers)
+                payload = decodificar(corpo)
+                if cache is not None:
+                    cache.gravar(api, url, parametros, corpo, ttl_cache)
+                return payload
+
+            if status == 429:
+                tentativas_429 += 1
+                if tentativas_429 > Config.ASYNC_MAX_TENTATIVAS_RATE_LIMIT:
+                    raise RuntimeError(f"Rate limit persistente em {url} após {tentativas_429 - 1} tentativas")
+                limitador.registrar_limite(resposta.headers, tentativas_429)
+                continue
+
+            if status == 401:
+                TOKEN_RECUSADO.inc(api=api)
+                tentativas_token += 1
+                if tentativas_token > Config.ASYNC_MAX_TENTATIVAS_TOKEN:
+                    raise RuntimeError(f"Token recusado em {url} após {tentativas_token - 1} renovações")
+                await self._obter_cabecalhos(api, obter_cabecalhos, usados=cabecalhos, renovar_cabecalhos=renovar_cabecalhos)
+                continue
+
+            if status in STATUS_RETRY_TRANSPORTE and tentativas_transporte < Config.HTTP_MAX_RETRIES:
+                tentativas_transporte += 1
+                await asyncio.sleep(backoff_com_jitter(tentativas_transporte))
+                continue
+
+            logger.error(f"Erro API {url}: {status} - {texto}")
+            if status >= 500:
+                raise RuntimeError(f"Erro {status} persistente em {url}")
+            # Só página 200 vazia é fim dos dados; gravar o resto truncaria o dia
+            raise RuntimeError(f"Erro {status} em {url}")
+
+    async def paginar(
+        self,
+        api: str,
+        buscar_pagina: Callable[[int], Awaitable[List[Dict]]],
+        inicio: int,
+        passo: int,
+    ) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """
+        Paginação especulativa: mantém uma janela de páginas (ou offsets) em
+        voo, do tamanho da concorrência da API, e entrega em ordem. A primeira
+        página vazia encerra; as que passaram do fim são canceladas.
+        """
+        tamanho_janela = Config.ASYNC_CONCORRENCIA_POR_API[api]
+        janela: List[Tuple[int, asyncio.Task]] = []
+        proximo = inicio
+
+        def submeter():
+            nonlocal proximo
+            janela.append((proximo, asyncio.ensure_future(buscar_pagina(proximo))))
+            proximo += passo
+
+        try:
+            for _ in range(tamanho_janela):
+                submeter()
+
+            while janela:
+                cursor, tarefa = janela.pop(0)
+                itens = await tarefa
+                if not itens:
+                    return
+                submeter()
+                yield cursor, itens
+        finally:
+            for _, tarefa in janela:
+                tarefa.cancel()
+            # Recolhe as canceladas para não deixar exceções sem dono no loop
+            await asyncio.gather(*(t for _, t in janela), return_exceptions=True)
+
+
+_motor: Optional[MotorAsync] = None
+_motor_lock = threading.Lock()
+
+
+def obter_motor() -> MotorAsync:
+    """Motor (e event loop) único do processo, criado no primeiro uso."""
+    global _motor
+    with _motor_lock:
+        if _motor is None:
+            _motor = MotorAsync()
+        return _motor
@@ -0,0 +1,150 @@
+"""
+Backfill de partições por intervalo de datas.
+
+Uso via CLI:
+    python -m app.backfill --inicio 2024-01-01 --fim 2024-01-31 \
+        --endpoints bling.vendas,bling.nfe,anymarket.pedidos [--forcar]
+
+Ou via HTTP: POST /backfill com {"inicio", "fim", "endpoints", "forcar"}.
+"""
+import argparse
+import json
+import threading
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from app.checkpoint import particao_completa
+from app.config import Config
+from app.gcs_handler import GCSHandler, logger
+from app.orchestrator import executar_tarefas
+from app.pipelines import PIPELINES, carregar_pipeline
+
+
+def dividir_intervalo(inicio: str, fim: str) -> List[str]:
+    """Datas YYYY-MM-DD de `inicio` a `fim`, inclusive: uma unidade por partição diária."""
+    data_inicio = date.fromisoformat(inicio)
+    data_fim = date.fromisoformat(fim)
+    if data_fim < data_inicio:
+        raise ValueError(f"Intervalo inválido: {inicio} > {fim}")
+    if data_fim >= date.today():
+        raise ValueError(f"Backfill só aceita dias fechados (até ontem): {fim}")
+    return [
+        (data_inicio + timedelta(days=i)).isoformat()
+        for i in range((data_fim - data_inicio).days + 1)
+    ]
+
+
+def validar_endpoints(endpoints: List[str]) -> None:
+    """Endpoints no formato 'pipeline.endpoint', ex.: 'bling.nfe'."""
+    for nome in endpoints:
+        pipeline, _, endpoint = nome.partition(".")
+        if pipeline not in PIPELINES or endpoint not in carregar_pipeline(pipeline).PASTAS:
+            raise ValueError(f"Endpoint não suportado: {nome}")
+
+
+def _pastas(pipeline: str, endpoint: str) -> List[str]:
+    """Pastas que o endpoint grava; a partição só está completa se todas estiverem."""
+    modulo = carregar_pipeline(pipeline)
+    pastas = [modulo.PASTAS[endpoint]]
+    detalhe = getattr(modulo, "PASTAS_DETALHE", {}).get(endpoint)
+    if detalhe and Config.ENRIQUECER_DETALHES:
+        pastas.append(detalhe)
+    return pastas
+
+
+def _tarefa_particao(bucket_name: str, pipeline: str, endpoint: str, data_alvo: str) -> Callable[[], int]:
+    """O extrator só é criado quando a unidade de fato roda."""
+    def executar() -> int:
+        return carregar_pipeline(pipeline).listar_tarefas(bucket_name, data_alvo)[endpoint]()
+    return executar
+
+
+def executar_backfill(
+    inicio: str,
+    fim: str,
+    endpoints: List[str],
+    forcar: bool = False,
+    bucket_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Divide o intervalo em partições (endpoint x dia) e as executa em paralelo.
+
+    As unidades rodam num pool de threads do mesmo processo, para que todas
+    compartilhem o limitador de taxa de cada API: o orçamento de req/s é
+    global, e Config.BACKFILL_MAX_TAREFAS_POR_API limita quantos dias de uma
+    mesma API extraem ao mesmo tempo. Partições já completas (commit final do
+    checkpoint) são puladas, a menos que `forcar` seja True.
+    """
+    bucket_name = bucket_name or Config.BUCKET_NAME
+    validar_endpoints(endpoints)
+    datas = dividir_intervalo(inicio, fim)
+    gcs = GCSHandler(bucket_name)
+
+    tarefas = {}
+    puladas = []
+    for data_alvo in datas:
+        for nome in endpoints:
+            pipeline, _, endpoint = nome.partition(".")
+            unidade = f"{nome}@{data_alvo}"
+
+            if not forcar and all(
+                particao_completa(gcs, pipeline, pasta, data_alvo) for pasta in _pastas(pipeline, endpoint)
+            ):
+                puladas.append(unidade)
+                continue
+
+            tarefas[unidade] = (pipeline, _tarefa_particao(bucket_name, pipeline, endpoint, data_alvo))
+
+    total = len(tarefas)
+    concluidas = 0
+    progresso_lock = threading.Lock()
+
+    logger.info(f"[backfill] {inicio}..{fim} | {total} partições a extrair, {len(puladas)} já completas")
+
+    def ao_concluir(unidade: str, resultado: Dict[str, Any]) -> None:
+        nonlocal concluidas
+        with progresso_lock:
+            concluidas += 1
+            logger.info(
+                f"[backfill] {concluidas}/{total} {unidade}: {resultado['status']} "
+                f"({resultado.get('registros', resultado.get('erro'))})"
+            )
+
+    resultados = executar_tarefas(tarefas, limites=Config.BACKFILL_MAX_TAREFAS_POR_API, ao_concluir=ao_concluir)
+    for unidade in puladas:
+        resultados[unidade] = {"status": "skipped"}
+
+    falhas = [u for u, r in resultados.items() if r["status"] == "error"]
+    return {
+        "status": "error" if falhas else "success",
+        "inicio": inicio,
+        "fim": fim,
+        "extraidas": total - len(falhas),
+        "puladas": len(puladas),
+        # Partições reextraídas com conteúdo idêntico: nada foi regravado
+        "inalteradas": sum(len(r.get("inalteradas", [])) for r in resultados.values()),
+        "falhas": falhas,
+        "particoes": resultados,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backfill de partições por intervalo de datas.")
+    parser.add_argument("--inicio", required=True, help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument("--fim", required=True, help="Data final, inclusive (YYYY-MM-DD)")
+    parser.add_argument(
+        "--endpoints",
+        required=True,
+        help="Lista separada por vírgula, ex.: bling.vendas,bling.nfe,anymarket.pedidos",
+    )
+    parser.add_argument("--forcar", action="store_true", help="Reextrai partições já completas")
+    args = parser.parse_args(argv)
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    resultado = executar_backfill(args.inicio, args.fim, endpoints, forcar=args.forcar)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    return 0 if resultado["status"] == "success" else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
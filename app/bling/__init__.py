@@ -1,9 +1,30 @@
+from typing import Callable, Dict, Optional
+
 from app.gcs_handler import GCSHandler
 from app.bling.auth import BlingAuth
 from app.bling.extract import ExtratorBling
 
-def executar_pipeline(bucket_name: str) -> int:
+# Endpoint -> pasta da partição no raw (usado para checar partições completas).
+# Produtos fica de fora: a sincronização é incremental por um índice único,
+# então não admite backfill de dias passados nem dias em paralelo.
+PASTAS = {
+    "vendas": "pedidos_vendas",
+    "nfe": "nfe",
+}
+
+# Endpoint -> pasta dos detalhes (etapa de enriquecimento, Config.ENRIQUECER_DETALHES)
+PASTAS_DETALHE = {
+    "vendas": "pedidos_vendas_detalhe",
+    "nfe": "nfe_detalhe",
+}
+
+def listar_tarefas(bucket_name: str, data_alvo: Optional[str] = None) -> Dict[str, Callable[[], int]]:
+    """Endpoints independentes do pipeline, para execução em paralelo."""
     gcs = GCSHandler(bucket_name)
     auth = BlingAuth(gcs)
-    extractor = ExtratorBling(auth, gcs)
-    return extractor.executar_pipeline_diario()
+    extractor = ExtratorBling(auth, gcs, data_alvo)
+    return {
+        "vendas": extractor.extrair_vendas,
+        "nfe": extractor.extrair_nfe,
+        "produtos": extractor.extrair_produtos,
+    }
@@ -1,39 +1,110 @@
-import requests
 import base64
+import threading
 import time
+from typing import Any, Dict, Optional
+
+from google.api_core.exceptions import PreconditionFailed
+
 from app.config import Config, os
 from app.gcs_handler import logger
+from app.http_client import obter_sessao
+from app.metrics import AUTH_RENOVACAO
+from app.profiling import medir
 
 class BlingAuth:
+    """
+    Tokens OAuth do Bling com cache em memória compartilhado pelo processo.
+
+    - Leitura: enquanto o access token em cache não estiver perto de expirar
+      (expires_in real menos Config.TOKEN_MARGEM_RENOVACAO), nenhuma chamada
+      ao GCS ou à API é feita.
+    - Renovação single-flight: só uma thread por vez entra no caminho lento.
+      As demais esperam o lock e encontram o token novo já no cache.
+    - O tokens.json é regravado com precondição de geração: se outra
+      instância rotacionou o refresh token no meio do caminho, a escrita
+      falha (412) e a versão dela é adotada.
+    """
+
+    # Compartilhado entre instâncias: cada run/backfill cria um BlingAuth novo
+    _cache: Optional[Dict[str, Any]] = None
+    _lock = threading.Lock()
+
     def __init__(self, gcs_handler):
         self.gcs = gcs_handler
         self.base_url = "https://www.bling.com.br/Api/v3/oauth/token"
 
+    @staticmethod
+    def _expira_em(tokens: Dict[str, Any]) -> float:
+        validade = tokens.get('expires_in') or Config.TOKEN_EXPIRACAO_PADRAO
+        return tokens.get('created_at', 0) + float(validade) - Config.TOKEN_MARGEM_RENOVACAO
+
+    @classmethod
+    def _token_em_cache(cls) -> Optional[str]:
+        cache = cls._cache
+        if cache and time.time() < cache['expira_em']:
+            return cache['tokens']['access_token']
+        return None
+
+    @classmethod
+    def _guardar_em_cache(cls, tokens: Dict[str, Any]) -> str:
+        cls._cache = {'tokens': tokens, 'expira_em': cls._expira_em(tokens)}
+        return tokens['access_token']
+
     def obter_token_valido(self):
-        tokens = self.gcs.read_json(Config.TOKEN_PATH)
+        token = self._token_em_cache()
+        if token:
+            return token
+
+        # Caminho lento: a espera pelo lock (outra thread renovando) entra no tempo medido
+        with medir("bling.auth"), self._lock:
+            # Outra thread pode ter renovado enquanto esperávamos o lock
+            token = self._token_em_cache()
+            if token:
+                return token
+            return self._carregar_ou_renovar()
+
+    def renovar_apos_401(self, token_recusado: str) -> str:
+        """
+        Chamado quando a API recusa um token. Só renova se o token recusado
+        ainda for o do cache; se outra thread já trocou, devolve o novo.
+        """
+        with medir("bling.auth"), self._lock:
+            cache = type(self)._cache
+            if cache and cache['tokens']['access_token'] != token_recusado and time.time() < cache['expira_em']:
+                return cache['tokens']['access_token']
+            return self._carregar_ou_renovar(token_recusado)
+
+    def _carregar_ou_renovar(self, token_recusado: Optional[str] = None) -> str:
+        """Caminho lento, sempre sob o lock: relê o GCS e renova se preciso."""
+        tokens, geracao = self.gcs.read_json_com_geracao(Config.TOKEN_PATH)
         if not tokens:
             raise Exception("FATAL: tokens.json não encontrado no Bucket.")
 
-        # Se criado há mais de 50 min, renova
-        created_at = tokens.get('created_at', 0)
-        if (time.time() - created_at) > 3000:
-            logger.info("Token expirando. Renovando...")
-            return self._refresh_token(tokens['refresh_token'])
-        
-        return tokens['access_token']
+        # Outra instância pode ter renovado e gravado um token ainda válido
+        if time.time() < self._expira_em(tokens) and tokens['access_token'] != token_recusado:
+            return self._guardar_em_cache(tokens)
+
+        logger.info("Token expirando. Renovando...")
+        return self._refresh_token(tokens['refresh_token'], geracao)
 
-    def _refresh_token(self, refresh_token):
+    def _refresh_token(self, refresh_token, geracao: Optional[int] = None):
         credentials = f"{Config.BLING_CLIENT_ID}:{Config.BLING_CLIENT_SECRET}"
         encoded = base64.b64encode(credentials.encode()).decode()
-        
+
         payload = {"grant_type": "refresh_token", "refresh_token": refresh_token}
         headers = {"Authorization": f"Basic {encoded}", "Content-Type": "application/x-www-form-urlencoded"}
 
-        resp = requests.post(self.base_url, data=payload, headers=headers)
+        with AUTH_RENOVACAO.cronometrar(api="bling"), medir("bling.auth.renovar"):
+            resp = obter_sessao("bling").post(self.base_url, data=payload, headers=headers, timeout=Config.HTTP_TIMEOUT)
         if resp.status_code == 200:
             new_tokens = resp.json()
             new_tokens['created_at'] = time.time()
-            self.gcs.salvar_json(Config.TOKEN_PATH, new_tokens)
-            return new_tokens['access_token']
+            try:
+                self.gcs.salvar_json(Config.TOKEN_PATH, new_tokens, if_generation_match=geracao)
+            except PreconditionFailed:
+                logger.warning("tokens.json foi alterado por outra instância durante a renovação. Usando a versão do bucket.")
+                tokens, _ = self.gcs.read_json_com_geracao(Config.TOKEN_PATH)
+                return self._guardar_em_cache(tokens)
+            return self._guardar_em_cache(new_tokens)
         else:
-            raise Exception(f"Erro Auth: {resp.text}")
\ No newline at end of file
+            raise Exception(f"Erro Auth: {resp.text}")
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import Config
+from app.gcs_handler import logger
+from app.profiling import propagar
+
+
+def versao_resumo(resumo: Dict[str, Any]) -> str:
+    """
+    Versão do documento segundo a listagem. As listagens do Bling v3 não
+    trazem data de alteração; o hash da linha inteira cobre a situação e os
+    totais, que mudam quando o documento muda.
+    """
+    return hashlib.sha1(json.dumps(resumo, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def mapear_em_ordem(
+    funcao: Callable[[Any], Any],
+    itens: Iterable[Any],
+    concorrencia: int,
+    nome_threads: str = "bling-detalhe",
+) -> Iterator[Any]:
+    """
+    `map` com até `concorrencia` chamadas em voo, entregando na ordem de
+    entrada. A janela limita quantos itens são lidos à frente do consumidor.
+    """
+    janela = deque()
+    itens = iter(itens)
+    funcao = propagar(funcao)
+    executor = ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix=nome_threads)
+    try:
+        for item in itens:
+            janela.append(executor.submit(funcao, item))
+            if len(janela) >= concorrencia * 2:
+                yield janela.popleft().result()
+        while janela:
+            yield janela.popleft().result()
+    finally:
+        for futuro in janela:
+            futuro.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class CacheDetalhes:
+    """
+    Cache persistido de detalhes de uma partição (pasta + data_alvo).
+
+    Cada entrada guarda o id, a versão do resumo que originou o detalhe e o
+    próprio detalhe. As entradas novas são gravadas em partes NDJSON gzip a
+    cada Config.DETALHES_CACHE_POR_PARTE detalhes, listadas num indice.json;
+    se a extração cair no meio, o que já foi buscado não se perde. No fim,
+    `compactar` regrava uma parte única só com os ids ainda listados.
+    """
+
+    def __init__(self, gcs, bucket, fonte: str, pasta: str, data_alvo: str):
+        self.gcs = gcs
+        self.bucket = bucket
+        self.pasta_cache = f"{Config.CAMINHO_CACHE_DETALHES}/{fonte}/{pasta}/data_ref={data_alvo}"
+        self.caminho_indice = f"{self.pasta_cache}/indice.json"
+        self._entradas: Dict[Any, Tuple[str, Dict[str, Any]]] = {}
+        self._novas: List[Dict[str, Any]] = []
+        self._partes: List[str] = []
+        self._proxima = 0
+        self._usados = set()
+        self._lock = threading.Lock()
+
+    def carregar(self) -> None:
+        indice = self.gcs.read_json(self.caminho_indice) or {}
+        self._partes = list(indice.get("partes", []))
+        self._proxima = indice.get("proxima", len(self._partes))
+        for parte in self._partes:
+            with self.bucket.blob(parte).open('rb') as arquivo:
+                for linha in gzip.GzipFile(fileobj=arquivo, mode='rb'):
+                    entrada = json.loads(linha)
+                    self._entradas[entrada["id"]] = (entrada["versao"], entrada["detalhe"])
+        if self._entradas:
+            logger.info(f"Cache de detalhes {self.pasta_cache}: {len(self._entradas)} entradas")
+
+    def obter(self, id_documento: Any, versao: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._usados.add(id_documento)
+            entrada = self._entradas.get(id_documento)
+        if entrada is not None and entrada[0] == versao:
+            return entrada[1]
+        return None
+
+    def guardar(self, id_documento: Any, versao: str, detalhe: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entradas[id_documento] = (versao, detalhe)
+            self._novas.append({"id": id_documento, "versao": versao, "detalhe": detalhe})
+            if len(self._novas) >= Config.DETALHES_CACHE_POR_PARTE:
+                self._gravar_parte(self._novas)
+                self._novas = []
+
+    def _gravar_parte(self, entradas: List[Dict[str, Any]]) -> None:
+        """Grava uma parte e a registra no índice. Chamado com o lock."""
+        caminho = f"{self.pasta_cache}/parte-{self._proxima:05d}.json.gz"
+        self._proxima += 1
+        conteudo = "\n".join(json.dumps(e, ensure_ascii=False) for e in entradas).encode('utf-8')
+        self.bucket.blob(caminho).upload_from_string(
+            gzip.compress(conteudo, mtime=0), content_type='application/gzip'
+        )
+        self._partes.append(caminho)
+        self.gcs.salvar_json(self.caminho_indice, {"partes": self._partes, "proxima": self._proxima})
+
+    def compactar(self) -> None:
+        """Regrava o cache numa parte única só com os ids vistos nesta execução."""
+        with self._lock:
+            antigas = self._partes
+            self._partes = []
+            self._novas = []
+            self._gravar_parte([
+                {"id": id_documento, "versao": versao, "detalhe": detalhe}
+                for id_documento, (versao, detalhe) in self._entradas.items()
+                if id_documento in self._usados
+            ])
+
+        for parte in antigas:
+            self.bucket.blob(parte).delete()
@@ -1,10 +1,20 @@
+import json
+import threading
+
 import requests
-import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, Iterable, List, Optional, Tuple
 from app.config import Config
-from app.gcs_handler import logger
-import json
+from app.gcs_handler import logger, obter_bucket
+from app.checkpoint import ExtracaoCheckpointada, marcar_completa
+from app.http_cache import obter_cache_respostas, ttl_cache
+from app.http_client import obter_sessao
+from app.metrics import DETALHES, PAGINAS, REGISTROS, TOKEN_RECUSADO
+from app.profiling import cronometria_atual, medir
+from app.rate_limiter import obter_limitador
+from app.writer import ler_particao, obter_formato, salvar_registros
+from .details import CacheDetalhes, mapear_em_ordem, versao_resumo
+from .products import FORMATO_MARCA, IndiceProdutos
 
 
 class ExtratorBling:
@@ -15,31 +25,51 @@ class ExtratorBling:
     
     URL_BASE = "https://www.bling.com.br/Api/v3"
     LIMITE_POR_PAGINA = 100
-    DELAY_ENTRE_REQUISICOES = 0.3
-    DELAY_RATE_LIMIT = 3
+    MAX_TENTATIVAS_RATE_LIMIT = 10
+    # 401 logo após renovar o token não se resolve renovando de novo
+    MAX_TENTATIVAS_TOKEN = 3
     
-    def __init__(self, servico_autenticacao, manipulador_gcs):
+    def __init__(self, servico_autenticacao, manipulador_gcs, data_alvo: Optional[str] = None):
         self.auth = servico_autenticacao
         self.gcs = manipulador_gcs
-        self.data_alvo = self._calcular_data_alvo()
+        # D-1 por padrão; o backfill informa a data (YYYY-MM-DD) explicitamente
+        self.data_alvo = data_alvo or self._calcular_data_alvo()
+        # Token bucket compartilhado por todas as threads que chamam o Bling
+        self.limitador = obter_limitador("bling")
+        # Sessão com pool de conexões e retries de transporte (keep-alive)
+        self.sessao = obter_sessao("bling")
 
-        from google.cloud import storage
-        client = storage.Client()
-        self.bucket = client.bucket(Config.BUCKET_NAME)
+        # Mesmo cliente e bucket do GCSHandler (fábrica única do processo)
+        self.bucket = obter_bucket(Config.BUCKET_NAME)
     
     @staticmethod
     def _calcular_data_alvo() -> str:
         """Calcula D-1 (ontem) como data alvo padrão."""
         return (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
     
-    def _obter_cabecalhos(self) -> Dict[str, str]:
-        """Gera headers HTTP com token de autenticação válido."""
-        token = self.auth.obter_token_valido()
+    @staticmethod
+    def _montar_cabecalhos(token: str) -> Dict[str, str]:
         return {
             "Authorization": f"Bearer {token}",
             "Accept": "application/json"
         }
     
+    def _obter_cabecalhos(self) -> Dict[str, str]:
+        """Gera headers HTTP com token de autenticação válido (do cache, em geral)."""
+        return self._montar_cabecalhos(self.auth.obter_token_valido())
+    
+    def _renovar_cabecalhos(self, recusados: Dict[str, str]) -> Dict[str, str]:
+        """Após um 401: renova o token recusado (uma única vez entre todas as threads)."""
+        token_recusado = recusados["Authorization"].removeprefix("Bearer ")
+        return self._montar_cabecalhos(self.auth.renovar_apos_401(token_recusado))
+    
+    def _checar_tentativas_token(self, tentativas: int, onde: str) -> None:
+        """Falha a extração se o token foi recusado mais de MAX_TENTATIVAS_TOKEN vezes seguidas."""
+        if tentativas > self.MAX_TENTATIVAS_TOKEN:
+            raise RuntimeError(
+                f"Token recusado em {onde} após {self.MAX_TENTATIVAS_TOKEN} renovações"
+            )
+    
     def _construir_url(self, endpoint: str) -> str:
         """Constrói URL completa do endpoint."""
         return f"{self.URL_BASE}/{endpoint}"
@@ -47,18 +77,20 @@ class ExtratorBling:
     def _tratar_resposta_erro(
         self, 
         resposta: requests.Response, 
-        endpoint: str
+        endpoint: str,
+        tentativa: int = 0
     ) -> Optional[str]:
         """
-        Trata códigos de erro HTTP.
+        Trata códigos de erro HTTP e alimenta o limitador de taxa.
         Retorna ação a ser tomada: 'retry', 'renovar_token', 'parar' ou None.
         """
         if resposta.status_code == 429:
-            logger.warning(f"Rate limit atingido em {endpoint}. Aguardando {self.DELAY_RATE_LIMIT}s...")
-            time.sleep(self.DELAY_RATE_LIMIT)
+            # O limitador reduz a taxa e pausa o bucket; o próximo adquirir() espera
+            self.limitador.registrar_limite(resposta.headers, tentativa)
             return 'retry'
         
         if resposta.status_code == 401:
+            TOKEN_RECUSADO.inc(api="bling")
             logger.warning(f"Token expirado em {endpoint}. Renovando...")
             return 'renovar_token'
         
@@ -69,6 +101,7 @@ class ExtratorBling:
             )
             return 'parar'
         
+        self.limitador.registrar_sucesso(resposta.headers)
         return None
     
     def _extrair_dados_resposta(self, resposta: requests.Response) -> List[Dict]:
@@ -76,107 +109,363 @@ class ExtratorBling:
         payload = resposta.json()
         return payload.get('data', [])
     
-    def _buscar_todas_paginas(self, endpoint: str, parametros: Dict[str, Any], delay_segundos: float = 0.5) -> List[Dict]:
+    def _pagina_em_cache(self, url: str, parametros: Dict[str, Any]) -> Optional[List[Dict]]:
+        """Itens da página no cache de respostas (Config.HTTP_CACHE_ATIVO), ou None."""
+        cache = obter_cache_respostas()
+        corpo = cache.ler("bling", url, parametros) if cache else None
+        return None if corpo is None else json.loads(corpo).get('data', [])
+
+    def _guardar_pagina(self, endpoint: str, url: str, parametros: Dict[str, Any], corpo: bytes) -> None:
+        cache = obter_cache_respostas()
+        if cache:
+            cache.gravar("bling", url, parametros, corpo, self._ttl_cache(endpoint))
+
+    def _ttl_cache(self, endpoint: str) -> float:
+        # O catálogo é filtrado pela data de alteração, não pelo dia alvo: nunca fica imutável
+        return ttl_cache(endpoint, None if endpoint == "produtos" else self.data_alvo)
+
+    def _iterar_paginas(self, endpoint: str, parametros: Dict[str, Any], pagina_inicial: int = 1) -> Iterator[List[Dict]]:
         """
-        MÉTODO MOTOR ATUALIZADO:
-        Agora aceita 'delay_segundos' para controlar a velocidade.
+        MÉTODO MOTOR (gerador):
+        Produz os itens de cada página assim que ela chega, sem acumular o dia
+        em memória. A velocidade é ditada pelo limitador de taxa do Bling,
+        compartilhado entre threads, em vez de pausas fixas.
+
+        Com Config.MOTOR_EXTRACAO = "async", delega ao motor assíncrono.
+        `pagina_inicial` permite retomar de um checkpoint.
         """
-        pagina = 1
-        dados_coletados = []
-        url = f"{self.URL_BASE}/{endpoint}"
+        if Config.MOTOR_EXTRACAO == "async":
+            yield from self._iterar_paginas_async(endpoint, parametros, pagina_inicial)
+            return
+
+        pagina = pagina_inicial
+        total = 0
+        tentativas_429 = 0
+        tentativas_token = 0
+        url = self._construir_url(endpoint)
         
         # Headers iniciais
         cabecalhos = self._obter_cabecalhos()
 
-        logger.info(f"Iniciando extração: {endpoint} | Delay: {delay_segundos}s")
+        logger.info(f"Iniciando extração: {endpoint} | Taxa: {self.limitador.taxa:.2f} req/s")
 
         while True:
             parametros['pagina'] = pagina
-            parametros['limite'] = 100 
+            parametros['limite'] = self.LIMITE_POR_PAGINA
+
+            # Página já baixada numa execução anterior: sem limitador nem API
+            itens = self._pagina_em_cache(url, parametros)
 
-            try:
-                # Adicionei timeout=30 para não travar se a rede cair
-                resposta = requests.get(url, headers=cabecalhos, params=parametros, timeout=30)
+            if itens is None:
+                try:
+                    self.limitador.adquirir()
+                    # Timeout (conexão, leitura); falhas de rede e 5xx já são repetidas pela sessão
+                    with medir("bling.http"):
+                        resposta = self.sessao.get(url, headers=cabecalhos, params=parametros, timeout=Config.HTTP_TIMEOUT)
+                except requests.RequestException as e:
+                    # Retries da sessão esgotados: falha a extração em vez de salvar o dia truncado
+                    logger.error(f"Erro de rede em {endpoint} (página {pagina}): {e}")
+                    raise
 
-                # --- MUDANÇA CRÍTICA AQUI (TRATAMENTO DE 429) ---
-                if resposta.status_code == 429:
-                    logger.warning("Rate limit (429) atingido. O Bling pediu para parar.")
-                    logger.warning("Aguardando 15 segundos para esfriar...")
-                    time.sleep(15) # Aumentado de 3 para 15 segundos
+                acao = self._tratar_resposta_erro(resposta, endpoint, tentativas_429)
+
+                if acao == 'retry':
+                    tentativas_429 += 1
+                    if tentativas_429 > self.MAX_TENTATIVAS_RATE_LIMIT:
+                        raise RuntimeError(
+                            f"Rate limit persistente em {endpoint} (página {pagina}) "
+                            f"após {self.MAX_TENTATIVAS_RATE_LIMIT} tentativas"
+                        )
                     continue
                 
-                # Tratamento de Token (401)
-                if resposta.status_code == 401:
-                    logger.warning("Token expirou. Renovando...")
-                    cabecalhos = self._obter_cabecalhos()
+                if acao == 'renovar_token':
+                    tentativas_token += 1
+                    self._checar_tentativas_token(tentativas_token, f"{endpoint} (página {pagina})")
+                    cabecalhos = self._renovar_cabecalhos(cabecalhos)
                     continue
 
-                if resposta.status_code != 200:
-                    logger.error(f"Erro API {endpoint}: {resposta.status_code} - {resposta.text}")
-                    break
-
-                payload = resposta.json()
-                itens = payload.get('data', [])
+                if acao == 'parar':
+                    # Só página 200 vazia é fim dos dados; gravar o resto truncaria o dia
+                    raise RuntimeError(f"Erro {resposta.status_code} em {endpoint} (página {pagina})")
 
-                if not itens:
-                    break
+                tentativas_429 = 0
+                tentativas_token = 0
+                with medir("bling.decodificar"):
+                    itens = self._extrair_dados_resposta(resposta)
+                self._guardar_pagina(endpoint, url, parametros, resposta.content)
 
-                dados_coletados.extend(itens)
-                logger.info(f"Página {pagina} baixada: {len(itens)} itens.")
-                
-                pagina += 1
-                
-                # --- MUDANÇA AQUI (USA O DELAY CUSTOMIZADO) ---
-                time.sleep(delay_segundos) 
-
-            except Exception as e:
-                logger.error(f"Erro crítico: {e}")
-                # Em caso de erro de conexão, espera um pouco antes de quebrar ou tentar de novo
-                time.sleep(5)
+            if not itens:
                 break
+
+            total += len(itens)
+            PAGINAS.inc(api="bling", endpoint=endpoint)
+            REGISTROS.inc(len(itens), api="bling", endpoint=endpoint)
+            logger.info(f"Página {pagina} baixada: {len(itens)} itens.")
+            
+            pagina += 1
+            yield itens
         
-        return dados_coletados
+        logger.info(f"Fim da paginação de {endpoint}. Total: {total}")
     
-    def _salvar(self, dados: List[Dict], pasta: str) -> None:
-        """Persiste dados no GCS com particionamento por data em formato NDJSON."""
-        if not dados:
-            logger.info(f"Nenhum dado para salvar em {pasta}")
-            return
+    def _iterar_paginas_async(self, endpoint: str, parametros: Dict[str, Any], pagina_inicial: int = 1) -> Iterator[List[Dict]]:
+        """
+        Mesmo contrato de `_iterar_paginas`, mas as páginas são buscadas pelo
+        motor assíncrono: várias páginas em voo num único event loop, dentro
+        do semáforo e do limitador de taxa do Bling.
+        """
+        from app.async_engine import obter_motor
+
+        motor = obter_motor()
+        url = self._construir_url(endpoint)
+        total = 0
+        # As páginas rodam no event loop, fora da thread da tarefa
+        cronometria = cronometria_atual()
+
+        async def buscar_pagina(pagina: int) -> List[Dict]:
+            params = dict(parametros, pagina=pagina, limite=self.LIMITE_POR_PAGINA)
+            # Limitador, requisição e decodificação juntos, com outras páginas em voo
+            with medir("bling.pagina_async", cronometria):
+                payload = await motor.buscar_json(
+                    "bling", url, params, self._obter_cabecalhos, renovar_cabecalhos=self._renovar_cabecalhos,
+                    ttl_cache=self._ttl_cache(endpoint),
+                )
+            return payload.get('data', [])
+
+        logger.info(f"Iniciando extração (async): {endpoint} | Em voo: {Config.ASYNC_CONCORRENCIA_POR_API['bling']}")
+
+        for pagina, itens in motor.iterar(motor.paginar("bling", buscar_pagina, inicio=pagina_inicial, passo=1)):
+            total += len(itens)
+            PAGINAS.inc(api="bling", endpoint=endpoint)
+            REGISTROS.inc(len(itens), api="bling", endpoint=endpoint)
+            logger.info(f"Página {pagina} baixada: {len(itens)} itens.")
+            yield itens
+
+        logger.info(f"Fim da paginação de {endpoint}. Total: {total}")
+    
+    def _iterar_registros(self, endpoint: str, parametros: Dict[str, Any]) -> Iterator[Dict]:
+        """Achata as páginas de `_iterar_paginas` em registros individuais."""
+        for itens in self._iterar_paginas(endpoint, parametros):
+            yield from itens
+    
+    def _caminho_particao(self, pasta: str, data_alvo: Optional[str] = None) -> str:
+        return (
+            f"{Config.CAMINHO_BASE_RAW}/{pasta}/"
+            f"data_ref={data_alvo or self.data_alvo}/data{obter_formato(pasta).extensao}"
+        )
+    
+    def _salvar(self, dados: Iterable[Dict], pasta: str) -> int:
+        """
+        Persiste dados no GCS com particionamento por data, no formato
+        configurado para a pasta (Config.FORMATO_SAIDA).
+        Aceita qualquer iterável: os registros são gravados em streaming.
+        Retorna o número de registros salvos.
+        """
+        caminho = self._caminho_particao(pasta)
+        
+        try:
+            total = salvar_registros(self.bucket, caminho, dados, formato=obter_formato(pasta))
+        except Exception as e:
+            logger.error(f"Erro ao salvar no GCS ({caminho}): {e}")
+            raise
         
-        if not all(isinstance(d, dict) for d in dados):
-            raise ValueError("Todos os itens devem ser dicionários")
+        if not total:
+            logger.info(f"Nenhum dado para salvar em {pasta}")
+            return 0
         
-        caminho = (
-            f"{Config.CAMINHO_BASE_RAW}/{pasta}/"
-            f"data_ref={self.data_alvo}/data.json"
+        logger.info(
+            f"✓ Salvos {total} registros em gs://{Config.BUCKET_NAME}/{caminho}"
         )
+        return total
+    
+    def _extrair_particao(self, endpoint: str, parametros: Dict[str, Any], pasta: str) -> int:
+        """
+        Extrai o endpoint e grava a partição do dia. Com checkpoint ativo, a
+        extração é retomável (ver ExtracaoCheckpointada); senão, streaming direto.
+        """
+        if not Config.CHECKPOINT_ATIVO:
+            return self._salvar(self._iterar_registros(endpoint, parametros), pasta)
         
+        extracao = ExtracaoCheckpointada(
+            self.gcs, self.bucket, "bling", pasta, self.data_alvo, self._caminho_particao(pasta)
+        )
         try:
-            conteudo_ndjson = '\n'.join(
-                json.dumps(registro, ensure_ascii=False) 
-                for registro in dados
+            return extracao.executar(
+                lambda pagina: self._iterar_paginas(endpoint, parametros, pagina),
+                inicio=1,
+                passo=1,
             )
-            
-            blob = self.bucket.blob(caminho)  # ✅ Usa self.bucket
-            blob.metadata = {'num_registros': str(len(dados))}
-            
-            blob.upload_from_string(
-                conteudo_ndjson,
-                content_type='application/x-ndjson; charset=utf-8'
-            )
-            
-            logger.info(
-                f"✓ Salvos {len(dados)} registros em gs://{Config.BUCKET_NAME}/{caminho}"
-            )
-            
         except Exception as e:
-            logger.error(f"Erro ao salvar no GCS ({caminho}): {e}")
+            logger.error(f"Erro ao extrair {pasta} ({self.data_alvo}): {e}")
             raise
         
+    def _janelas_do_dia(self) -> List[Tuple[datetime, datetime]]:
+        """Janelas disjuntas [início, fim] (segundos inclusivos) de Config.NFE_JANELA_MINUTOS cobrindo o dia alvo."""
+        inicio = datetime.strptime(self.data_alvo, "%Y-%m-%d")
+        fim_do_dia = inicio + timedelta(days=1)
+        passo = timedelta(minutes=Config.NFE_JANELA_MINUTOS)
+        janelas = []
+        while inicio < fim_do_dia:
+            janelas.append((inicio, min(inicio + passo, fim_do_dia) - timedelta(seconds=1)))
+            inicio += passo
+        return janelas
+
+    def _buscar_janela(self, endpoint: str, parametros: Dict[str, Any], janela: Tuple[datetime, datetime]) -> List[Dict]:
+        """
+        Registros emitidos na janela; acima de Config.NFE_JANELA_MAX_PAGINAS
+        páginas ela é dividida ao meio e as metades buscadas em paralelo.
+        """
+        inicio, fim = janela
+        params = dict(
+            parametros,
+            dataEmissaoInicial=inicio.strftime("%Y-%m-%d %H:%M:%S"),
+            dataEmissaoFinal=fim.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        duracao_s = int((fim - inicio).total_seconds()) + 1
+        divisivel = duracao_s >= 2 * Config.NFE_JANELA_MINIMA_S
+
+        itens: List[Dict] = []
+        paginas = self._iterar_paginas(endpoint, params)
+        try:
+            for numero, pagina in enumerate(paginas, start=1):
+                itens.extend(pagina)
+                if divisivel and numero >= Config.NFE_JANELA_MAX_PAGINAS and len(pagina) == self.LIMITE_POR_PAGINA:
+                    break
+            else:
+                return itens
+        finally:
+            paginas.close()
+
+        meio = inicio + timedelta(seconds=duracao_s // 2)
+        logger.info(
+            f"Janela {params['dataEmissaoInicial']} - {params['dataEmissaoFinal']} de {endpoint} "
+            f"passou de {Config.NFE_JANELA_MAX_PAGINAS} páginas; dividindo ao meio"
+        )
+        metades = [(inicio, meio - timedelta(seconds=1)), (meio, fim)]
+        resultado: List[Dict] = []
+        for parte in mapear_em_ordem(
+            lambda metade: self._buscar_janela(endpoint, parametros, metade), metades, 2, nome_threads="bling-janela"
+        ):
+            resultado.extend(parte)
+        return resultado
+
+    def _paginas_por_janela(
+        self, endpoint: str, parametros: Dict[str, Any], janelas: List[Tuple[datetime, datetime]], inicio: int
+    ) -> Iterator[List[Dict]]:
+        """Uma "página" por janela a partir de `inicio`, na ordem do dia, com até Config.NFE_JANELAS_CONCORRENCIA em voo."""
+        for itens in mapear_em_ordem(
+            lambda janela: self._buscar_janela(endpoint, parametros, janela),
+            janelas[inicio:],
+            Config.NFE_JANELAS_CONCORRENCIA,
+            nome_threads="bling-janela",
+        ):
+            unicos: Dict[Any, Dict] = {}
+            for item in itens:
+                unicos.setdefault(item["id"], item)
+            yield list(unicos.values())
+
+    def _extrair_particao_janelas(self, endpoint: str, parametros: Dict[str, Any], pasta: str) -> int:
+        """
+        Como `_extrair_particao`, fatiando o dia em janelas de emissão. O
+        cursor do checkpoint é o índice da janela; uma janela por chunk.
+        """
+        janelas = self._janelas_do_dia()
+
+        def paginas(inicio: int) -> Iterator[List[Dict]]:
+            return self._paginas_por_janela(endpoint, parametros, janelas, inicio)
+
+        if not Config.CHECKPOINT_ATIVO:
+            return self._salvar((item for itens in paginas(0) for item in itens), pasta)
+
+        extracao = ExtracaoCheckpointada(
+            self.gcs, self.bucket, "bling", pasta, self.data_alvo, self._caminho_particao(pasta),
+            tipo_cursor=f"janela-{Config.NFE_JANELA_MINUTOS}min",
+        )
+        try:
+            return extracao.executar(paginas, inicio=0, passo=1, paginas_por_chunk=1)
+        except Exception as e:
+            logger.error(f"Erro ao extrair {pasta} ({self.data_alvo}): {e}")
+            raise
+
+    def _buscar_detalhe(self, endpoint: str, id_documento: Any) -> Optional[Dict]:
+        """
+        GET {endpoint}/{id} com o mesmo limitador, retry de 429 e renovação
+        de token da paginação. Retorna None se a API recusou o documento
+        (ex.: excluído entre a listagem e o detalhe).
+        """
+        url = self._construir_url(f"{endpoint}/{id_documento}")
+        cabecalhos = self._obter_cabecalhos()
+        tentativas_token = 0
+
+        for tentativa in range(self.MAX_TENTATIVAS_RATE_LIMIT + 1):
+            self.limitador.adquirir()
+            with medir("bling.http_detalhe"):
+                resposta = self.sessao.get(url, headers=cabecalhos, timeout=Config.HTTP_TIMEOUT)
+            acao = self._tratar_resposta_erro(resposta, endpoint, tentativa)
+
+            if acao == 'retry':
+                continue
+            if acao == 'renovar_token':
+                tentativas_token += 1
+                self._checar_tentativas_token(tentativas_token, f"{endpoint}/{id_documento}")
+                cabecalhos = self._renovar_cabecalhos(cabecalhos)
+                continue
+            if acao == 'parar':
+                return None
+            with medir("bling.decodificar"):
+                return resposta.json().get('data')
+
+        raise RuntimeError(
+            f"Rate limit persistente em {endpoint}/{id_documento} "
+            f"após {self.MAX_TENTATIVAS_RATE_LIMIT} tentativas"
+        )
+
+    def _enriquecer(self, endpoint: str, pasta: str) -> int:
+        """
+        Grava em `<pasta>_detalhe` o `{endpoint}/{id}` de cada documento da
+        partição de resumos; resumos inalterados vêm do CacheDetalhes.
+        """
+        pasta_detalhe = f"{pasta}_detalhe"
+        cache = CacheDetalhes(self.gcs, self.bucket, "bling", pasta_detalhe, self.data_alvo)
+        cache.carregar()
+        contagem = {"cache": 0, "api": 0, "recusados": 0}
+        contagem_lock = threading.Lock()
+
+        def detalhar(resumo: Dict) -> Optional[Dict]:
+            versao = versao_resumo(resumo)
+            detalhe = cache.obter(resumo["id"], versao)
+            origem = "cache"
+            if detalhe is None:
+                detalhe = self._buscar_detalhe(endpoint, resumo["id"])
+                origem = "api" if detalhe is not None else "recusados"
+                if detalhe is not None:
+                    cache.guardar(resumo["id"], versao, detalhe)
+            with contagem_lock:
+                contagem[origem] += 1
+            DETALHES.inc(api="bling", endpoint=endpoint, origem=origem)
+            return detalhe
+
+        logger.info(f"Enriquecendo {pasta} ({self.data_alvo}) com {endpoint}/{{id}}")
+        resumos = ler_particao(self.bucket, self._caminho_particao(pasta), obter_formato(pasta))
+        detalhes = (
+            detalhe
+            for detalhe in mapear_em_ordem(detalhar, resumos, Config.DETALHES_CONCORRENCIA)
+            if detalhe is not None
+        )
+        total = self._salvar(detalhes, pasta_detalhe)
+        cache.compactar()
+        marcar_completa(self.gcs, "bling", pasta_detalhe, self.data_alvo, total)
+
+        logger.info(
+            f"Detalhes de {pasta}: {contagem['cache']} do cache, {contagem['api']} buscados, "
+            f"{contagem['recusados']} recusados pela API"
+        )
+        return total
+
     def extrair_vendas(self) -> int:
         """
         Extrai pedidos de venda do dia alvo.
-        Usa filtro por data inicial/final conforme API Bling v3.
+        Usa filtro por data inicial/final conforme API Bling v3. O filtro não
+        aceita hora, então, ao contrário da NFe, o dia não é fatiado em janelas.
         """
         endpoint = "pedidos/vendas"
         parametros = {
@@ -184,10 +473,10 @@ class ExtratorBling:
             "dataFinal": self.data_alvo
         }
         
-        dados = self._buscar_todas_paginas(endpoint, parametros)
-        self._salvar(dados, "pedidos_vendas")
-        
-        return len(dados)
+        total = self._extrair_particao(endpoint, parametros, "pedidos_vendas")
+        if Config.ENRIQUECER_DETALHES and total:
+            self._enriquecer(endpoint, "pedidos_vendas")
+        return total
     
     def extrair_nfe(self) -> int:
         endpoint = "nfe"
@@ -202,39 +491,73 @@ class ExtratorBling:
             "tipo": 1  # Opcional: 1=Saída (Vendas)
         }
         
-        # Mantendo o delay maior para não dar Rate Limit
-        dados = self._buscar_todas_paginas(endpoint, parametros, delay_segundos=1.5)
-        
-        self._salvar(dados, "nfe")
-        return len(dados)
+        # AJUSTE 3: o filtro aceita hora, então o dia pode ser fatiado em janelas
+        if Config.NFE_JANELA_MINUTOS > 0:
+            total = self._extrair_particao_janelas(endpoint, parametros, "nfe")
+        else:
+            total = self._extrair_particao(endpoint, parametros, "nfe")
+        if Config.ENRIQUECER_DETALHES and total:
+            self._enriquecer(endpoint, "nfe")
+        return total
     
-    def executar_pipeline_diario(self) -> int:
-        """Executa pipeline completo de extração diária."""
-        logger.info(f"=== Pipeline Iniciado: {self.data_alvo} ===")
-        
-        total_vendas = 0
-        total_nfe = 0
-        
-        # Extração de Vendas com proteção
-        try:
-            logger.info("[INICIO] Extraindo vendas...")
-            total_vendas = self.extrair_vendas()
-            logger.info(f"[SUCESSO] Vendas extraídas: {total_vendas}")
-        except Exception as e:
-            logger.error(f"[ERRO] Falha ao extrair vendas: {e}")
-        
-        # Extração de NFe com proteção
-        try:
-            logger.info("[INICIO] Extraindo NFe...")
-            total_nfe = self.extrair_nfe()
-            logger.info(f"[SUCESSO] NFe extraídas: {total_nfe}")
-        except Exception as e:
-            logger.error(f"[ERRO] Falha ao extrair NFe: {e}")
-        
-        # total_produtos = self.extrair_produtos()
-        # logger.info(f"Produtos extraídos: {total_produtos}")
-        
-        total_processado = total_vendas + total_nfe
-        logger.info(f"=== Pipeline Finalizado: {total_processado} registros totais ===")
-        
-        return total_processado
\ No newline at end of file
+    def extrair_produtos(self) -> int:
+        """Grava na partição `produtos` do dia só os produtos alterados desde a marca d'água do índice."""
+        endpoint = "produtos"
+        indice = IndiceProdutos(self.bucket, Config.CAMINHO_INDICE_PRODUTOS)
+        indice.carregar()
+
+        fim = datetime.strptime(self.data_alvo, "%Y-%m-%d") + timedelta(days=1, seconds=-1)
+        if indice.marca_dagua is not None and indice.marca_dagua > fim:
+            # O índice só avança: um dia anterior à marca d'água não tem como ser reextraído
+            raise RuntimeError(
+                f"Produtos de {self.data_alvo} anteriores à marca d'água "
+                f"({indice.marca_dagua:{FORMATO_MARCA}}); sincronização incremental não reextrai dias passados"
+            )
+        if indice.marca_dagua == fim:
+            logger.info(f"Produtos de {self.data_alvo} já sincronizados; nada a extrair")
+            return 0
+
+        parametros: Dict[str, Any] = {}
+        if indice.marca_dagua is not None:
+            inicio = indice.marca_dagua - timedelta(seconds=Config.PRODUTOS_SOBREPOSICAO_S)
+            parametros = {
+                "dataAlteracaoInicial": inicio.strftime(FORMATO_MARCA),
+                "dataAlteracaoFinal": fim.strftime(FORMATO_MARCA),
+            }
+
+        alterados = (produto for produto in self._iterar_registros(endpoint, parametros) if indice.alterado(produto))
+        total = self._salvar(alterados, "produtos")
+
+        if total and self.data_alvo not in indice.deltas:
+            indice.deltas.append(self.data_alvo)
+        if indice.ultimo_snapshot is None or (
+            datetime.strptime(self.data_alvo, "%Y-%m-%d") - datetime.strptime(indice.ultimo_snapshot, "%Y-%m-%d")
+        ).days >= Config.PRODUTOS_SNAPSHOT_DIAS:
+            self._compactar_produtos(indice)
+
+        # O delta já está gravado: só agora a marca d'água avança
+        indice.marca_dagua = fim
+        indice.salvar()
+        marcar_completa(self.gcs, "bling", "produtos", self.data_alvo, total)
+
+        logger.info(f"Produtos: {total} alterados de {len(indice.hashes)} no índice")
+        return total
+
+    def _compactar_produtos(self, indice: IndiceProdutos) -> int:
+        """
+        Grava em `produtos_snapshot` (partição do dia alvo) o catálogo
+        completo: o último snapshot com os deltas posteriores aplicados, na
+        ordem, sem nenhuma requisição à API. Os deltas compactados saem do índice.
+        """
+        catalogo: Dict[str, Dict] = {}
+        origens = [("produtos_snapshot", indice.ultimo_snapshot)] if indice.ultimo_snapshot else []
+        origens += [("produtos", data) for data in indice.deltas]
+        for pasta, data in origens:
+            for produto in ler_particao(self.bucket, self._caminho_particao(pasta, data), obter_formato(pasta)):
+                catalogo[str(produto["id"])] = produto
+
+        logger.info(f"Compactando snapshot de produtos ({self.data_alvo}): {len(origens)} partições")
+        total = self._salvar(catalogo.values(), "produtos_snapshot")
+        indice.ultimo_snapshot = self.data_alvo if total else None
+        indice.deltas = []
+        return total
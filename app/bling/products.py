@@ -0,0 +1,70 @@
+import gzip
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from google.api_core.exceptions import PreconditionFailed
+
+from app.gcs_handler import logger
+from app.metrics import GCS_BYTES, GCS_ESCRITA, PRODUTOS
+from .details import versao_resumo
+
+FORMATO_MARCA = "%Y-%m-%d %H:%M:%S"
+
+
+class IndiceProdutos:
+    """
+    Hash de cada produto já visto, marca d'água e snapshot/deltas do catálogo,
+    num JSON gzip gravado com precondição de geração.
+    """
+
+    def __init__(self, bucket, caminho: str):
+        self.bucket = bucket
+        self.caminho = caminho
+        self.hashes: Dict[str, str] = {}
+        self.marca_dagua: Optional[datetime] = None
+        self.ultimo_snapshot: Optional[str] = None
+        self.deltas: List[str] = []
+        self._geracao = 0
+
+    def carregar(self) -> None:
+        blob = self.bucket.get_blob(self.caminho)
+        if blob is None:
+            logger.info(f"Índice de produtos inexistente ({self.caminho}): sincronização completa")
+            return
+        dados = json.loads(gzip.decompress(blob.download_as_bytes(if_generation_match=blob.generation)))
+        self._geracao = blob.generation
+        self.hashes = dados.get("hashes", {})
+        marca = dados.get("marca_dagua")
+        self.marca_dagua = datetime.strptime(marca, FORMATO_MARCA) if marca else None
+        self.ultimo_snapshot = dados.get("ultimo_snapshot")
+        self.deltas = list(dados.get("deltas", []))
+        logger.info(f"Índice de produtos: {len(self.hashes)} produtos, marca d'água {marca}")
+
+    def alterado(self, produto: Dict[str, Any]) -> bool:
+        """True (e o hash é atualizado) se o produto é novo ou mudou desde a última sincronização."""
+        chave = str(produto["id"])
+        versao = versao_resumo(produto)[:16]
+        if self.hashes.get(chave) == versao:
+            PRODUTOS.inc(resultado="inalterado")
+            return False
+        self.hashes[chave] = versao
+        PRODUTOS.inc(resultado="alterado")
+        return True
+
+    def salvar(self) -> None:
+        conteudo = gzip.compress(json.dumps({
+            "marca_dagua": self.marca_dagua.strftime(FORMATO_MARCA) if self.marca_dagua else None,
+            "ultimo_snapshot": self.ultimo_snapshot,
+            "deltas": self.deltas,
+            "hashes": self.hashes,
+        }, separators=(",", ":")).encode("utf-8"), mtime=0)
+
+        blob = self.bucket.blob(self.caminho)
+        try:
+            with GCS_ESCRITA.cronometrar(operacao="indice_produtos"):
+                blob.upload_from_string(conteudo, content_type="application/gzip", if_generation_match=self._geracao)
+        except PreconditionFailed:
+            raise RuntimeError(f"Índice de produtos alterado por outra execução: {self.caminho}")
+        GCS_BYTES.inc(len(conteudo), operacao="indice_produtos")
+        self._geracao = blob.generation
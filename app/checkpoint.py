@@ -0,0 +1,421 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import Config
+from app.gcs_handler import logger
+from app.metrics import ETAPA_DURACAO, GCS_ESCRITA
+from app.profiling import medir, propagar
+from app.writer import (
+    ARQUIVO_MANIFESTO,
+    LAYOUT_ARQUIVO,
+    EscritorNDJSON,
+    Formato,
+    arquivo_temporario,
+    conteudo_igual,
+    crc32c_base64,
+    enviar_arquivo,
+    gravar_manifesto,
+    obter_formato,
+    particao_em_partes,
+    pasta_da_particao,
+    registrar_particao,
+    salvar_registros,
+)
+
+# Limite de objetos por chamada de compose no GCS
+MAX_FONTES_COMPOSE = 32
+
+STATUS_EM_ANDAMENTO = "em_andamento"
+STATUS_COMPLETO = "completo"
+
+
+def caminho_checkpoint(fonte: str, pasta: str, data_alvo: str) -> str:
+    """Pasta do checkpoint de uma partição, ao lado dos tokens em config/."""
+    return f"{Config.CAMINHO_CHECKPOINTS}/{fonte}/{pasta}/data_ref={data_alvo}"
+
+
+def particao_completa(gcs, fonte: str, pasta: str, data_alvo: str) -> bool:
+    """True se a partição já passou pelo commit final."""
+    estado = gcs.read_json(f"{caminho_checkpoint(fonte, pasta, data_alvo)}/checkpoint.json")
+    return bool(estado) and estado.get("status") == STATUS_COMPLETO
+
+
+def marcar_completa(gcs, fonte: str, pasta: str, data_alvo: str, num_registros: int) -> None:
+    """Registra como completa uma partição gravada sem chunks (ex.: detalhes do enriquecimento)."""
+    gcs.salvar_json(f"{caminho_checkpoint(fonte, pasta, data_alvo)}/checkpoint.json", {
+        "fonte": fonte,
+        "pasta": pasta,
+        "data_alvo": data_alvo,
+        "status": STATUS_COMPLETO,
+        "chunks": [],
+        "num_registros": num_registros,
+        "atualizado_em": time.time(),
+    })
+
+
+class ExtracaoCheckpointada:
+    """
+    Extração retomável de uma partição (endpoint + data_alvo): páginas em
+    chunks sob config/checkpoints/, com o cursor no checkpoint.json a cada
+    chunk, e no commit final o compose dos chunks em `caminho_final`.
+    """
+
+    def __init__(
+        self,
+        gcs,
+        bucket,
+        fonte: str,
+        pasta: str,
+        data_alvo: str,
+        caminho_final: str,
+        transformar: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        formato: Optional[Formato] = None,
+        tipo_cursor: str = "pagina",
+    ):
+        self.gcs = gcs
+        self.bucket = bucket
+        self.fonte = fonte
+        self.pasta = pasta
+        self.data_alvo = data_alvo
+        self.caminho_final = caminho_final
+        self.transformar = transformar
+        self.formato = formato or obter_formato(pasta)
+        # O que o cursor conta (página, offset, janela do dia...): cursor de
+        # outro tipo não é retomável
+        self.tipo_cursor = tipo_cursor
+        self.pasta_checkpoint = caminho_checkpoint(fonte, pasta, data_alvo)
+        self.caminho_estado = f"{self.pasta_checkpoint}/checkpoint.json"
+
+    def _estado_inicial(self, inicio: int) -> Dict[str, Any]:
+        return {
+            "fonte": self.fonte,
+            "pasta": self.pasta,
+            "data_alvo": self.data_alvo,
+            "formato": self.formato.nome,
+            "status": STATUS_EM_ANDAMENTO,
+            "cursor": inicio,
+            "chunks": [],
+            "num_registros": 0,
+            "crc32c": 0,
+            "layout": Config.LAYOUT_PARTICAO,
+            "tipo_cursor": self.tipo_cursor,
+            "chunks_info": [],
+        }
+
+    def _persistir(self, estado: Dict[str, Any]) -> None:
+        estado["atualizado_em"] = time.time()
+        self.gcs.salvar_json(self.caminho_estado, estado)
+
+    def _carregar(self, inicio: int) -> Dict[str, Any]:
+        estado = self.gcs.read_json(self.caminho_estado)
+        if not estado:
+            return self._estado_inicial(inicio)
+
+        if estado.get("status") == STATUS_COMPLETO:
+            logger.info(f"Partição {self.pasta} ({self.data_alvo}) já completa. Reprocessando do início.")
+            novo = self._estado_inicial(inicio)
+            novo["anteriores"] = self._chunks_publicados(estado)
+            return novo
+
+        if estado.get("reaproveitados") and not self._publicada_intacta(estado["anteriores"]):
+            logger.info(f"Partição {self.pasta} ({self.data_alvo}) mudou desde o checkpoint. Reprocessando do início.")
+            return self._estado_inicial(inicio)
+
+        if (
+            estado.get("formato", "ndjson") != self.formato.nome
+            or estado.get("layout", LAYOUT_ARQUIVO) != Config.LAYOUT_PARTICAO
+            or estado.get("tipo_cursor", "pagina") != self.tipo_cursor
+        ):
+            logger.info(f"Formato, layout ou cursor de {self.pasta} mudou desde o checkpoint. Reprocessando do início.")
+            return self._estado_inicial(inicio)
+
+        logger.info(
+            f"Retomando {self.pasta} ({self.data_alvo}) do cursor {estado['cursor']} | "
+            f"{len(estado['chunks'])} chunks, {estado['num_registros']} registros já committados"
+        )
+        return estado
+
+    def _reaproveitavel(self) -> bool:
+        """Só o arquivo único concatenável é o próprio compose dos chunks, byte a byte."""
+        return self.formato.concatenavel and not particao_em_partes()
+
+    def _publicada_intacta(self, anteriores: List[Dict[str, Any]]) -> bool:
+        return bool(anteriores) and conteudo_igual(self.bucket, self.caminho_final, anteriores[-1]["crc32c"])
+
+    def _chunks_publicados(self, estado: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """CRC32C acumulado e bytes de cada chunk da partição publicada, se ela ainda é a do checkpoint."""
+        anteriores = [
+            {"crc32c": info["crc32c"], "bytes": info["bytes"]}
+            for info in estado.get("chunks_publicados", [])
+        ]
+        if (
+            not Config.PULAR_INALTERADAS
+            or not self._reaproveitavel()
+            or estado.get("formato", "ndjson") != self.formato.nome
+            or not self._publicada_intacta(anteriores)
+        ):
+            return []
+        return anteriores
+
+    def executar(
+        self,
+        iterar_paginas: Callable[[int], Iterator[List[Dict]]],
+        inicio: int,
+        passo: int,
+        paginas_por_chunk: Optional[int] = None,
+    ) -> int:
+        """
+        Consome `iterar_paginas(cursor)` a partir do último checkpoint.
+        `passo` é o avanço do cursor por página (1 para página, limite para offset).
+        Uma "página" pode vir vazia (ex.: janela do dia sem registros): o
+        cursor avança sem gerar chunk. `paginas_por_chunk` substitui
+        Config.CHECKPOINT_PAGINAS_POR_CHUNK.
+        Retorna o total de registros da partição.
+        """
+        paginas_por_chunk = paginas_por_chunk or Config.CHECKPOINT_PAGINAS_POR_CHUNK
+        estado = self._carregar(inicio)
+        cursor = estado["cursor"]
+        escritor = None
+        paginas_no_chunk = 0
+
+        try:
+            for itens in iterar_paginas(cursor):
+                if escritor is None:
+                    escritor = self._novo_escritor(estado)
+
+                escritor.escrever_todos(itens)
+                cursor += passo
+                paginas_no_chunk += 1
+
+                if paginas_no_chunk >= paginas_por_chunk:
+                    self._commit_chunk(estado, escritor, cursor)
+                    escritor = None
+                    paginas_no_chunk = 0
+
+            if escritor is not None:
+                self._commit_chunk(estado, escritor, cursor)
+        except Exception:
+            if escritor is not None:
+                escritor.abortar()
+            raise
+
+        with ETAPA_DURACAO.cronometrar(etapa="commit_final"):
+            return self._commit_final(estado)
+
+    def _novo_escritor(self, estado: Dict[str, Any]):
+        indice = len(estado["chunks"])
+        if self.formato.concatenavel:
+            nova_parte = self._abre_parte(estado)
+            # Enquanto todos os chunks batem com os da partição publicada, o
+            # chunk só é enviado se o seu CRC32C acumulado divergir
+            anteriores = estado.get("anteriores", [])
+            reaproveitavel = indice < len(anteriores) and estado.get("reaproveitados", 0) == indice
+            return self.formato.criar_escritor(
+                self.bucket,
+                f"{self.pasta_checkpoint}/chunk-{indice:05d}{self.formato.extensao}",
+                transformar=self.transformar,
+                continuacao=not nova_parte,
+                # Checkpoints anteriores ao CRC32C não têm a chave: sem comparação
+                crc_inicial=0 if nova_parte else estado.get("crc32c") or 0,
+                crc_anterior=anteriores[indice]["crc32c"] if reaproveitavel else None,
+            )
+        # Staging em NDJSON; a conversão para o formato final acontece no commit
+        return EscritorNDJSON(
+            self.bucket,
+            f"{self.pasta_checkpoint}/chunk-{indice:05d}.json",
+            transformar=self.transformar,
+            continuacao=indice > 0,
+        )
+
+    def _commit_chunk(self, estado: Dict[str, Any], escritor: EscritorNDJSON, cursor: int) -> None:
+        """Finaliza o chunk e só então registra no checkpoint (chunk órfão é regravado na retomada)."""
+        escritor.fechar(gravar_metadados=False)
+        estado["cursor"] = cursor
+        if escritor.num_registros:
+            # Chunk sem registros não gera objeto: só o cursor avança
+            estado["chunks"].append(escritor.caminho)
+            estado["num_registros"] += escritor.num_registros
+            if self.formato.concatenavel and "crc32c" in estado:
+                estado["crc32c"] = escritor.crc32c
+            enviado = not escritor.inalterado
+            if not enviado:
+                logger.info(f"Chunk igual ao da partição publicada, upload pulado: {escritor.caminho}")
+                estado["reaproveitados"] = estado.get("reaproveitados", 0) + 1
+            estado.setdefault("chunks_info", []).append({
+                "registros": escritor.num_registros,
+                "bytes": escritor.tamanho,
+                "bytes_json": escritor.num_bytes,
+                "crc32c": escritor.crc32c,
+                "nova_parte": not escritor.continuacao,
+                "enviado": enviado,
+            })
+        self._persistir(estado)
+
+    def _commit_final(self, estado: Dict[str, Any]) -> int:
+        total = estado["num_registros"]
+        chunks = estado["chunks"]
+        infos = estado.get("chunks_info", [])
+        enviados = [chunk for i, chunk in enumerate(chunks) if i >= len(infos) or infos[i].get("enviado", True)]
+        publicados = []
+
+        if chunks:
+            if self.formato.concatenavel and particao_em_partes():
+                with GCS_ESCRITA.cronometrar(operacao="compose"), medir("gcs.compose"):
+                    self._publicar_partes(estado)
+            elif self.formato.concatenavel:
+                publicados = infos
+                if self._inalterada(estado):
+                    registrar_particao(self.caminho_final, True)
+                else:
+                    destino = self.bucket.blob(self.caminho_final)
+                    destino.content_type = self.formato.content_type
+                    destino.metadata = {'num_registros': str(total)}
+                    fontes = enviados
+                    if estado.get("reaproveitados"):
+                        prefixo = self._prefixo(estado)
+                        fontes = [prefixo] + enviados
+                        if prefixo != self.caminho_final:
+                            enviados = [prefixo] + enviados
+                    with GCS_ESCRITA.cronometrar(operacao="compose"), medir("gcs.compose"):
+                        self._compor(destino, fontes)
+                    if Config.PULAR_INALTERADAS:
+                        registrar_particao(self.caminho_final, False)
+            else:
+                self._converter(chunks)
+
+            for chunk in enviados:
+                self.bucket.blob(chunk).delete()
+
+            destino = pasta_da_particao(self.caminho_final) if particao_em_partes() else self.caminho_final
+            logger.info(
+                f"✓ Salvos {total} registros em gs://{self.bucket.name}/{destino} "
+                f"({len(chunks)} chunks)"
+            )
+        else:
+            logger.info(f"Nenhum dado para salvar em {self.pasta}")
+
+        estado["status"] = STATUS_COMPLETO
+        estado["chunks"] = []
+        estado["chunks_info"] = []
+        estado["chunks_publicados"] = [
+            {"crc32c": info["crc32c"], "bytes": info["bytes"]} for info in publicados
+        ]
+        estado.pop("anteriores", None)
+        estado.pop("reaproveitados", None)
+        self._persistir(estado)
+        return total
+
+    def _prefixo(self, estado: Dict[str, Any]) -> str:
+        """
+        Objeto com os bytes dos chunks reaproveitados (não enviados): a própria
+        partição publicada, se todos os chunks dela bateram, ou o seu início,
+        baixado por intervalo e enviado como chunk.
+        """
+        anteriores = estado["anteriores"]
+        quantidade = estado["reaproveitados"]
+        if not self._publicada_intacta(anteriores):
+            raise RuntimeError(f"{self.caminho_final} mudou durante a extração; a próxima execução recomeça do início")
+        if quantidade == len(anteriores):
+            return self.caminho_final
+
+        tamanho = sum(info["bytes"] for info in anteriores[:quantidade])
+        caminho = f"{self.pasta_checkpoint}/chunk-prefixo{self.formato.extensao}"
+        temporario = arquivo_temporario(self.formato.extensao)
+        try:
+            temporario.close()
+            self.bucket.blob(self.caminho_final).download_to_filename(temporario.name, start=0, end=tamanho - 1)
+            enviar_arquivo(
+                self.bucket, caminho, temporario.name, self.formato.content_type,
+                anteriores[quantidade - 1]["crc32c"], tamanho,
+            )
+        finally:
+            os.remove(temporario.name)
+        return caminho
+
+    def _abre_parte(self, estado: Dict[str, Any]) -> bool:
+        """
+        Se o próximo chunk começa um arquivo novo: o primeiro sempre; no
+        layout em partes, também quando a parte em curso já atingiu os
+        limites de Config.PARTE_MAX_* ou o máximo de fontes de um compose.
+        """
+        if not estado["chunks"]:
+            return True
+        if not particao_em_partes():
+            return False
+
+        infos = estado["chunks_info"]
+        inicio = max(i for i, info in enumerate(infos) if info["nova_parte"])
+        atual = infos[inicio:]
+        return (
+            len(atual) >= MAX_FONTES_COMPOSE
+            or sum(info["registros"] for info in atual) >= Config.PARTE_MAX_REGISTROS
+            or sum(info["bytes_json"] for info in atual) >= Config.PARTE_MAX_BYTES
+        )
+
+    def _publicar_partes(self, estado: Dict[str, Any]) -> None:
+        """Compõe cada grupo de chunks numa parte (em paralelo) e grava o manifesto."""
+        grupos: List[List[int]] = []
+        for i, info in enumerate(estado["chunks_info"]):
+            if info["nova_parte"]:
+                grupos.append([])
+            grupos[-1].append(i)
+        pasta = pasta_da_particao(self.caminho_final)
+
+        def publicar(numero: int, grupo: List[int]) -> Tuple[Dict[str, Any], bool]:
+            infos = [estado["chunks_info"][i] for i in grupo]
+            arquivo = f"part-{numero:05d}{self.formato.extensao}"
+            parte = {
+                "arquivo": arquivo,
+                "num_registros": sum(info["registros"] for info in infos),
+                "bytes": sum(info["bytes"] for info in infos),
+                "crc32c": crc32c_base64(infos[-1]["crc32c"]),
+            }
+            if Config.PULAR_INALTERADAS and conteudo_igual(self.bucket, f"{pasta}/{arquivo}", infos[-1]["crc32c"]):
+                return parte, True
+
+            destino = self.bucket.blob(f"{pasta}/{arquivo}")
+            destino.content_type = self.formato.content_type
+            destino.metadata = {'num_registros': str(parte["num_registros"])}
+            destino.compose([self.bucket.blob(estado["chunks"][i]) for i in grupo])
+            return parte, False
+
+        with ThreadPoolExecutor(max_workers=Config.PARTES_UPLOADS_SIMULTANEOS, thread_name_prefix="parte") as executor:
+            publicadas = list(executor.map(propagar(publicar), range(len(grupos)), grupos))
+
+        manifesto_inalterado = gravar_manifesto(self.bucket, pasta, self.formato, [parte for parte, _ in publicadas])
+        if Config.PULAR_INALTERADAS:
+            registrar_particao(
+                f"{pasta}/{ARQUIVO_MANIFESTO}",
+                manifesto_inalterado and all(inalterada for _, inalterada in publicadas),
+            )
+
+    def _inalterada(self, estado: Dict[str, Any]) -> bool:
+        return (
+            Config.PULAR_INALTERADAS
+            and estado.get("crc32c") is not None
+            and conteudo_igual(self.bucket, self.caminho_final, estado["crc32c"])
+        )
+
+    def _converter(self, chunks: List[str]) -> None:
+        """Relê os chunks NDJSON de staging e grava a partição final no formato (e layout) configurado."""
+        def registros() -> Iterator[Dict[str, Any]]:
+            for chunk in chunks:
+                with self.bucket.blob(chunk).open('rb') as arquivo:
+                    for linha in arquivo:
+                        if linha.strip():
+                            yield json.loads(linha)
+
+        salvar_registros(self.bucket, self.caminho_final, registros(), formato=self.formato)
+
+    def _compor(self, destino, chunks: List[str]) -> None:
+        """Compose em lotes de 32; o próprio destino entra como 1ª fonte dos lotes seguintes."""
+        fontes = [self.bucket.blob(chunk) for chunk in chunks]
+        destino.compose(fontes[:MAX_FONTES_COMPOSE])
+
+        restantes = fontes[MAX_FONTES_COMPOSE:]
+        lote = MAX_FONTES_COMPOSE - 1
+        for i in range(0, len(restantes), lote):
+            destino.compose([destino] + restantes[i:i + lote])
@@ -9,9 +9,18 @@ class Config:
     BLING_CLIENT_ID = os.getenv("BLING_CLIENT_ID")
     BLING_CLIENT_SECRET = os.getenv("BLING_CLIENT_SECRET")
 
+    # Armazenamento: "gcs" (bucket real), "local" (arquivos em
+    # STORAGE_DIRETORIO_LOCAL/<bucket>, para rodar offline) ou "memoria"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs").lower()
+    STORAGE_DIRETORIO_LOCAL = os.getenv("STORAGE_DIRETORIO_LOCAL", "/tmp/pipeline-storage")
+
     # Caminhos Fixos no Storage
     # O token fica na pasta de configuração
     TOKEN_PATH = "config/bling/tokens.json"
+    # Validade usada quando o tokens.json não traz expires_in, e folga para
+    # renovar antes de expirar (3600 - 600 = os 50 min de antes)
+    TOKEN_EXPIRACAO_PADRAO = 3600
+    TOKEN_MARGEM_RENOVACAO = int(os.getenv("TOKEN_MARGEM_RENOVACAO", "600"))
 
     # Os dados brutos ficam na pasta raw
     CAMINHO_BASE_RAW = "raw/bling"
@@ -19,4 +28,160 @@ class Config:
 
     #ANYMARKET API Configurações
     ANYMARKET_TOKEN = os.getenv("ANYMARKET_TOKEN")
-    CAMINHO_BASE_RAW_ANYMARKET = "raw/anymarket"
\ No newline at end of file
+    CAMINHO_BASE_RAW_ANYMARKET = "raw/anymarket"
+    # Quantas páginas (offsets) podem estar em voo ao mesmo tempo. 1 = sequencial
+    ANYMARKET_CONCORRENCIA = int(os.getenv("ANYMARKET_CONCORRENCIA", "4"))
+
+    # Teto de requisições por segundo por API (token bucket adaptativo).
+    # O limitador começa no teto, reduz pela metade a cada 429 e volta aos poucos.
+    # Bling v3 documenta 3 req/s por conta.
+    LIMITES_REQ_POR_SEGUNDO = {
+        "bling": float(os.getenv("BLING_REQ_POR_SEGUNDO", "3")),
+        "anymarket": float(os.getenv("ANYMARKET_REQ_POR_SEGUNDO", "5")),
+    }
+
+    # HTTP: timeout separado em (conexão, leitura) e retries de transporte
+    HTTP_TIMEOUT = (
+        float(os.getenv("HTTP_TIMEOUT_CONEXAO", "5")),
+        float(os.getenv("HTTP_TIMEOUT_LEITURA", "30")),
+    )
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+    # Conexões mantidas por API; acompanha a concorrência de cada extrator
+    HTTP_POOL_POR_API = {
+        "bling": int(os.getenv("BLING_POOL_CONEXOES", "8")),
+        "anymarket": max(ANYMARKET_CONCORRENCIA, int(os.getenv("ANYMARKET_POOL_CONEXOES", "4"))),
+    }
+
+    # Orquestração do /run: quantos endpoints de cada API extraem ao mesmo tempo
+    MAX_TAREFAS_POR_API = {
+        "bling": int(os.getenv("BLING_MAX_TAREFAS", "2")),
+        "anymarket": int(os.getenv("ANYMARKET_MAX_TAREFAS", "1")),
+    }
+
+    # Motor de extração: "threads" (requests) ou "async" (aiohttp, um event loop)
+    MOTOR_EXTRACAO = os.getenv("MOTOR_EXTRACAO", "threads").lower()
+    # Requisições em voo por API no motor async (semáforo + pool do conector)
+    ASYNC_CONCORRENCIA_POR_API = {
+        "bling": int(os.getenv("BLING_ASYNC_CONCORRENCIA", "8")),
+        "anymarket": int(os.getenv("ANYMARKET_ASYNC_CONCORRENCIA", "16")),
+    }
+    ASYNC_MAX_TENTATIVAS_RATE_LIMIT = 10
+    # Renovações seguidas de token após 401 antes de falhar a requisição
+    ASYNC_MAX_TENTATIVAS_TOKEN = 3
+
+    # Cache em disco das respostas das listagens (opt-in): reexecuções e
+    # backfills da mesma janela não gastam o orçamento de req/s. Chave =
+    # URL + parâmetros (inclui página/offset e filtros de data). Páginas de
+    # dias anteriores aos últimos HTTP_CACHE_DIAS_MUTAVEIS não expiram; as
+    # demais valem HTTP_CACHE_TTL_S[endpoint] segundos. Acima de
+    # HTTP_CACHE_MAX_BYTES, as menos usadas saem (LRU).
+    HTTP_CACHE_ATIVO = os.getenv("HTTP_CACHE_ATIVO", "false").lower() == "true"
+    HTTP_CACHE_DIRETORIO = os.getenv("HTTP_CACHE_DIRETORIO", "/tmp/pipeline-http-cache")
+    HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    HTTP_CACHE_DIAS_MUTAVEIS = int(os.getenv("HTTP_CACHE_DIAS_MUTAVEIS", "1"))
+    HTTP_CACHE_TTL_PADRAO_S = int(os.getenv("HTTP_CACHE_TTL_PADRAO_S", "3600"))
+    HTTP_CACHE_TTL_S = {
+        "pedidos/vendas": int(os.getenv("HTTP_CACHE_TTL_VENDAS_S", str(HTTP_CACHE_TTL_PADRAO_S))),
+        "nfe": int(os.getenv("HTTP_CACHE_TTL_NFE_S", str(HTTP_CACHE_TTL_PADRAO_S))),
+        "orders": int(os.getenv("HTTP_CACHE_TTL_ORDERS_S", str(HTTP_CACHE_TTL_PADRAO_S))),
+        "produtos": int(os.getenv("HTTP_CACHE_TTL_PRODUTOS_S", str(HTTP_CACHE_TTL_PADRAO_S))),
+    }
+
+    # Checkpoint/retomada das extrações (estado e chunks ao lado dos tokens)
+    CAMINHO_CHECKPOINTS = "config/checkpoints"
+    CHECKPOINT_ATIVO = os.getenv("CHECKPOINT_ATIVO", "true").lower() == "true"
+    # Páginas por chunk committado: quanto menor, menos se perde num restart
+    CHECKPOINT_PAGINAS_POR_CHUNK = int(os.getenv("CHECKPOINT_PAGINAS_POR_CHUNK", "50"))
+
+    # Backfill: quantas partições (dias) de cada API extraem ao mesmo tempo.
+    # O req/s continua limitado pelo token bucket compartilhado da API.
+    BACKFILL_MAX_TAREFAS_POR_API = {
+        "bling": int(os.getenv("BLING_BACKFILL_MAX_TAREFAS", "3")),
+        "anymarket": int(os.getenv("ANYMARKET_BACKFILL_MAX_TAREFAS", "4")),
+    }
+
+    # Formato de saída da zona raw por pasta (endpoint):
+    # "ndjson" (data.json), "ndjson.gz", "ndjson.zst" ou "parquet"
+    FORMATO_SAIDA_PADRAO = os.getenv("FORMATO_SAIDA_PADRAO", "ndjson")
+    FORMATO_SAIDA = {
+        "pedidos_vendas": os.getenv("FORMATO_PEDIDOS_VENDAS", FORMATO_SAIDA_PADRAO),
+        "nfe": os.getenv("FORMATO_NFE", FORMATO_SAIDA_PADRAO),
+        "orders": os.getenv("FORMATO_ORDERS", FORMATO_SAIDA_PADRAO),
+        "pedidos_vendas_detalhe": os.getenv("FORMATO_PEDIDOS_VENDAS_DETALHE", FORMATO_SAIDA_PADRAO),
+        "nfe_detalhe": os.getenv("FORMATO_NFE_DETALHE", FORMATO_SAIDA_PADRAO),
+        "produtos": os.getenv("FORMATO_PRODUTOS", FORMATO_SAIDA_PADRAO),
+        "produtos_snapshot": os.getenv("FORMATO_PRODUTOS_SNAPSHOT", FORMATO_SAIDA_PADRAO),
+    }
+    ZSTD_NIVEL = int(os.getenv("ZSTD_NIVEL", "3"))
+    PARQUET_COMPRESSAO = os.getenv("PARQUET_COMPRESSAO", "zstd")
+    PARQUET_LINHAS_POR_GRUPO = int(os.getenv("PARQUET_LINHAS_POR_GRUPO", "10000"))
+    # Reexecução que gera bytes idênticos (mesmo CRC32C do objeto no bucket)
+    # não regrava a partição: sem upload, sem nova geração, sem reprocessar a jusante
+    PULAR_INALTERADAS = os.getenv("PULAR_INALTERADAS", "true").lower() == "true"
+
+    # Por padrão o NDJSON é enviado direto, em chunks, durante a paginação.
+    # Com ESCRITA_EM_DISCO=true os registros vão antes para um temporário em
+    # DIRETORIO_TEMPORARIO, enviado no fim com o CRC32C conferido. No Cloud Run
+    # o /tmp é memória, então o padrão só liga a escrita em disco quando
+    # DIRETORIO_TEMPORARIO aponta para um volume.
+    DIRETORIO_TEMPORARIO = os.getenv("DIRETORIO_TEMPORARIO") or None
+    ESCRITA_EM_DISCO = os.getenv("ESCRITA_EM_DISCO", "true" if DIRETORIO_TEMPORARIO else "false").lower() == "true"
+
+    # Layout da partição: "arquivo" (um data.json) ou "partes" (part-00000.json,
+    # part-00001.json, ... e um _manifest.json gravado por último). Uma parte
+    # fecha ao atingir PARTE_MAX_REGISTROS registros ou PARTE_MAX_BYTES de JSON
+    # (antes da compressão); até PARTES_UPLOADS_SIMULTANEOS sobem em paralelo.
+    LAYOUT_PARTICAO = os.getenv("LAYOUT_PARTICAO", "arquivo")
+    PARTE_MAX_REGISTROS = int(os.getenv("PARTE_MAX_REGISTROS", "500000"))
+    # Partes NDJSON vão direto para o upload (um chunk de 8 MiB em memória por
+    # parte). Parquet e ESCRITA_EM_DISCO usam temporários: até
+    # (PARTES_UPLOADS_SIMULTANEOS + 1) x PARTE_MAX_BYTES em DIRETORIO_TEMPORARIO,
+    # que sem volume montado é memória (1,25 GiB com os padrões).
+    PARTE_MAX_BYTES = int(os.getenv("PARTE_MAX_BYTES", str(256 * 1024 * 1024)))
+    PARTES_UPLOADS_SIMULTANEOS = int(os.getenv("PARTES_UPLOADS_SIMULTANEOS", "4"))
+
+    # Enriquecimento Bling (opt-in, ENRIQUECER_DETALHES=true): detalhe
+    # (pedidos/vendas/{id}, nfe/{id}) de cada registro listado, gravado em
+    # <pasta>_detalhe. Custa uma requisição por documento novo ou alterado no
+    # mesmo limite de req/s das listagens. O cache guarda o detalhe junto da
+    # versão do resumo; detalhe com resumo igual não é rebuscado.
+    ENRIQUECER_DETALHES = os.getenv("ENRIQUECER_DETALHES", "false").lower() == "true"
+    DETALHES_CONCORRENCIA = int(os.getenv("DETALHES_CONCORRENCIA", "4"))
+    CAMINHO_CACHE_DETALHES = "config/cache_detalhes"
+    # Detalhes novos acumulados antes de gravar uma parte do cache
+    DETALHES_CACHE_POR_PARTE = int(os.getenv("DETALHES_CACHE_POR_PARTE", "500"))
+
+    # NFe: o dia é fatiado em janelas de emissão de NFE_JANELA_MINUTOS,
+    # buscadas em paralelo (NFE_JANELAS_CONCORRENCIA). Janela que passa de
+    # NFE_JANELA_MAX_PAGINAS páginas é dividida ao meio, até o mínimo de
+    # NFE_JANELA_MINIMA_S segundos. 0 minutos = uma consulta para o dia todo.
+    NFE_JANELA_MINUTOS = int(os.getenv("NFE_JANELA_MINUTOS", "60"))
+    NFE_JANELA_MAX_PAGINAS = int(os.getenv("NFE_JANELA_MAX_PAGINAS", "10"))
+    NFE_JANELA_MINIMA_S = int(os.getenv("NFE_JANELA_MINIMA_S", "60"))
+    NFE_JANELAS_CONCORRENCIA = int(os.getenv("NFE_JANELAS_CONCORRENCIA", "4"))
+
+    # Catálogo de produtos Bling, incremental: a cada execução só os produtos
+    # alterados desde a marca d'água (filtro dataAlteracao, com
+    # PRODUTOS_SOBREPOSICAO_S de folga) são consultados, e só os que de fato
+    # mudaram (hash diferente do índice id -> hash) vão para a partição
+    # `produtos` do dia. A cada PRODUTOS_SNAPSHOT_DIAS dias o último snapshot
+    # e os deltas seguintes são compactados em `produtos_snapshot`.
+    CAMINHO_INDICE_PRODUTOS = "config/indices/bling/produtos.json.gz"
+    PRODUTOS_SOBREPOSICAO_S = int(os.getenv("PRODUTOS_SOBREPOSICAO_S", "3600"))
+    PRODUTOS_SNAPSHOT_DIAS = int(os.getenv("PRODUTOS_SNAPSHOT_DIAS", "7"))
+
+    # Perfil por amostragem dos jobs do /run (todas as threads do processo),
+    # gravado em CAMINHO_PERFIS/<id do job>.folded.txt. Liga para todos os jobs
+    # com PROFILING_ATIVO, ou só para um com POST /run?profile=1.
+    PROFILING_ATIVO = os.getenv("PROFILING_ATIVO", "false").lower() == "true"
+    PROFILING_INTERVALO_MS = float(os.getenv("PROFILING_INTERVALO_MS", "10"))
+    CAMINHO_PERFIS = "config/perfis"
+
+    # Jobs do /run: estado persistido no bucket, execução em segundo plano
+    CAMINHO_JOBS = "config/jobs"
+    JOBS_MAX_SIMULTANEOS = int(os.getenv("JOBS_MAX_SIMULTANEOS", "2"))
+    # Enquanto o job não termina, a instância regrava o estado a cada
+    # JOB_BATIMENTO_S; sem atualização há mais que JOB_EXPIRACAO_S o job é
+    # considerado abandonado (instância morreu) e a chave fica livre.
+    JOB_BATIMENTO_S = int(os.getenv("JOB_BATIMENTO_S", "30"))
+    JOB_EXPIRACAO_S = int(os.getenv("JOB_EXPIRACAO_S", str(4 * JOB_BATIMENTO_S)))
\ No newline at end of file
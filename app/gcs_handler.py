@@ -1,25 +1,95 @@
 import json
 import logging
-from google.cloud import storage
+import threading
+
+from app.config import Config
+from app.metrics import GCS_BYTES, GCS_ESCRITA
+from app.profiling import medir
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("BlingGCS")
 
+_cliente = None
+_buckets = {}
+_cliente_lock = threading.Lock()
+
+
+def obter_cliente_storage():
+    """
+    Cliente do GCS único do processo. A descoberta de credenciais e o pool
+    de conexões do cliente saem caros; o import de google.cloud.storage só
+    acontece aqui, no primeiro uso, e não no boot do serviço.
+    """
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            from google.cloud import storage
+            _cliente = storage.Client()
+        return _cliente
+
+
+def obter_bucket(bucket_name):
+    """
+    Bucket do backend de Config.STORAGE_BACKEND, um objeto por nome: o do
+    cliente compartilhado do GCS, ou um dos backends de app.storage_backend
+    (mesma API de Bucket/Blob).
+    """
+    backend = Config.STORAGE_BACKEND
+    cliente = obter_cliente_storage() if backend == "gcs" else None
+    with _cliente_lock:
+        if bucket_name not in _buckets:
+            if backend == "gcs":
+                _buckets[bucket_name] = cliente.bucket(bucket_name)
+            elif backend == "local":
+                from app.storage_backend import BucketLocal
+                _buckets[bucket_name] = BucketLocal(bucket_name, Config.STORAGE_DIRETORIO_LOCAL)
+            elif backend == "memoria":
+                from app.storage_backend import BucketMemoria
+                _buckets[bucket_name] = BucketMemoria(bucket_name)
+            else:
+                raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+        return _buckets[bucket_name]
+
+
 class GCSHandler:
+    """JSONs de configuração e estado no bucket (GCS ou o backend de Config.STORAGE_BACKEND)."""
+
     def __init__(self, bucket_name):
-        self.client = storage.Client()
-        self.bucket = self.client.bucket(bucket_name)
+        self.bucket = obter_bucket(bucket_name)
 
     def read_json(self, blob_path):
-        blob = self.bucket.blob(blob_path)
-        if not blob.exists():
-            return None
-        return json.loads(blob.download_as_text())
+        with medir("gcs.ler_json"):
+            blob = self.bucket.blob(blob_path)
+            if not blob.exists():
+                return None
+            return json.loads(blob.download_as_text())
+
+    def read_json_com_geracao(self, blob_path):
+        """
+        Lê o JSON junto com a geração do objeto, para escritas condicionais.
+        Retorna (None, 0) se não existir; 0 como precondição significa
+        "só grava se o objeto ainda não existir".
+        """
+        with medir("gcs.ler_json"):
+            blob = self.bucket.get_blob(blob_path)
+            if blob is None:
+                return None, 0
+            conteudo = blob.download_as_text(if_generation_match=blob.generation)
+        return json.loads(conteudo), blob.generation
 
-    def salvar_json(self, blob_path, data):
+    def salvar_json(self, blob_path, data, if_generation_match=None):
+        """
+        Grava o JSON. Com `if_generation_match`, a escrita só acontece se o
+        objeto ainda estiver naquela geração; caso contrário o GCS responde 412
+        (google.api_core.exceptions.PreconditionFailed).
+        """
         blob = self.bucket.blob(blob_path)
-        blob.upload_from_string(
-            json.dumps(data, indent=4, ensure_ascii=False),
-            content_type='application/json'
-        )
+        conteudo = json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+        with GCS_ESCRITA.cronometrar(operacao="salvar_json"), medir("gcs.salvar_json"):
+            blob.upload_from_string(
+                conteudo,
+                content_type='application/json',
+                if_generation_match=if_generation_match
+            )
+        GCS_BYTES.inc(len(conteudo), operacao="salvar_json")
         logger.info(f"Salvo no GCS: gs://{self.bucket.name}/{blob_path}")
\ No newline at end of file
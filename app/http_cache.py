@@ -0,0 +1,174 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.config import Config
+from app.gcs_handler import logger
+from app.metrics import HTTP_CACHE
+
+# TTL das respostas de dias fechados: não expiram, só saem por LRU
+IMUTAVEL = math.inf
+
+
+def ttl_cache(endpoint: str, data_alvo: Optional[str]) -> float:
+    """
+    Validade (s) de uma página de `endpoint` filtrada pelo dia `data_alvo`.
+    Dias anteriores aos últimos Config.HTTP_CACHE_DIAS_MUTAVEIS estão
+    fechados e não mudam mais: IMUTAVEL. Os recentes, e as listagens que não
+    são de um dia (data_alvo None, ex.: o catálogo), usam o TTL do endpoint.
+    """
+    limite = date.today() - timedelta(days=Config.HTTP_CACHE_DIAS_MUTAVEIS)
+    if data_alvo is not None and date.fromisoformat(data_alvo) < limite:
+        return IMUTAVEL
+    return Config.HTTP_CACHE_TTL_S.get(endpoint, Config.HTTP_CACHE_TTL_PADRAO_S)
+
+
+def chave_cache(api: str, url: str, parametros: Dict[str, Any]) -> str:
+    """
+    API + caminho do endpoint + parâmetros normalizados (ordenados, como
+    texto); a página/offset faz parte dos parâmetros. O host fica de fora.
+    """
+    normalizados = sorted((str(nome), str(valor)) for nome, valor in parametros.items())
+    return hashlib.sha256(json.dumps([api, urlparse(url).path, normalizados]).encode("utf-8")).hexdigest()
+
+
+class CacheRespostas:
+    """
+    Cache em disco dos corpos das respostas 200 das listagens, abaixo dos
+    extratores: um acerto não consome o limitador de taxa nem vai à API.
+
+    Cada entrada é um arquivo <chave>.json com uma linha de cabeçalho
+    (url, parâmetros, expiração) seguida do corpo. O índice em memória é
+    um LRU limitado a `max_bytes`: o acesso move a entrada para o fim e a
+    gravação descarta as mais antigas. Ao subir, o índice é refeito a partir
+    do diretório, na ordem de último acesso (mtime, atualizado a cada acerto).
+    """
+
+    def __init__(self, diretorio: str, max_bytes: int):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        # chave -> (bytes no disco, expira_em; None = imutável)
+        self._indice: "OrderedDict[str, Tuple[int, Optional[float]]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+        self._carregar()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.json")
+
+    def _carregar(self) -> None:
+        entradas = []
+        for nome in os.listdir(self.diretorio):
+            caminho = os.path.join(self.diretorio, nome)
+            if nome.endswith(".tmp"):
+                # Gravação interrompida num processo anterior
+                self._remover_arquivo(caminho)
+            if not nome.endswith(".json"):
+                continue
+            try:
+                with open(caminho, "rb") as arquivo:
+                    cabecalho = json.loads(arquivo.readline())
+                estado = os.stat(caminho)
+            except (OSError, ValueError):
+                self._remover_arquivo(caminho)
+                continue
+            entradas.append((estado.st_mtime, nome[:-len(".json")], estado.st_size, cabecalho.get("expira_em")))
+
+        for _, chave, tamanho, expira_em in sorted(entradas):
+            self._indice[chave] = (tamanho, expira_em)
+            self._total += tamanho
+        self._despejar()
+        if self._indice:
+            logger.info(f"Cache HTTP {self.diretorio}: {len(self._indice)} respostas ({self._total} bytes)")
+
+    @staticmethod
+    def _remover_arquivo(caminho: str) -> None:
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+    def _esquecer(self, chave: str) -> None:
+        """Chamado com o lock."""
+        tamanho, _ = self._indice.pop(chave)
+        self._total -= tamanho
+        self._remover_arquivo(self._caminho(chave))
+
+    def _despejar(self) -> None:
+        """Descarta as entradas menos usadas até caber em max_bytes. Chamado com o lock (ou no __init__)."""
+        while self._total > self.max_bytes and self._indice:
+            self._esquecer(next(iter(self._indice)))
+
+    def ler(self, api: str, url: str, parametros: Dict[str, Any]) -> Optional[bytes]:
+        """Corpo da resposta em cache, ou None (ausente ou expirada)."""
+        chave = chave_cache(api, url, parametros)
+        with self._lock:
+            entrada = self._indice.get(chave)
+            if entrada is not None and entrada[1] is not None and entrada[1] <= time.time():
+                self._esquecer(chave)
+                entrada = None
+            if entrada is None:
+                HTTP_CACHE.inc(api=api, resultado="miss")
+                return None
+            self._indice.move_to_end(chave)
+
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as arquivo:
+                arquivo.readline()
+                corpo = arquivo.read()
+            os.utime(caminho)
+        except OSError:
+            # Removida por outro processo: vale como ausente
+            with self._lock:
+                if chave in self._indice:
+                    self._esquecer(chave)
+            HTTP_CACHE.inc(api=api, resultado="miss")
+            return None
+        HTTP_CACHE.inc(api=api, resultado="hit")
+        return corpo
+
+    def gravar(self, api: str, url: str, parametros: Dict[str, Any], corpo: bytes, ttl: float) -> None:
+        """Guarda o corpo de uma resposta 200; `ttl` IMUTAVEL não expira."""
+        chave = chave_cache(api, url, parametros)
+        expira_em = None if ttl == IMUTAVEL else time.time() + ttl
+        cabecalho = json.dumps({"url": url, "parametros": parametros, "expira_em": expira_em}, default=str)
+        conteudo = cabecalho.encode("utf-8") + b"\n" + corpo
+
+        # Escreve num temporário e troca: leitores nunca veem um arquivo pela metade
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        with os.fdopen(descritor, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, self._caminho(chave))
+
+        with self._lock:
+            if chave in self._indice:
+                self._total -= self._indice[chave][0]
+            self._indice[chave] = (len(conteudo), expira_em)
+            self._indice.move_to_end(chave)
+            self._total += len(conteudo)
+            self._despejar()
+
+
+_cache: Optional[CacheRespostas] = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache_respostas() -> Optional[CacheRespostas]:
+    """Cache único do processo, ou None se Config.HTTP_CACHE_ATIVO estiver desligado."""
+    global _cache
+    if not Config.HTTP_CACHE_ATIVO:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheRespostas(Config.HTTP_CACHE_DIRETORIO, Config.HTTP_CACHE_MAX_BYTES)
+        return _cache
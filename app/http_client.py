@@ -0,0 +1,70 @@
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import Config
+from app.metrics import registrar_http
+
+
+def _criar_politica_retry() -> Retry:
+    """
+    Retries de transporte: conexão recusada/resetada, timeouts de leitura e 5xx.
+    429 fica de fora de propósito: quem trata é o limitador de taxa. Por isso
+    o Retry-After não é respeitado aqui: com ele ligado, o urllib3 repete
+    sozinho qualquer 429 que traga o header, escondendo-o do limitador.
+    Métodos não idempotentes (POST do refresh de token) só são repetidos em
+    falha de conexão, quando a requisição garantidamente não chegou à API.
+    """
+    return Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        connect=Config.HTTP_MAX_RETRIES,
+        read=Config.HTTP_MAX_RETRIES,
+        status=Config.HTTP_MAX_RETRIES,
+        backoff_factor=1.0,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=False,
+    )
+
+
+def _hook_metricas(api: str):
+    """Hook de resposta: latência (até os headers) por endpoint e status."""
+    def registrar(resposta: requests.Response, *args, **kwargs) -> None:
+        registrar_http(api, resposta.url, resposta.status_code, resposta.elapsed.total_seconds())
+    return registrar
+
+
+def criar_sessao(tamanho_pool: int, api: Optional[str] = None) -> requests.Session:
+    """
+    Sessão com keep-alive e pool de `tamanho_pool` conexões por host.
+    Com `api`, cada resposta alimenta as métricas de latência HTTP.
+    """
+    adaptador = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=tamanho_pool,
+        pool_block=True,
+        max_retries=_criar_politica_retry(),
+    )
+    sessao = requests.Session()
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    if api:
+        sessao.hooks["response"].append(_hook_metricas(api))
+    return sessao
+
+
+_sessoes: Dict[str, requests.Session] = {}
+_sessoes_lock = threading.Lock()
+
+
+def obter_sessao(api: str) -> requests.Session:
+    """
+    Retorna a sessão única (por processo) da API: 'bling' ou 'anymarket'.
+    Todas as threads reaproveitam as mesmas conexões TCP/TLS.
+    """
+    with _sessoes_lock:
+        if api not in _sessoes:
+            _sessoes[api] = criar_sessao(Config.HTTP_POOL_POR_API[api], api)
+        return _sessoes[api]
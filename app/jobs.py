@@ -0,0 +1,299 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import PreconditionFailed
+
+from app.config import Config
+from app.gcs_handler import GCSHandler, logger
+from app.metrics import REGISTRO
+from app.orchestrator import Tarefas, executar_tarefas
+from app.profiling import AmostradorPerfil
+
+STATUS_ENFILEIRADO = "queued"
+STATUS_EXECUTANDO = "running"
+STATUS_PENDENTE = "pending"
+STATUS_FINAIS = ("success", "error")
+# Jobs finalizados mantidos em memória (os mais antigos ficam só no bucket)
+MAX_JOBS_EM_MEMORIA = 50
+
+# Identifica o processo que executa o job (vários podem ler o mesmo bucket)
+INSTANCIA = uuid.uuid4().hex[:12]
+
+
+def chave_job(pipelines: List[str], data_alvo: str) -> str:
+    """Pedidos com os mesmos pipelines e a mesma data viram um único job."""
+    return f"{'+'.join(sorted(set(pipelines)))}@{data_alvo}"
+
+
+class Job:
+    """Estado de um job do /run, espelhado em config/jobs/{id}.json."""
+
+    def __init__(self, id_job: str, chave: str, pipelines: List[str], data_alvo: str, perfilar: bool = False):
+        self.id = id_job
+        self.lock = threading.Lock()
+        self.futuro: Optional[Future] = None
+        self.estado: Dict[str, Any] = {
+            "id": id_job,
+            "chave": chave,
+            "pipelines": sorted(set(pipelines)),
+            "data_alvo": data_alvo,
+            "perfilar": perfilar,
+            "status": STATUS_ENFILEIRADO,
+            "instancia": INSTANCIA,
+            "criado_em": time.time(),
+            "iniciado_em": None,
+            "finalizado_em": None,
+            "progresso": {},
+            "tarefas": {},
+        }
+
+
+class GerenciadorJobs:
+    """
+    Executa o /run em segundo plano e de-duplica disparos sobrepostos.
+
+    - `enfileirar` devolve na hora o id do job; a extração roda num executor
+      próprio (Config.JOBS_MAX_SIMULTANEOS jobs ao mesmo tempo).
+    - Um pedido igual a um job em andamento (mesmos pipelines e data) recebe
+      o id desse job em vez de disparar outro. Entre instâncias, a exclusão
+      vem de um marcador em config/jobs/ativos/ gravado com precondição de
+      geração: só uma instância consegue registrar o job da chave.
+    - O estado (status, progresso por pipeline e resultado de cada tarefa) é
+      regravado no bucket a cada mudança, então /jobs/<id> responde mesmo
+      depois de um restart. Enquanto não termina, o job também é regravado a
+      cada Config.JOB_BATIMENTO_S; sem esse batimento ele expira em
+      Config.JOB_EXPIRACAO_S. Um job interrompido no meio não é retomado
+      sozinho, mas o próximo disparo da mesma chave o substitui e retoma as
+      partições pelos checkpoints.
+    - Com `perfilar` (ou Config.PROFILING_ATIVO) o job roda sob um
+      AmostradorPerfil; as pilhas vão para Config.CAMINHO_PERFIS e o
+      resumo para "perfil" no estado do job.
+    """
+
+    def __init__(self, bucket_name: str):
+        self.gcs = GCSHandler(bucket_name)
+        self.executor = ThreadPoolExecutor(max_workers=Config.JOBS_MAX_SIMULTANEOS, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._ativos: Dict[str, str] = {}
+        self._batimento: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _caminho_job(id_job: str) -> str:
+        return f"{Config.CAMINHO_JOBS}/{id_job}.json"
+
+    @staticmethod
+    def _caminho_marcador(chave: str) -> str:
+        # A chave tem '+' e '@'; o hash dá um nome de objeto estável e simples
+        return f"{Config.CAMINHO_JOBS}/ativos/{hashlib.sha1(chave.encode()).hexdigest()[:16]}.json"
+
+    def _persistir(self, job: Job) -> None:
+        """Chamado com job.lock adquirido."""
+        job.estado["atualizado_em"] = time.time()
+        try:
+            self.gcs.salvar_json(self._caminho_job(job.id), job.estado)
+        except Exception as erro:
+            # Falha ao gravar o progresso não deve derrubar a extração
+            logger.error(f"Não foi possível persistir o job {job.id}: {erro}")
+
+    @staticmethod
+    def _em_andamento(estado: Optional[Dict[str, Any]]) -> bool:
+        if not estado or estado.get("status") in STATUS_FINAIS:
+            return False
+        return time.time() - estado.get("atualizado_em", 0) < Config.JOB_EXPIRACAO_S
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def enfileirar(
+        self,
+        pipelines: List[str],
+        data_alvo: str,
+        montar_tarefas: Callable[[], Tarefas],
+        perfilar: bool = False,
+    ) -> Tuple[str, bool]:
+        """
+        Registra e agenda o job. Retorna (id_job, coalescido): coalescido é
+        True quando já havia um job igual em andamento e nada novo foi criado
+        (nem o perfil pedido em `perfilar`, que vale só para jobs novos).
+        `montar_tarefas` só é chamado quando o job de fato roda.
+        """
+        chave = chave_job(pipelines, data_alvo)
+
+        with self._lock:
+            id_existente = self._ativos.get(chave)
+            if id_existente:
+                return id_existente, True
+
+            caminho_marcador = self._caminho_marcador(chave)
+            marcador, geracao = self.gcs.read_json_com_geracao(caminho_marcador)
+            if marcador and self._em_andamento(self.gcs.read_json(self._caminho_job(marcador["id"]))):
+                logger.info(f"Job {marcador['id']} ({chave}) já em andamento em outra instância")
+                return marcador["id"], True
+
+            job = Job(uuid.uuid4().hex[:16], chave, pipelines, data_alvo, perfilar or Config.PROFILING_ATIVO)
+            try:
+                self.gcs.salvar_json(caminho_marcador, {"id": job.id, "chave": chave}, if_generation_match=geracao)
+            except PreconditionFailed:
+                # Outra instância registrou a mesma chave entre a leitura e a escrita
+                marcador = self.gcs.read_json(caminho_marcador)
+                logger.info(f"Job {marcador['id']} ({chave}) registrado por outra instância")
+                return marcador["id"], True
+
+            with job.lock:
+                self._persistir(job)
+            self._podar()
+            self._jobs[job.id] = job
+            self._ativos[chave] = job.id
+            job.futuro = self.executor.submit(self._executar, job, montar_tarefas)
+            if self._batimento is None:
+                self._batimento = threading.Thread(target=self._bater, name="job-batimento", daemon=True)
+                self._batimento.start()
+
+        logger.info(f"Job {job.id} enfileirado: {chave}")
+        return job.id, False
+
+    def _podar(self) -> None:
+        """Descarta da memória os jobs finalizados mais antigos. Chamado com self._lock."""
+        finalizados = [id_job for id_job, job in self._jobs.items() if job.futuro is not None and job.futuro.done()]
+        for id_job in finalizados[:max(0, len(finalizados) - MAX_JOBS_EM_MEMORIA)]:
+            del self._jobs[id_job]
+
+    def _bater(self) -> None:
+        """Regrava os jobs ativos deste processo: `atualizado_em` é o sinal de vida entre instâncias."""
+        while True:
+            time.sleep(Config.JOB_BATIMENTO_S)
+            with self._lock:
+                jobs = [self._jobs[id_job] for id_job in self._ativos.values()]
+            for job in jobs:
+                with job.lock:
+                    if job.estado["status"] not in STATUS_FINAIS:
+                        self._persistir(job)
+
+    def consultar(self, id_job: str) -> Optional[Dict[str, Any]]:
+        """Estado do job: da memória se roda neste processo, senão do bucket."""
+        job = self._jobs.get(id_job)
+        if job is not None:
+            with job.lock:
+                return copy.deepcopy(job.estado)
+
+        estado = self.gcs.read_json(self._caminho_job(id_job))
+        if estado and estado.get("status") not in STATUS_FINAIS and not self._em_andamento(estado):
+            estado["status"] = "abandoned"
+        return estado
+
+    def aguardar(self, id_job: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Bloqueia até o job (deste processo) terminar; None se ele roda em outra instância."""
+        job = self._jobs.get(id_job)
+        if job is None or job.futuro is None:
+            return None
+        job.futuro.result(timeout=timeout)
+        return self.consultar(id_job)
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+
+    def _salvar_perfil(self, job: Job, amostrador: AmostradorPerfil) -> Dict[str, Any]:
+        """Grava as pilhas colapsadas do job no bucket e devolve o resumo para o estado."""
+        amostrador.parar()
+        caminho = f"{Config.CAMINHO_PERFIS}/{job.id}.folded.txt"
+        resumo = {
+            "amostras": amostrador.amostras,
+            "intervalo_ms": Config.PROFILING_INTERVALO_MS,
+            "duracao_s": round(amostrador.duracao_s, 2),
+            "mais_frequentes": amostrador.mais_frequentes(),
+        }
+        try:
+            self.gcs.bucket.blob(caminho).upload_from_string(
+                amostrador.pilhas_colapsadas(), content_type="text/plain; charset=utf-8"
+            )
+            resumo["caminho"] = f"gs://{self.gcs.bucket.name}/{caminho}"
+        except Exception as erro:
+            # O perfil é diagnóstico: não muda o status do job
+            logger.error(f"Não foi possível gravar o perfil do job {job.id}: {erro}")
+        return resumo
+
+    def _executar(self, job: Job, montar_tarefas: Callable[[], Tarefas]) -> None:
+        metricas_antes = REGISTRO.capturar()
+        inicio = time.monotonic()
+        amostrador = None
+        if job.estado["perfilar"]:
+            amostrador = AmostradorPerfil(Config.PROFILING_INTERVALO_MS / 1000)
+            amostrador.iniciar()
+        try:
+            tarefas = montar_tarefas()
+            with job.lock:
+                job.estado["status"] = STATUS_EXECUTANDO
+                job.estado["iniciado_em"] = time.time()
+                job.estado["tarefas"] = {nome: {"status": STATUS_PENDENTE} for nome in tarefas}
+                job.estado["progresso"] = {}
+                for nome in tarefas:
+                    progresso = job.estado["progresso"].setdefault(
+                        nome.split(".", 1)[0], {"tarefas": 0, "concluidas": 0, "registros": 0, "falhas": 0, "inalteradas": 0}
+                    )
+                    progresso["tarefas"] += 1
+                self._persistir(job)
+
+            def ao_iniciar(nome: str) -> None:
+                with job.lock:
+                    job.estado["tarefas"][nome] = {"status": STATUS_EXECUTANDO, "iniciado_em": time.time()}
+                    self._persistir(job)
+
+            def ao_concluir(nome: str, resultado: Dict[str, Any]) -> None:
+                with job.lock:
+                    job.estado["tarefas"][nome] = resultado
+                    progresso = job.estado["progresso"][nome.split(".", 1)[0]]
+                    progresso["concluidas"] += 1
+                    progresso["registros"] += resultado.get("registros", 0)
+                    progresso["falhas"] += resultado["status"] != "success"
+                    progresso["inalteradas"] += len(resultado.get("inalteradas", []))
+                    self._persistir(job)
+
+            resultados = executar_tarefas(tarefas, ao_concluir=ao_concluir, ao_iniciar=ao_iniciar)
+            falhas = [nome for nome, r in resultados.items() if r["status"] != "success"]
+            status, erro = ("error" if falhas else "success"), None
+        except Exception as e:
+            logger.exception(f"Job {job.id} falhou: {e}")
+            status, erro = "error", str(e)
+
+        perfil = self._salvar_perfil(job, amostrador) if amostrador is not None else None
+
+        with job.lock:
+            job.estado["status"] = status
+            if erro:
+                job.estado["erro"] = erro
+            job.estado["finalizado_em"] = time.time()
+            job.estado["duracao_s"] = round(time.monotonic() - inicio, 2)
+            job.estado["metricas"] = REGISTRO.resumo(metricas_antes)
+            if perfil is not None:
+                job.estado["perfil"] = perfil
+            self._persistir(job)
+
+        with self._lock:
+            if self._ativos.get(job.estado["chave"]) == job.id:
+                del self._ativos[job.estado["chave"]]
+        logger.info(f"Job {job.id} finalizado: {status}")
+
+
+_gerenciador: Optional[GerenciadorJobs] = None
+_gerenciador_lock = threading.Lock()
+
+
+def obter_gerenciador() -> GerenciadorJobs:
+    """Gerenciador único do processo, no bucket de Config.BUCKET_NAME."""
+    global _gerenciador
+    with _gerenciador_lock:
+        if _gerenciador is None:
+            _gerenciador = GerenciadorJobs(Config.BUCKET_NAME)
+        return _gerenciador
@@ -1,12 +1,21 @@
 import os
+import re
 import sys
 import traceback
 import logging
-from typing import Tuple
-from flask import Flask, jsonify, Response
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Tuple
+from flask import Flask, jsonify, request, Response
 
 from app.config import Config
-from app import bling, anymarket
+from app.metrics import REGISTRO
+from app.pipelines import PIPELINES, carregar_pipeline
+
+# Pipelines, jobs e backfill (e com eles o cliente do GCS) são importados no
+# primeiro uso, dentro das rotas: o cold start fica só com Flask e config.
+if TYPE_CHECKING:
+    from app.orchestrator import Tarefas
+
 app = Flask(__name__)
 
 logging.basicConfig(
@@ -17,12 +26,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-PIPELINES_DISPONIVEIS = {
-    "bling": bling.executar_pipeline,
-    "anymarket": anymarket.executar_pipeline
-}
-
-
 def obter_pipelines_configurados() -> list[str]:
     """
     Lê pipelines a serem executados a partir da variável de ambiente.
@@ -37,33 +40,113 @@ def healthcheck() -> Tuple[Response, int]:
     return jsonify({"status": "ok"}), 200
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics() -> Tuple[Response, int]:
+    """Métricas do processo no formato texto do Prometheus."""
+    return Response(REGISTRO.exportar_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8"), 200
+
+
+def montar_tarefas(pipelines: list[str], data_alvo: str) -> "Tarefas":
+    """Endpoints de todos os pipelines, nomeados "pipeline.endpoint"."""
+    tarefas = {}
+    for nome in pipelines:
+        listar_tarefas = carregar_pipeline(nome).listar_tarefas
+        for endpoint, funcao in listar_tarefas(Config.BUCKET_NAME, data_alvo).items():
+            tarefas[f"{nome}.{endpoint}"] = (nome, funcao)
+    return tarefas
+
+
 @app.route("/run", methods=["POST"])
 def run_job() -> Tuple[Response, int]:
     """
     Endpoint acionado pelo Cloud Scheduler.
-    Executa todos os pipelines configurados.
-    """
-    try:
-        pipelines = obter_pipelines_configurados()
 
-        total_processado = {}
-        logger.info(f"Pipelines configurados para execução: {pipelines}")
+    Enfileira a extração de todos os pipelines configurados (D-1) e responde
+    202 com o id do job; o progresso fica em GET /jobs/<id>. Disparos
+    sobrepostos com os mesmos pipelines e data recebem o id do job que já
+    está rodando. Com ?aguardar=true a resposta só volta no fim do job,
+    como antes (200 ou 500). Com ?profile=1 o job roda com o perfil por
+    amostragem (app.profiling), gravado em config/perfis/<id>.folded.txt.
+    """
+    from app.jobs import obter_gerenciador
 
-        for nome in pipelines:
-            if nome not in PIPELINES_DISPONIVEIS:
+    try:
+        pipelines = []
+        for nome in obter_pipelines_configurados():
+            if nome not in PIPELINES:
                 logger.warning(f"Pipeline ignorado (não suportado): {nome}")
                 continue
+            pipelines.append(nome)
+        logger.info(f"Pipelines configurados para execução: {pipelines}")
+
+        data_alvo = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        gerenciador = obter_gerenciador()
+        id_job, coalescido = gerenciador.enfileirar(
+            pipelines,
+            data_alvo,
+            lambda: montar_tarefas(pipelines, data_alvo),
+            perfilar=request.args.get("profile", "").lower() in ("1", "true"),
+        )
+
+        if request.args.get("aguardar", "").lower() in ("1", "true"):
+            estado = gerenciador.aguardar(id_job)
+            if estado is not None:
+                return jsonify(estado), 500 if estado["status"] == "error" else 200
+
+        return jsonify({
+            "job_id": id_job,
+            "coalescido": coalescido,
+            "status": gerenciador.consultar(id_job)["status"],
+            "url": f"/jobs/{id_job}",
+        }), 202
 
-            logger.info(f"Iniciando pipeline: {nome}")
-            count = PIPELINES_DISPONIVEIS[nome](Config.BUCKET_NAME)
-            total_processado[nome] = count
-            logger.info(f"Pipeline {nome} finalizado: {count}")
+    except Exception as erro:
+        logger.error(str(erro))
+        traceback.print_exc(file=sys.stderr)
 
         return jsonify({
-            "status": "success",
-            "pipelines": total_processado
-        }), 200
+            "status": "error",
+            "message": str(erro)
+        }), 500
+
+
+@app.route("/jobs/<id_job>", methods=["GET"])
+def job_status(id_job: str) -> Tuple[Response, int]:
+    """Status, progresso por pipeline e resultado de cada tarefa de um job do /run."""
+    if not re.fullmatch(r"[0-9a-f]{1,32}", id_job):
+        return jsonify({"status": "error", "message": "Id de job inválido"}), 400
+
+    from app.jobs import obter_gerenciador
 
+    estado = obter_gerenciador().consultar(id_job)
+    if estado is None:
+        return jsonify({"status": "error", "message": f"Job não encontrado: {id_job}"}), 404
+    return jsonify(estado), 200
+
+
+@app.route("/backfill", methods=["POST"])
+def backfill_job() -> Tuple[Response, int]:
+    """
+    Reextrai um intervalo de datas.
+    Corpo: {"inicio": "YYYY-MM-DD", "fim": "YYYY-MM-DD",
+            "endpoints": ["bling.vendas", "bling.nfe", "anymarket.pedidos"],
+            "forcar": false}
+    """
+    from app.backfill import executar_backfill
+
+    corpo = request.get_json(silent=True) or {}
+    try:
+        resultado = executar_backfill(
+            corpo["inicio"],
+            corpo["fim"],
+            corpo["endpoints"],
+            forcar=bool(corpo.get("forcar", False)),
+        )
+    except (KeyError, ValueError) as erro:
+        return jsonify({
+            "status": "error",
+            "message": f"Parâmetros inválidos: {erro}"
+        }), 400
     except Exception as erro:
         logger.error(str(erro))
         traceback.print_exc(file=sys.stderr)
@@ -73,6 +156,8 @@ def run_job() -> Tuple[Response, int]:
             "message": str(erro)
         }), 500
 
+    return jsonify(resultado), 500 if resultado["status"] == "error" else 200
+
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
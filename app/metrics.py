@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import urlparse
+
+# Buckets de latência (segundos): de chamadas rápidas ao GCS a páginas lentas do Bling
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _rotulos(nomes: Tuple[str, ...], valores: Dict[str, Any]) -> Rotulos:
+    return tuple((nome, str(valores.get(nome, ""))) for nome in nomes)
+
+
+def _formatar_rotulos(rotulos: Rotulos, extra: str = "") -> str:
+    partes = [f'{nome}="{valor}"' for nome, valor in rotulos]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+class Contador:
+    """Contador monotônico com rótulos (ex.: api, endpoint)."""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self._valores: Dict[Rotulos, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor: float = 1.0, **rotulos) -> None:
+        chave = _rotulos(self.rotulos, rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def capturar(self) -> Dict[Rotulos, float]:
+        with self._lock:
+            return dict(self._valores)
+
+    def exportar(self) -> List[str]:
+        return [f"{self.nome}{_formatar_rotulos(r)} {v:g}" for r, v in sorted(self.capturar().items())]
+
+    @staticmethod
+    def diferenca(depois: float, antes: float) -> float:
+        return depois - antes
+
+
+class Histograma:
+    """Histograma cumulativo no formato do Prometheus (buckets, soma e contagem)."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = (), buckets=BUCKETS_PADRAO):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self.buckets = tuple(buckets)
+        # rótulos -> [contagem por bucket..., soma, contagem]
+        self._valores: Dict[Rotulos, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **rotulos) -> None:
+        chave = _rotulos(self.rotulos, rotulos)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                serie = self._valores[chave] = [0.0] * (len(self.buckets) + 2)
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    @contextmanager
+    def cronometrar(self, **rotulos) -> Iterator[None]:
+        """Observa a duração do bloco, mesmo se ele falhar."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def capturar(self) -> Dict[Rotulos, List[float]]:
+        with self._lock:
+            return {chave: list(serie) for chave, serie in self._valores.items()}
+
+    def exportar(self) -> List[str]:
+        linhas = []
+        for rotulos, serie in sorted(self.capturar().items()):
+            for limite, quantidade in zip(self.buckets, serie):
+                le = 'le="%g"' % limite
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, le)} {quantidade:g}")
+            le = 'le="+Inf"'
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, le)} {serie[-1]:g}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(rotulos)} {serie[-2]:g}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(rotulos)} {serie[-1]:g}")
+        return linhas
+
+    @staticmethod
+    def diferenca(depois: List[float], antes: List[float]) -> List[float]:
+        return [d - a for d, a in zip(depois, antes)]
+
+
+class Registro:
+    """Conjunto das métricas do processo, exportadas em /metrics."""
+
+    def __init__(self):
+        self._metricas: List[Any] = []
+
+    def contador(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = ()) -> Contador:
+        metrica = Contador(nome, descricao, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome: str, descricao: str, rotulos: Tuple[str, ...] = (), buckets=BUCKETS_PADRAO) -> Histograma:
+        metrica = Histograma(nome, descricao, rotulos, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar_prometheus(self) -> str:
+        """Formato texto de exposição do Prometheus (version 0.0.4)."""
+        linhas = []
+        for metrica in self._metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.descricao}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+    def capturar(self) -> Dict[str, Dict[Rotulos, Any]]:
+        """Foto dos valores atuais, para calcular o que mudou durante uma execução."""
+        return {metrica.nome: metrica.capturar() for metrica in self._metricas}
+
+    def resumo(self, antes: Dict[str, Dict[Rotulos, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        O que mudou desde `antes`, legível em JSON: contadores viram o
+        incremento; histogramas viram quantidade, soma e média.
+        As métricas são do processo: execuções simultâneas aparecem juntas.
+        """
+        resumo: Dict[str, Dict[str, Any]] = {}
+        for metrica in self._metricas:
+            valores_antes = antes.get(metrica.nome, {})
+            for rotulos, depois in metrica.capturar().items():
+                anterior = valores_antes.get(rotulos)
+                delta = depois if anterior is None else metrica.diferenca(depois, anterior)
+                chave = ",".join(f"{nome}={valor}" for nome, valor in rotulos) or "total"
+
+                if metrica.tipo == "counter":
+                    if delta:
+                        resumo.setdefault(metrica.nome, {})[chave] = round(delta, 3)
+                else:
+                    quantidade, soma = delta[-1], delta[-2]
+                    if quantidade:
+                        resumo.setdefault(metrica.nome, {})[chave] = {
+                            "n": int(quantidade),
+                            "soma_s": round(soma, 3),
+                            "media_s": round(soma / quantidade, 4),
+                        }
+        return resumo
+
+
+REGISTRO = Registro()
+
+HTTP_LATENCIA = REGISTRO.histograma(
+    "pipeline_http_latencia_segundos",
+    "Latência das requisições às APIs por endpoint e status",
+    ("api", "endpoint", "status"),
+)
+PAGINAS = REGISTRO.contador("pipeline_paginas_total", "Páginas baixadas", ("api", "endpoint"))
+REGISTROS = REGISTRO.contador("pipeline_registros_total", "Registros baixados", ("api", "endpoint"))
+RATE_LIMIT = REGISTRO.contador("pipeline_rate_limit_total", "Respostas 429 recebidas", ("api",))
+TOKEN_RECUSADO = REGISTRO.contador("pipeline_token_recusado_total", "Respostas 401 recebidas", ("api",))
+ESPERA_LIMITADOR = REGISTRO.contador(
+    "pipeline_espera_limitador_segundos_total",
+    "Tempo de espera imposto pelo limitador de taxa (token bucket e pausas de 429)",
+    ("api",),
+)
+AUTH_RENOVACAO = REGISTRO.histograma(
+    "pipeline_auth_renovacao_segundos", "Duração das renovações de token OAuth", ("api",)
+)
+GCS_BYTES = REGISTRO.contador("pipeline_gcs_bytes_enviados_total", "Bytes enviados ao GCS", ("operacao",))
+GCS_ESCRITA = REGISTRO.histograma(
+    "pipeline_gcs_escrita_segundos", "Duração das escritas no GCS (finalização do upload)", ("operacao",)
+)
+DETALHES = REGISTRO.contador(
+    "pipeline_detalhes_total", "Detalhes do enriquecimento, por origem (cache ou api)", ("api", "endpoint", "origem")
+)
+HTTP_CACHE = REGISTRO.contador(
+    "pipeline_http_cache_total", "Consultas ao cache de respostas das listagens (hit ou miss)", ("api", "resultado")
+)
+PRODUTOS = REGISTRO.contador(
+    "pipeline_produtos_total", "Produtos lidos na sincronização incremental (alterado ou inalterado)", ("resultado",)
+)
+PARTICOES = REGISTRO.contador(
+    "pipeline_particoes_total", "Partições finalizadas: gravadas ou inalteradas (upload pulado)", ("resultado",)
+)
+ETAPA_DURACAO = REGISTRO.histograma("pipeline_etapa_duracao_segundos", "Duração das etapas do pipeline", ("etapa",))
+
+
+def rotulo_endpoint(url: str) -> str:
+    """Caminho da URL com ids numéricos trocados por ':id', para não explodir a cardinalidade."""
+    return re.sub(r"/\d+(?=/|$)", "/:id", urlparse(url).path)
+
+
+def registrar_http(api: str, url: str, status: int, duracao: float) -> None:
+    HTTP_LATENCIA.observar(duracao, api=api, endpoint=rotulo_endpoint(url), status=status)
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.config import Config
+from app.gcs_handler import logger
+from app.metrics import ETAPA_DURACAO
+from app.profiling import cronometrar_tarefa
+from app.writer import coletar_particoes
+
+# nome da tarefa -> (api, função sem argumentos que retorna o total de registros)
+Tarefas = Dict[str, Tuple[str, Callable[[], int]]]
+
+
+def _registrar_etapas(nome: str, resultado: Dict[str, Any]) -> None:
+    """Tempos por etapa da tarefa numa linha JSON, para filtrar no Cloud Logging."""
+    logger.info(json.dumps({
+        "evento": "etapas_tarefa",
+        "tarefa": nome,
+        "status": resultado["status"],
+        "duracao_s": resultado["duracao_s"],
+        "etapas": resultado["etapas"],
+    }, ensure_ascii=False))
+
+
+def _executar_tarefa(
+    nome: str,
+    funcao: Callable[[], int],
+    semaforo: threading.Semaphore,
+    ao_iniciar: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """Roda uma tarefa dentro do limite de concorrência da sua API."""
+    with semaforo:
+        if ao_iniciar:
+            ao_iniciar(nome)
+        inicio = time.monotonic()
+        logger.info(f"[INICIO] {nome}")
+        with cronometrar_tarefa() as cronometria:
+            try:
+                # Tarefas do backfill vêm como "api.endpoint@data": a data fica fora do rótulo
+                with coletar_particoes() as particoes, ETAPA_DURACAO.cronometrar(etapa=nome.split("@", 1)[0]):
+                    registros = funcao()
+                logger.info(f"[SUCESSO] {nome}: {registros} registros")
+                resultado = {
+                    "status": "success",
+                    "registros": registros,
+                    "duracao_s": round(time.monotonic() - inicio, 2),
+                }
+                if particoes["inalteradas"]:
+                    resultado["inalteradas"] = particoes["inalteradas"]
+            except Exception as erro:
+                logger.exception(f"[ERRO] {nome}: {erro}")
+                resultado = {
+                    "status": "error",
+                    "erro": str(erro),
+                    "duracao_s": round(time.monotonic() - inicio, 2),
+                }
+        resultado["etapas"] = cronometria.resumo()
+        _registrar_etapas(nome, resultado)
+        return resultado
+
+
+def executar_tarefas(
+    tarefas: Tarefas,
+    limites: Optional[Dict[str, int]] = None,
+    ao_concluir: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ao_iniciar: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Executa tarefas independentes (endpoints de um ou mais pipelines) em paralelo.
+
+    Cada API tem um semáforo com Config.MAX_TAREFAS_POR_API vagas, de modo que
+    endpoints de APIs diferentes rodam juntos sem que uma API receba mais
+    extrações simultâneas do que o configurado. O tempo total passa a ser o do
+    endpoint mais lento, e não a soma de todos.
+
+    `limites` substitui Config.MAX_TAREFAS_POR_API (o backfill usa limites
+    próprios) e `ao_concluir(nome, resultado)` é chamado a cada tarefa
+    terminada, para relatório de progresso; `ao_iniciar(nome)`, quando a
+    tarefa obtém a vaga da sua API e começa a rodar.
+
+    Retorna {nome_tarefa: {"status", "registros" | "erro", "duracao_s",
+    "etapas"}}, com "etapas" os tempos por etapa medidos com
+    app.profiling.medir; erros de uma tarefa não interrompem as demais. Tarefas que terminaram
+    sem regravar partições (conteúdo idêntico ao do bucket) trazem também
+    "inalteradas" com os caminhos dessas partições.
+    """
+    if not tarefas:
+        return {}
+
+    limites = limites or Config.MAX_TAREFAS_POR_API
+    semaforos = {
+        api: threading.Semaphore(limites.get(api, 1))
+        for api, _ in tarefas.values()
+    }
+    max_workers = sum(limites.get(api, 1) for api in semaforos)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarefa") as executor:
+        futuros = {
+            executor.submit(_executar_tarefa, nome, funcao, semaforos[api], ao_iniciar): nome
+            for nome, (api, funcao) in tarefas.items()
+        }
+        resultados = {}
+        for futuro in as_completed(futuros):
+            nome = futuros[futuro]
+            resultados[nome] = futuro.result()
+            if ao_concluir:
+                ao_concluir(nome, resultados[nome])
+
+    # Mantém a ordem de submissão na resposta
+    return {nome: resultados[nome] for nome in tarefas}
@@ -0,0 +1,22 @@
+"""
+Registro dos pipelines de extração.
+
+Os pacotes de cada pipeline (extratores, cliente do GCS, writers) só são
+importados quando um pipeline é de fato usado: o serviço sobe e responde ao
+healthcheck sem pagar esse custo no cold start.
+"""
+import importlib
+from types import ModuleType
+
+# Nome do pipeline -> pacote com PASTAS e listar_tarefas(bucket_name, data_alvo)
+PIPELINES = {
+    "bling": "app.bling",
+    "anymarket": "app.anymarket",
+}
+
+
+def carregar_pipeline(nome: str) -> ModuleType:
+    """Importa (uma vez por processo) o pacote do pipeline."""
+    if nome not in PIPELINES:
+        raise ValueError(f"Pipeline não suportado: {nome}")
+    return importlib.import_module(PIPELINES[nome])
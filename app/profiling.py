@@ -0,0 +1,185 @@
+"""
+Medição de etapas (spans) e perfil por amostragem sob demanda.
+
+- `medir("bling.http")` cronometra um bloco. A duração vai para o
+  histograma pipeline_etapa_duracao_segundos e, se a thread estiver dentro
+  de `cronometrar_tarefa()`, é somada aos tempos da tarefa. O orquestrador
+  anexa esses tempos ao resultado de cada tarefa ("etapas") e os registra
+  em log como JSON.
+- Threads auxiliares (pools de páginas, detalhes, uploads de partes) só
+  somam na tarefa se a função submetida passar por `propagar`; o código
+  assíncrono, que roda no event loop, recebe a cronometria explicitamente.
+- `AmostradorPerfil`: perfil de parede por amostragem das pilhas de todas
+  as threads do processo, ligado por job (/run?profile=1 ou
+  Config.PROFILING_ATIVO). Ao contrário do cProfile, que só enxerga a
+  thread em que foi ligado, cobre os pools de threads do pipeline.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.metrics import ETAPA_DURACAO
+
+_atual = threading.local()
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# "tarefa_3", "bling-detalhe_0"...: threads do mesmo pool viram uma raiz só no perfil
+_SUFIXO_THREAD = re.compile(r"_\d+$")
+
+
+class Cronometria:
+    """
+    Tempos de uma tarefa por etapa: soma, número de chamadas e máximo. Com
+    threads auxiliares as somas podem passar da duração da tarefa.
+    """
+
+    def __init__(self):
+        self._etapas: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa: str, segundos: float, chamadas: int = 1) -> None:
+        with self._lock:
+            serie = self._etapas.get(etapa)
+            if serie is None:
+                serie = self._etapas[etapa] = [0.0, 0, 0.0]
+            serie[0] += segundos
+            serie[1] += chamadas
+            serie[2] = max(serie[2], segundos)
+
+    def resumo(self) -> Dict[str, Dict[str, Any]]:
+        """
+        {etapa: {"total_s", "chamadas", "max_s"}}, da etapa mais cara para a
+        mais barata. max_s é o maior registro (um span, ou um lote medido à parte).
+        """
+        with self._lock:
+            etapas = sorted(self._etapas.items(), key=lambda item: -item[1][0])
+        return {
+            etapa: {"total_s": round(total, 3), "chamadas": int(chamadas), "max_s": round(maximo, 3)}
+            for etapa, (total, chamadas, maximo) in etapas
+        }
+
+
+def cronometria_atual() -> Optional[Cronometria]:
+    return getattr(_atual, "cronometria", None)
+
+
+@contextmanager
+def cronometrar_tarefa() -> Iterator[Cronometria]:
+    """Acumula numa Cronometria nova os spans medidos nesta thread durante o bloco."""
+    anterior = cronometria_atual()
+    _atual.cronometria = Cronometria()
+    try:
+        yield _atual.cronometria
+    finally:
+        _atual.cronometria = anterior
+
+
+def registrar_etapa(etapa: str, segundos: float, chamadas: int = 1, cronometria: Optional[Cronometria] = None) -> None:
+    """Registra um tempo já medido (ex.: a soma de muitas chamadas curtas, medida à parte)."""
+    ETAPA_DURACAO.observar(segundos, etapa=etapa)
+    cronometria = cronometria or cronometria_atual()
+    if cronometria is not None:
+        cronometria.registrar(etapa, segundos, chamadas)
+
+
+@contextmanager
+def medir(etapa: str, cronometria: Optional[Cronometria] = None) -> Iterator[None]:
+    """Span: cronometra o bloco, mesmo se ele falhar."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapa(etapa, time.perf_counter() - inicio, cronometria=cronometria)
+
+
+def propagar(funcao: Callable) -> Callable:
+    """`funcao` rodando, em outra thread, com a cronometria da thread que a submeteu."""
+    cronometria = cronometria_atual()
+    if cronometria is None:
+        return funcao
+
+    def executar(*args, **kwargs):
+        anterior = cronometria_atual()
+        _atual.cronometria = cronometria
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _atual.cronometria = anterior
+    return executar
+
+
+@lru_cache(maxsize=4096)
+def _local(codigo) -> str:
+    caminho = codigo.co_filename
+    if "site-packages" + os.sep in caminho:
+        caminho = caminho.split("site-packages" + os.sep, 1)[1]
+    elif caminho.startswith(_RAIZ):
+        caminho = os.path.relpath(caminho, _RAIZ)
+    else:
+        caminho = os.path.basename(caminho)
+    return f"{codigo.co_name} ({caminho}:{codigo.co_firstlineno})"
+
+
+class AmostradorPerfil:
+    """
+    Perfil por amostragem: a cada `intervalo_s` uma thread própria lê a
+    pilha de todas as outras (sys._current_frames) e conta cada pilha.
+    É tempo de parede: threads esperando rede, lock ou sleep aparecem onde
+    esperam. Mede o processo inteiro, então jobs simultâneos se misturam.
+    """
+
+    def __init__(self, intervalo_s: float):
+        self.intervalo_s = intervalo_s
+        self.amostras = 0
+        self.duracao_s = 0.0
+        self._pilhas: Counter = Counter()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inicio = 0.0
+
+    def iniciar(self) -> None:
+        self._inicio = time.monotonic()
+        self._thread = threading.Thread(target=self._amostrar, name="perfil", daemon=True)
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duracao_s = time.monotonic() - self._inicio
+
+    def _amostrar(self) -> None:
+        propria = threading.get_ident()
+        while not self._parar.wait(self.intervalo_s):
+            nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, quadro in sys._current_frames().items():
+                if ident == propria:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    pilha.append(_local(quadro.f_code))
+                    quadro = quadro.f_back
+                pilha.append(_SUFIXO_THREAD.sub("", nomes.get(ident, "?")))
+                self._pilhas[";".join(reversed(pilha))] += 1
+            self.amostras += 1
+
+    def pilhas_colapsadas(self) -> str:
+        """Formato "folded" (flamegraph.pl, speedscope): uma linha "thread;raiz;...;folha contagem" por pilha."""
+        return "".join(f"{pilha} {contagem}\n" for pilha, contagem in self._pilhas.most_common())
+
+    def mais_frequentes(self, quantidade: int = 15) -> List[Dict[str, Any]]:
+        """Funções no topo da pilha (onde as threads estavam), com a fração das amostras."""
+        folhas: Counter = Counter()
+        for pilha, contagem in self._pilhas.items():
+            folhas[pilha.rsplit(";", 1)[-1]] += contagem
+        total = sum(folhas.values()) or 1
+        return [
+            {"funcao": funcao, "amostras": contagem, "percentual": round(100 * contagem / total, 1)}
+            for funcao, contagem in folhas.most_common(quantidade)
+        ]
@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+from app.config import Config
+from app.gcs_handler import logger
+from app.metrics import ESPERA_LIMITADOR, RATE_LIMIT
+from app.profiling import medir
+
+
+def backoff_com_jitter(tentativa: int, base: float = 1.0, maximo: float = 60.0) -> float:
+    """
+    Backoff exponencial com "full jitter": sorteia entre 0 e base * 2^tentativa
+    (limitado a `maximo`), para que threads que levaram 429 juntas não voltem
+    todas no mesmo instante.
+    """
+    return random.uniform(0, min(maximo, base * (2 ** tentativa)))
+
+
+def _ler_retry_after(cabecalhos: Mapping[str, str]) -> Optional[float]:
+    """Interpreta Retry-After em segundos ou como data HTTP."""
+    valor = cabecalhos.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _ler_reset_rate_limit(cabecalhos: Mapping[str, str]) -> Optional[float]:
+    """
+    Se X-RateLimit-Remaining chegou a zero, retorna quantos segundos faltam
+    para o reset (X-RateLimit-Reset em segundos ou epoch).
+    """
+    restante = cabecalhos.get("X-RateLimit-Remaining")
+    reset = cabecalhos.get("X-RateLimit-Reset")
+    if restante is None or reset is None:
+        return None
+    try:
+        if int(float(restante)) > 0:
+            return None
+        reset = float(reset)
+    except ValueError:
+        return None
+    # Valores grandes são timestamps; pequenos, segundos até o reset
+    if reset > 1_000_000_000:
+        reset -= time.time()
+    return max(0.0, reset)
+
+
+class LimitadorTaxa:
+    """
+    Token bucket adaptativo (AIMD) compartilhado por todas as threads de uma API.
+
+    - Cada requisição consome um token; os tokens repõem a `taxa` req/s até
+      `capacidade` (rajada máxima).
+    - Sucesso: aumento aditivo da taxa (+`incremento`) até `taxa_maxima`.
+    - 429: redução multiplicativa (x`fator_reducao`) e pausa global até o
+      Retry-After (ou backoff exponencial com jitter, se não houver).
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        taxa_maxima: float,
+        taxa_minima: float = 0.2,
+        capacidade: Optional[float] = None,
+        incremento: float = 0.05,
+        fator_reducao: float = 0.5,
+    ):
+        self.nome = nome
+        self.taxa_maxima = taxa_maxima
+        self.taxa_minima = min(taxa_minima, taxa_maxima)
+        self.taxa = taxa_maxima
+        self.capacidade = capacidade or max(1.0, taxa_maxima)
+        self.incremento = incremento
+        self.fator_reducao = fator_reducao
+
+        self._tokens = self.capacidade
+        self._ultima_reposicao = time.monotonic()
+        self._bloqueado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _repor(self, agora: float) -> None:
+        decorrido = agora - self._ultima_reposicao
+        self._tokens = min(self.capacidade, self._tokens + decorrido * self.taxa)
+        self._ultima_reposicao = agora
+
+    def reservar(self) -> float:
+        """
+        Reserva um token e retorna quantos segundos o chamador deve esperar
+        antes de disparar a requisição (0 se pode ir já). Não dorme: serve
+        tanto para threads quanto para código assíncrono.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            self._repor(agora)
+            self._tokens -= 1
+            espera = 0.0 if self._tokens >= 0 else -self._tokens / self.taxa
+            espera = max(espera, self._bloqueado_ate - agora)
+
+        if espera > 0:
+            ESPERA_LIMITADOR.inc(espera, api=self.nome)
+        return espera
+
+    def adquirir(self) -> None:
+        """Bloqueia a thread até haver token disponível."""
+        espera = self.reservar()
+        if espera > 0:
+            with medir(f"{self.nome}.limitador"):
+                time.sleep(espera)
+
+    def _bloquear(self, segundos: float) -> None:
+        with self._lock:
+            self._bloqueado_ate = max(self._bloqueado_ate, time.monotonic() + segundos)
+
+    def registrar_sucesso(self, cabecalhos: Optional[Mapping[str, str]] = None) -> None:
+        """Aumento aditivo da taxa; respeita cota esgotada informada nos headers."""
+        with self._lock:
+            self.taxa = min(self.taxa_maxima, self.taxa + self.incremento)
+
+        reset = _ler_reset_rate_limit(cabecalhos or {})
+        if reset:
+            logger.info(f"[{self.nome}] Cota esgotada segundo os headers. Pausando {reset:.1f}s")
+            self._bloquear(reset)
+
+    def registrar_limite(self, cabecalhos: Optional[Mapping[str, str]] = None, tentativa: int = 0) -> float:
+        """
+        Registra um 429: reduz a taxa pela metade e pausa o bucket para todas
+        as threads. Retorna quantos segundos o chamador deve aguardar.
+        """
+        cabecalhos = cabecalhos or {}
+        RATE_LIMIT.inc(api=self.nome)
+        with self._lock:
+            self.taxa = max(self.taxa_minima, self.taxa * self.fator_reducao)
+            # Esvazia o bucket para não disparar uma rajada ao fim da pausa
+            self._tokens = min(self._tokens, 0.0)
+            taxa = self.taxa
+
+        espera = _ler_retry_after(cabecalhos)
+        if espera is None:
+            espera = _ler_reset_rate_limit(cabecalhos)
+        if espera is None:
+            espera = backoff_com_jitter(tentativa, base=1.0 / taxa)
+
+        logger.warning(f"[{self.nome}] Rate limit (429). Nova taxa: {taxa:.2f} req/s | Aguardando {espera:.1f}s")
+        self._bloquear(espera)
+        return espera
+
+
+_limitadores: Dict[str, LimitadorTaxa] = {}
+_limitadores_lock = threading.Lock()
+
+
+def obter_limitador(api: str) -> LimitadorTaxa:
+    """Retorna o limitador único (por processo) da API: 'bling' ou 'anymarket'."""
+    with _limitadores_lock:
+        if api not in _limitadores:
+            _limitadores[api] = LimitadorTaxa(api, taxa_maxima=Config.LIMITES_REQ_POR_SEGUNDO[api])
+        return _limitadores[api]
@@ -0,0 +1,309 @@
+"""
+Backends de armazenamento alternativos ao GCS.
+
+O pipeline fala com o armazenamento pela API de Bucket/Blob do
+google-cloud-storage (blob, get_blob, open, compose, upload_from_filename,
+precondição de geração...). Além do bucket real, `obter_bucket` pode
+devolver um destes, escolhidos por Config.STORAGE_BACKEND:
+
+  - "local":   objetos em arquivos em Config.STORAGE_DIRETORIO_LOCAL/<bucket>,
+               para rodar o pipeline inteiro offline (profiling, testes);
+  - "memoria": objetos em bytes na memória do processo.
+
+Os dois implementam só a parte da API que o pipeline usa. Gerações e
+metadados ficam na memória do processo; no backend local um objeto que já
+existia antes do processo começa na geração 1.
+"""
+import base64
+import io
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional
+
+import google_crc32c
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+class _Upload(io.RawIOBase):
+    """Escrita de blob.open('wb'): o objeto só é publicado no close(), como no upload resumível."""
+
+    def __init__(self, blob: "BlobArmazenado"):
+        super().__init__()
+        self._blob = blob
+        self._temporario = blob.bucket._novo_temporario()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, dados) -> int:
+        return self._temporario.write(dados)
+
+    def tell(self) -> int:
+        return self._temporario.tell()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        self._blob._publicar(self._temporario)
+
+    def cancelar(self) -> None:
+        """Descarta o que foi escrito sem publicar, como o cancelamento da sessão resumível."""
+        if self.closed:
+            return
+        super().close()
+        self._temporario.close()
+        nome = getattr(self._temporario, "name", None)
+        if nome:
+            os.remove(nome)
+
+
+class BlobArmazenado:
+    """Blob de um BucketLocal ou BucketMemoria."""
+
+    def __init__(self, bucket: "_BucketArmazenado", nome: str, chunk_size: Optional[int] = None):
+        self.bucket = bucket
+        self.name = nome
+        self.chunk_size = chunk_size
+        self.metadata: Optional[Dict[str, str]] = None
+        self.content_type: Optional[str] = None
+
+    @property
+    def generation(self) -> Optional[int]:
+        return self.bucket._geracao(self.name)
+
+    @property
+    def crc32c(self) -> Optional[str]:
+        """Como no GCS: base64 do CRC32C big-endian, calculado sobre o conteúdo."""
+        if not self.exists():
+            return None
+        valor = 0
+        with self.bucket._abrir(self.name) as arquivo:
+            for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b""):
+                valor = google_crc32c.extend(valor, bloco)
+        return base64.b64encode(valor.to_bytes(4, "big")).decode("ascii")
+
+    @property
+    def size(self) -> Optional[int]:
+        return self.bucket._tamanho(self.name)
+
+    def exists(self) -> bool:
+        return self.bucket._tamanho(self.name) is not None
+
+    def _checar_geracao(self, if_generation_match: Optional[int]) -> None:
+        if if_generation_match is not None and (self.generation or 0) != if_generation_match:
+            raise PreconditionFailed(f"Geração de {self.name} mudou")
+
+    def _publicar(self, temporario, if_generation_match: Optional[int] = None) -> None:
+        with self.bucket._lock_escrita:
+            self._checar_geracao(if_generation_match)
+            self.bucket._publicar(self.name, temporario, self.metadata)
+
+    def download_as_bytes(self, if_generation_match: Optional[int] = None, **_) -> bytes:
+        self._checar_geracao(if_generation_match)
+        with self.bucket._abrir(self.name) as arquivo:
+            return arquivo.read()
+
+    def download_as_text(self, if_generation_match: Optional[int] = None, **_) -> str:
+        return self.download_as_bytes(if_generation_match).decode("utf-8")
+
+    def download_to_filename(self, caminho: str, start: Optional[int] = None, end: Optional[int] = None, **_) -> None:
+        """Como no GCS, `start` e `end` (inclusivo) baixam só um intervalo de bytes."""
+        with self.bucket._abrir(self.name) as origem, open(caminho, "wb") as destino:
+            if start:
+                origem.seek(start)
+            if end is None:
+                shutil.copyfileobj(origem, destino, TAMANHO_BLOCO)
+                return
+            restante = end + 1 - (start or 0)
+            while restante > 0:
+                bloco = origem.read(min(TAMANHO_BLOCO, restante))
+                if not bloco:
+                    break
+                destino.write(bloco)
+                restante -= len(bloco)
+
+    def upload_from_string(self, dados, content_type: Optional[str] = None, if_generation_match: Optional[int] = None, **_) -> None:
+        self.content_type = content_type
+        temporario = self.bucket._novo_temporario()
+        temporario.write(dados.encode("utf-8") if isinstance(dados, str) else dados)
+        self._publicar(temporario, if_generation_match)
+
+    def upload_from_filename(self, caminho: str, content_type: Optional[str] = None, if_generation_match: Optional[int] = None, **_) -> None:
+        self.content_type = content_type
+        temporario = self.bucket._novo_temporario()
+        with open(caminho, "rb") as origem:
+            shutil.copyfileobj(origem, temporario, TAMANHO_BLOCO)
+        self._publicar(temporario, if_generation_match)
+
+    def open(self, mode: str = "r", content_type: Optional[str] = None, **_):
+        if mode == "wb":
+            self.content_type = content_type
+            return _Upload(self)
+        if mode == "rb":
+            return self.bucket._abrir(self.name)
+        raise ValueError(f"Modo não suportado pelo backend {self.bucket.backend}: {mode}")
+
+    def compose(self, fontes: Iterable["BlobArmazenado"], **_) -> None:
+        temporario = self.bucket._novo_temporario()
+        for fonte in fontes:
+            with self.bucket._abrir(fonte.name) as origem:
+                shutil.copyfileobj(origem, temporario, TAMANHO_BLOCO)
+        self._publicar(temporario)
+
+    def delete(self, **_) -> None:
+        self.bucket._remover(self.name)
+
+    def patch(self, **_) -> None:
+        with self.bucket._lock:
+            self.bucket._metadados[self.name] = self.metadata
+
+    def reload(self, **_) -> None:
+        with self.bucket._lock:
+            self.metadata = self.bucket._metadados.get(self.name)
+
+
+class _BucketArmazenado:
+    """
+    Parte comum dos backends: gerações, metadados e a API de Bucket. As
+    subclasses guardam o conteúdo (_novo_temporario, _publicar, _abrir,
+    _tamanho, _remover e _nomes).
+    """
+
+    backend = ""
+
+    def __init__(self, nome: str):
+        self.name = nome
+        self._geracoes: Dict[str, int] = {}
+        self._metadados: Dict[str, Optional[Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+        # Serializa check-and-set das escritas com precondição
+        self._lock_escrita = threading.Lock()
+
+    def _geracao(self, nome: str) -> Optional[int]:
+        with self._lock:
+            geracao = self._geracoes.get(nome)
+        if geracao is None and self._tamanho(nome) is not None:
+            return 1
+        return geracao
+
+    def _nova_geracao(self, nome: str, metadata: Optional[Dict[str, str]]) -> None:
+        """Chamado pelas subclasses antes de trocar o conteúdo: um objeto preexistente conta como geração 1."""
+        existia = self._tamanho(nome) is not None
+        with self._lock:
+            self._geracoes[nome] = self._geracoes.get(nome, 1 if existia else 0) + 1
+            self._metadados[nome] = metadata
+
+    def _esquecer(self, nome: str) -> None:
+        with self._lock:
+            self._geracoes.pop(nome, None)
+            self._metadados.pop(nome, None)
+
+    def blob(self, nome: str, chunk_size: Optional[int] = None) -> BlobArmazenado:
+        return BlobArmazenado(self, nome, chunk_size)
+
+    def get_blob(self, nome: str, **_) -> Optional[BlobArmazenado]:
+        blob = BlobArmazenado(self, nome)
+        if not blob.exists():
+            return None
+        blob.reload()
+        return blob
+
+    def listar(self, prefixo: str = "") -> Dict[str, int]:
+        """Objetos com o prefixo e seus tamanhos em bytes."""
+        return {nome: self._tamanho(nome) for nome in self._nomes() if nome.startswith(prefixo)}
+
+
+class BucketLocal(_BucketArmazenado):
+    """Objetos em arquivos sob `diretorio`/`nome`; temporários em .tmp/ na mesma pasta."""
+
+    backend = "local"
+
+    def __init__(self, nome: str, diretorio: str):
+        super().__init__(nome)
+        self.raiz = os.path.join(diretorio, nome)
+        self._pasta_temporaria = os.path.join(self.raiz, ".tmp")
+        os.makedirs(self._pasta_temporaria, exist_ok=True)
+
+    def _caminho(self, nome: str) -> str:
+        return os.path.join(self.raiz, nome)
+
+    def _novo_temporario(self):
+        return tempfile.NamedTemporaryFile(mode="w+b", dir=self._pasta_temporaria, delete=False)
+
+    def _publicar(self, nome: str, temporario, metadata: Optional[Dict[str, str]]) -> None:
+        temporario.close()
+        destino = self._caminho(nome)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        self._nova_geracao(nome, metadata)
+        os.replace(temporario.name, destino)
+
+    def _abrir(self, nome: str):
+        try:
+            return open(self._caminho(nome), "rb")
+        except FileNotFoundError:
+            raise NotFound(nome)
+
+    def _tamanho(self, nome: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._caminho(nome))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def _remover(self, nome: str) -> None:
+        try:
+            os.remove(self._caminho(nome))
+        except FileNotFoundError:
+            raise NotFound(nome)
+        self._esquecer(nome)
+
+    def _nomes(self) -> Iterable[str]:
+        for pasta, subpastas, arquivos in os.walk(self.raiz):
+            if pasta == self.raiz and ".tmp" in subpastas:
+                subpastas.remove(".tmp")
+            for arquivo in arquivos:
+                yield os.path.relpath(os.path.join(pasta, arquivo), self.raiz).replace(os.sep, "/")
+
+
+class BucketMemoria(_BucketArmazenado):
+    """Objetos em bytes na memória do processo."""
+
+    backend = "memoria"
+
+    def __init__(self, nome: str):
+        super().__init__(nome)
+        self._objetos: Dict[str, bytes] = {}
+
+    def _novo_temporario(self):
+        return io.BytesIO()
+
+    def _publicar(self, nome: str, temporario, metadata: Optional[Dict[str, str]]) -> None:
+        self._nova_geracao(nome, metadata)
+        with self._lock:
+            self._objetos[nome] = temporario.getvalue()
+
+    def _abrir(self, nome: str):
+        with self._lock:
+            conteudo = self._objetos.get(nome)
+        if conteudo is None:
+            raise NotFound(nome)
+        return io.BytesIO(conteudo)
+
+    def _tamanho(self, nome: str) -> Optional[int]:
+        with self._lock:
+            conteudo = self._objetos.get(nome)
+        return None if conteudo is None else len(conteudo)
+
+    def _remover(self, nome: str) -> None:
+        with self._lock:
+            if self._objetos.pop(nome, None) is None:
+                raise NotFound(nome)
+        self._esquecer(nome)
+
+    def _nomes(self) -> Iterable[str]:
+        with self._lock:
+            return list(self._objetos)
@@ -0,0 +1,850 @@
+import base64
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import google_crc32c
+from google.api_core.exceptions import NotFound
+
+from app.config import Config
+from app.gcs_handler import logger
+from app.metrics import GCS_BYTES, GCS_ESCRITA, PARTICOES
+from app.profiling import medir, propagar, registrar_etapa
+
+CONTENT_TYPE_NDJSON = 'application/x-ndjson; charset=utf-8'
+
+# Upload resumível exige chunks múltiplos de 256 KiB
+TAMANHO_CHUNK_UPLOAD = 32 * 256 * 1024  # 8 MiB
+
+Transformacao = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+TAMANHO_BLOCO_CRC = 1024 * 1024
+
+LAYOUT_ARQUIVO = "arquivo"
+LAYOUT_PARTES = "partes"
+ARQUIVO_MANIFESTO = "_manifest.json"
+
+
+def particao_em_partes() -> bool:
+    """True se Config.LAYOUT_PARTICAO grava partições em várias partes com manifesto."""
+    if Config.LAYOUT_PARTICAO not in (LAYOUT_ARQUIVO, LAYOUT_PARTES):
+        raise ValueError(f"Layout de partição desconhecido: {Config.LAYOUT_PARTICAO}")
+    return Config.LAYOUT_PARTICAO == LAYOUT_PARTES
+
+
+def pasta_da_particao(caminho: str) -> str:
+    """Pasta data_ref=... de um caminho de arquivo da partição."""
+    return caminho.rsplit('/', 1)[0]
+
+
+def crc32c_base64(valor: int) -> str:
+    """CRC32C no formato de blob.crc32c do GCS: base64 dos 4 bytes big-endian."""
+    return base64.b64encode(valor.to_bytes(4, 'big')).decode('ascii')
+
+
+def crc32c_arquivo(caminho: str) -> int:
+    valor = 0
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_CRC), b''):
+            valor = google_crc32c.extend(valor, bloco)
+    return valor
+
+
+def arquivo_temporario(sufixo: str):
+    """Temporário em Config.DIRETORIO_TEMPORARIO (None = padrão do sistema), removido por quem o criou."""
+    return tempfile.NamedTemporaryFile(mode='w+b', suffix=sufixo, dir=Config.DIRETORIO_TEMPORARIO, delete=False)
+
+
+def enviar_arquivo(
+    bucket,
+    caminho: str,
+    arquivo: str,
+    content_type: str,
+    crc32c: int,
+    tamanho: int,
+    num_registros: Optional[int] = None,
+    tamanho_chunk: int = TAMANHO_CHUNK_UPLOAD,
+) -> None:
+    """
+    Envia um arquivo local com upload resumível: chunks de `tamanho_chunk`,
+    cada um repetido com retry sem reiniciar a sessão, e CRC32C validado
+    pelo cliente no fim. O objeto publicado ainda é conferido contra o
+    `crc32c` calculado enquanto os registros eram serializados; se
+    divergir, é apagado e a escrita falha.
+    """
+    from google.cloud.storage.retry import DEFAULT_RETRY
+
+    blob = bucket.blob(caminho, chunk_size=tamanho_chunk)
+    if num_registros is not None:
+        blob.metadata = {'num_registros': str(num_registros)}
+    with GCS_ESCRITA.cronometrar(operacao="upload"), medir("gcs.upload"):
+        blob.upload_from_filename(arquivo, content_type=content_type, checksum="crc32c", retry=DEFAULT_RETRY)
+    publicado = blob.crc32c
+    if publicado != crc32c_base64(crc32c):
+        blob.delete()
+        raise RuntimeError(f"CRC32C divergente após o upload de {caminho}: {publicado} != {crc32c_base64(crc32c)}")
+    GCS_BYTES.inc(tamanho, operacao="upload")
+
+
+def conteudo_igual(bucket, caminho: str, crc32c: int) -> bool:
+    """
+    True se já existe em `caminho` um objeto com esse CRC32C. O GCS calcula
+    o CRC32C de todo objeto, inclusive os de compose (que não têm MD5).
+    """
+    existente = bucket.get_blob(caminho)
+    return existente is not None and existente.crc32c == crc32c_base64(crc32c)
+
+
+class _ArquivoComCrc:
+    """
+    Repassa as escritas ao arquivo de destino acumulando o CRC32C dos bytes:
+    `crc32c` continua de `crc32c` inicial (partes de um compose) e
+    `crc32c_conteudo` é só o deste arquivo.
+    """
+
+    def __init__(self, arquivo, crc32c: int = 0):
+        self._arquivo = arquivo
+        self.crc32c = crc32c
+        self.crc32c_conteudo = 0
+        self._descartado = False
+
+    def descartar(self) -> None:
+        """Escritas seguintes (ex.: o rodapé do compressor ao fechar) são ignoradas."""
+        self._descartado = True
+
+    def write(self, dados) -> int:
+        if self._descartado:
+            return len(dados)
+        if not isinstance(dados, bytes):
+            # Compressores podem escrever memoryview
+            dados = bytes(dados)
+        self.crc32c = google_crc32c.extend(self.crc32c, dados)
+        self.crc32c_conteudo = google_crc32c.extend(self.crc32c_conteudo, dados)
+        return self._arquivo.write(dados)
+
+    def __getattr__(self, nome: str):
+        return getattr(self._arquivo, nome)
+
+
+def cancelar_upload(arquivo) -> None:
+    """
+    Descarta um blob.open('wb') sem publicar o objeto. O close() do
+    BlobWriter, chamado também quando ele é coletado, finalizaria o upload
+    com o que está no buffer; com o buffer já fechado ele não envia nada.
+    """
+    cancelar = getattr(arquivo, "cancelar", None)
+    if cancelar is not None:
+        # Backends local e memória (app.storage_backend)
+        cancelar()
+        return
+
+    arquivo._buffer.close()
+    if not arquivo._upload_and_transport:
+        # Nenhum chunk enviado: a sessão nem foi iniciada
+        return
+    upload, transporte = arquivo._upload_and_transport
+    try:
+        # DELETE na URI da sessão cancela o upload resumível (resposta 499)
+        transporte.delete(upload.resumable_url, timeout=Config.HTTP_TIMEOUT)
+    except Exception as e:
+        # Sessão não finalizada nunca vira objeto; só expira depois
+        logger.warning(f"Falha ao cancelar a sessão de upload: {e}")
+
+
+_coleta = threading.local()
+
+
+@contextmanager
+def coletar_particoes() -> Iterator[Dict[str, List[str]]]:
+    """
+    Coleta as partições finalizadas na thread atual, separadas em
+    {"gravadas": [...], "inalteradas": [...]}. O orquestrador envolve cada
+    tarefa com isso para reportar as inalteradas no resultado.
+    """
+    anterior = getattr(_coleta, "particoes", None)
+    _coleta.particoes = {"gravadas": [], "inalteradas": []}
+    try:
+        yield _coleta.particoes
+    finally:
+        _coleta.particoes = anterior
+
+
+def registrar_particao(caminho: str, inalterada: bool) -> None:
+    PARTICOES.inc(resultado="inalterada" if inalterada else "gravada")
+    if inalterada:
+        logger.info(f"Partição inalterada, upload pulado: {caminho}")
+    particoes = getattr(_coleta, "particoes", None)
+    if particoes is not None:
+        particoes["inalteradas" if inalterada else "gravadas"].append(caminho)
+
+
+class EscritorNDJSON:
+    """
+    Sink NDJSON em streaming para o GCS: upload resumível em chunks durante a
+    paginação, ou um temporário enviado no `fechar()` (Config.ESCRITA_EM_DISCO).
+    O blob só é publicado em `fechar()`; `abortar()` descarta o upload.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        caminho: str,
+        transformar: Optional[Transformacao] = None,
+        tamanho_chunk: int = TAMANHO_CHUNK_UPLOAD,
+        continuacao: bool = False,
+        compressao: Optional[str] = None,
+        content_type: str = CONTENT_TYPE_NDJSON,
+        comparar: bool = False,
+        crc_inicial: int = 0,
+        crc_anterior: Optional[int] = None,
+    ):
+        self.bucket = bucket
+        self.caminho = caminho
+        self.transformar = transformar
+        self.tamanho_chunk = tamanho_chunk
+        # Continuação de outro arquivo (parte de um compose): a primeira linha
+        # também leva o '\n', para a concatenação ficar idêntica a um arquivo único
+        self.continuacao = continuacao
+        # 'gzip' ou 'zstd': membros gzip / frames zstd concatenados continuam válidos
+        self.compressao = compressao
+        self.content_type = content_type
+        # Se o objeto já existe com o mesmo CRC32C, nada é publicado (o upload
+        # é cancelado ou o temporário descartado) e `inalterado` fica True
+        self.comparar = comparar
+        # CRC32C (acumulado desde crc_inicial) de um envio anterior do mesmo
+        # trecho: se o deste bater, nada é enviado e `inalterado` fica True
+        self.crc_anterior = crc_anterior
+        # CRC32C dos bytes gravados, continuando o de partes anteriores de um compose
+        self.crc32c = crc_inicial
+        self.inalterado = False
+        self.num_registros = 0
+        # JSON serializado (antes da compressão) e bytes do objeto gravado
+        self.num_bytes = 0
+        self.tamanho = 0
+        # Tempo somado dos json.dumps, registrado como uma etapa no fechar()
+        self.tempo_serializacao = 0.0
+        self._blob = None
+        self._spool = None
+        self._arquivo = None
+        self._destino = None
+
+    def _abrir(self) -> None:
+        if self.crc_anterior is not None or Config.ESCRITA_EM_DISCO:
+            self._spool = arquivo_temporario('.json')
+            self._arquivo = _ArquivoComCrc(self._spool, self.crc32c)
+        else:
+            self._blob = self.bucket.blob(self.caminho, chunk_size=self.tamanho_chunk)
+            self._arquivo = _ArquivoComCrc(
+                self._blob.open('wb', content_type=self.content_type, ignore_flush=True),
+                self.crc32c,
+            )
+        self._destino = self._arquivo
+
+        if self.compressao == 'gzip':
+            # mtime=0 e sem nome no cabeçalho: mesmo conteúdo gera os mesmos bytes
+            self._destino = gzip.GzipFile(filename='', fileobj=self._arquivo, mode='wb', mtime=0)
+        elif self.compressao == 'zstd':
+            import zstandard
+            self._destino = zstandard.ZstdCompressor(level=Config.ZSTD_NIVEL).stream_writer(
+                self._arquivo, closefd=False
+            )
+
+    def escrever(self, registro: Dict[str, Any]) -> None:
+        """Serializa um registro e envia ao buffer do upload."""
+        if not isinstance(registro, dict):
+            raise ValueError("Todos os itens devem ser dicionários")
+
+        if self.transformar:
+            registro = self.transformar(registro)
+
+        if self._arquivo is None:
+            self._abrir()
+        inicio = time.perf_counter()
+        linha = json.dumps(registro, ensure_ascii=False)
+        if self.num_registros or self.continuacao:
+            linha = '\n' + linha
+        dados = linha.encode('utf-8')
+        self.tempo_serializacao += time.perf_counter() - inicio
+        self._destino.write(dados)
+        self.num_registros += 1
+        self.num_bytes += len(dados)
+
+    def escrever_todos(self, registros: Iterable[Dict[str, Any]]) -> int:
+        for registro in registros:
+            self.escrever(registro)
+        return self.num_registros
+
+    def fechar(self, gravar_metadados: bool = True) -> int:
+        """Finaliza o upload e grava os metadados da partição."""
+        if self._arquivo is None:
+            return 0
+        registrar_etapa("escrita.serializar", self.tempo_serializacao, self.num_registros)
+
+        if self._spool is not None:
+            if self._destino is not self._arquivo:
+                self._destino.close()
+            self.crc32c = self._arquivo.crc32c
+            self.tamanho = self._arquivo.tell()
+            self._enviar_spool(gravar_metadados)
+        else:
+            with GCS_ESCRITA.cronometrar(operacao="upload"), medir("gcs.upload"):
+                if self._destino is not self._arquivo:
+                    self._destino.close()
+                self.tamanho = self._arquivo.tell()
+                self.crc32c = self._arquivo.crc32c
+                if self.comparar and conteudo_igual(self.bucket, self.caminho, self.crc32c):
+                    # O último chunk finalizaria o objeto; a sessão é cancelada antes dele
+                    cancelar_upload(self._arquivo)
+                    self.inalterado = True
+                else:
+                    GCS_BYTES.inc(self.tamanho, operacao="upload")
+                    self._arquivo.close()
+
+            if gravar_metadados and not self.inalterado:
+                # O total só é conhecido no fim; metadados entram via PATCH
+                self._blob.metadata = {'num_registros': str(self.num_registros)}
+                self._blob.patch()
+        self._arquivo = None
+        self._destino = None
+        return self.num_registros
+
+    def _enviar_spool(self, gravar_metadados: bool) -> None:
+        """Envia o temporário, a menos que (com `comparar`) o objeto no bucket tenha o mesmo CRC32C."""
+        try:
+            self._spool.close()
+            if self.crc_anterior is not None and self.crc32c == self.crc_anterior:
+                self.inalterado = True
+                return
+            if self.comparar and conteudo_igual(self.bucket, self.caminho, self.crc32c):
+                self.inalterado = True
+                return
+
+            enviar_arquivo(
+                self.bucket,
+                self.caminho,
+                self._spool.name,
+                self.content_type,
+                # Só deste arquivo; self.crc32c pode continuar o de partes anteriores
+                self._arquivo.crc32c_conteudo,
+                self.tamanho,
+                num_registros=self.num_registros if gravar_metadados else None,
+                tamanho_chunk=self.tamanho_chunk,
+            )
+        finally:
+            self._descartar_spool()
+
+    def _descartar_spool(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+            os.remove(self._spool.name)
+            self._spool = None
+
+    def abortar(self) -> None:
+        """Descarta o upload em andamento sem publicar o que já foi escrito."""
+        if self._arquivo is not None:
+            logger.warning(f"Upload abortado: {self.caminho} ({self.num_registros} registros descartados)")
+            self._arquivo.descartar()
+            if self._destino is not self._arquivo:
+                self._destino.close()
+            if self._blob is not None:
+                cancelar_upload(self._arquivo)
+        self._descartar_spool()
+        self._arquivo = None
+        self._destino = None
+        self._blob = None
+
+
+# Metadado do schema Parquet com as colunas gravadas como texto JSON
+METADADO_COLUNAS_JSON = 'colunas_json'
+
+
+def _tem_struct_vazio(tipo) -> bool:
+    import pyarrow as pa
+
+    if pa.types.is_struct(tipo):
+        return tipo.num_fields == 0 or any(_tem_struct_vazio(campo.type) for campo in tipo)
+    if pa.types.is_list(tipo) or pa.types.is_large_list(tipo):
+        return _tem_struct_vazio(tipo.value_type)
+    return False
+
+
+def _serializar_colunas(registro: Dict[str, Any], colunas: Iterable[str]) -> Dict[str, Any]:
+    registro = dict(registro)
+    for nome in colunas:
+        if registro.get(nome) is not None:
+            registro[nome] = json.dumps(registro[nome], ensure_ascii=False)
+    return registro
+
+
+class EscritorParquet:
+    """
+    Sink Parquet: os registros vão para um NDJSON temporário e, no `fechar()`,
+    viram um row group por lote com o schema inferido de todos os lotes.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        caminho: str,
+        transformar: Optional[Transformacao] = None,
+        content_type: str = 'application/vnd.apache.parquet',
+        comparar: bool = False,
+    ):
+        self.bucket = bucket
+        self.caminho = caminho
+        self.transformar = transformar
+        self.content_type = content_type
+        self.comparar = comparar
+        self.inalterado = False
+        self.num_registros = 0
+        self.num_bytes = 0
+        self.crc32c = 0
+        self.tamanho = 0
+        self.tempo_serializacao = 0.0
+        self._spool = None
+
+    def escrever(self, registro: Dict[str, Any]) -> None:
+        if not isinstance(registro, dict):
+            raise ValueError("Todos os itens devem ser dicionários")
+
+        if self.transformar:
+            registro = self.transformar(registro)
+
+        if self._spool is None:
+            self._spool = arquivo_temporario('.json')
+
+        inicio = time.perf_counter()
+        dados = json.dumps(registro, ensure_ascii=False).encode('utf-8') + b'\n'
+        self.tempo_serializacao += time.perf_counter() - inicio
+        self._spool.write(dados)
+        self.num_registros += 1
+        self.num_bytes += len(dados)
+
+    def escrever_todos(self, registros: Iterable[Dict[str, Any]]) -> int:
+        for registro in registros:
+            self.escrever(registro)
+        return self.num_registros
+
+    def _lotes(self):
+        self._spool.seek(0)
+        lote = []
+        for linha in self._spool:
+            lote.append(json.loads(linha))
+            if len(lote) >= Config.PARQUET_LINHAS_POR_GRUPO:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    def _inferir_schema(self):
+        """
+        Tipo de cada coluna unificado entre os lotes. Colunas com tipos
+        incompatíveis ou structs vazios (sem representação em Parquet) viram
+        texto JSON, listadas nos metadados do schema.
+        """
+        import pyarrow as pa
+
+        tipos: Dict[str, Any] = {}
+        colunas_json = set()
+        for lote in self._lotes():
+            for nome in dict.fromkeys(chave for registro in lote for chave in registro):
+                if nome in colunas_json:
+                    continue
+                try:
+                    tipo = pa.array([registro.get(nome) for registro in lote]).type
+                    if nome in tipos:
+                        tipo = pa.unify_schemas(
+                            [pa.schema([(nome, tipos[nome])]), pa.schema([(nome, tipo)])],
+                            promote_options='permissive',
+                        ).field(nome).type
+                    valido = not _tem_struct_vazio(tipo)
+                except (pa.ArrowException, OverflowError):
+                    valido = False
+                if valido:
+                    tipos[nome] = tipo
+                else:
+                    tipos[nome] = pa.string()
+                    colunas_json.add(nome)
+
+        metadados = {METADADO_COLUNAS_JSON: json.dumps(sorted(colunas_json))} if colunas_json else None
+        return pa.schema(list(tipos.items()), metadata=metadados), colunas_json
+
+    def fechar(self, gravar_metadados: bool = True) -> int:
+        if self._spool is None:
+            return 0
+        registrar_etapa("escrita.serializar", self.tempo_serializacao, self.num_registros)
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._spool.flush()
+        caminho_parquet = self._spool.name + '.parquet'
+        try:
+            with medir("escrita.parquet"):
+                schema, colunas_json = self._inferir_schema()
+                if colunas_json:
+                    logger.info(f"Colunas gravadas como texto JSON em {self.caminho}: {sorted(colunas_json)}")
+
+                with pq.ParquetWriter(caminho_parquet, schema, compression=Config.PARQUET_COMPRESSAO) as escritor:
+                    for lote in self._lotes():
+                        if colunas_json:
+                            lote = [_serializar_colunas(registro, colunas_json) for registro in lote]
+                        escritor.write_table(pa.Table.from_pylist(lote, schema=schema))
+
+            self.crc32c = crc32c_arquivo(caminho_parquet)
+            self.tamanho = os.path.getsize(caminho_parquet)
+            if self.comparar and conteudo_igual(self.bucket, self.caminho, self.crc32c):
+                self.inalterado = True
+            else:
+                enviar_arquivo(
+                    self.bucket,
+                    self.caminho,
+                    caminho_parquet,
+                    self.content_type,
+                    self.crc32c,
+                    self.tamanho,
+                    num_registros=self.num_registros if gravar_metadados else None,
+                )
+        finally:
+            self._descartar_spool()
+            if os.path.exists(caminho_parquet):
+                os.remove(caminho_parquet)
+
+        return self.num_registros
+
+    def _descartar_spool(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+            os.remove(self._spool.name)
+            self._spool = None
+
+    def abortar(self) -> None:
+        if self._spool is not None:
+            logger.warning(f"Escrita abortada: {self.caminho} ({self.num_registros} registros descartados)")
+        self._descartar_spool()
+
+
+class Formato:
+    """
+    Formato de saída da zona raw: extensão, content type e escritor. Só nos
+    `concatenavel` (partes unidas por compose) `continuacao`, `crc_inicial`
+    e `crc_anterior` têm efeito.
+    """
+
+    concatenavel = False
+
+    def __init__(self, nome: str, extensao: str, content_type: str):
+        self.nome = nome
+        self.extensao = extensao
+        self.content_type = content_type
+
+    def criar_escritor(
+        self,
+        bucket,
+        caminho: str,
+        transformar: Optional[Transformacao] = None,
+        continuacao: bool = False,
+        comparar: bool = False,
+        crc_inicial: int = 0,
+        crc_anterior: Optional[int] = None,
+    ):
+        raise NotImplementedError
+
+    def ler(self, bucket, caminho: str) -> Iterator[Dict[str, Any]]:
+        """Relê em streaming os registros de um arquivo gravado neste formato."""
+        raise NotImplementedError
+
+
+class FormatoNDJSON(Formato):
+    concatenavel = True
+
+    def __init__(self, nome: str, extensao: str, content_type: str, compressao: Optional[str] = None):
+        super().__init__(nome, extensao, content_type)
+        self.compressao = compressao
+
+    def criar_escritor(
+        self,
+        bucket,
+        caminho: str,
+        transformar: Optional[Transformacao] = None,
+        continuacao: bool = False,
+        comparar: bool = False,
+        crc_inicial: int = 0,
+        crc_anterior: Optional[int] = None,
+    ):
+        return EscritorNDJSON(
+            bucket,
+            caminho,
+            transformar=transformar,
+            continuacao=continuacao,
+            compressao=self.compressao,
+            content_type=self.content_type,
+            comparar=comparar,
+            crc_inicial=crc_inicial,
+            crc_anterior=crc_anterior,
+        )
+
+    def ler(self, bucket, caminho: str) -> Iterator[Dict[str, Any]]:
+        with bucket.blob(caminho).open('rb') as arquivo:
+            if self.compressao == 'gzip':
+                # GzipFile lê todos os membros (arquivos vindos de compose)
+                origem = gzip.GzipFile(fileobj=arquivo, mode='rb')
+            elif self.compressao == 'zstd':
+                import zstandard
+                origem = io.BufferedReader(
+                    zstandard.ZstdDecompressor().stream_reader(arquivo, read_across_frames=True)
+                )
+            else:
+                origem = arquivo
+
+            for linha in origem:
+                if linha.strip():
+                    yield json.loads(linha)
+
+
+class FormatoParquet(Formato):
+    def criar_escritor(
+        self,
+        bucket,
+        caminho: str,
+        transformar: Optional[Transformacao] = None,
+        continuacao: bool = False,
+        comparar: bool = False,
+        crc_inicial: int = 0,
+        crc_anterior: Optional[int] = None,
+    ):
+        return EscritorParquet(
+            bucket, caminho, transformar=transformar, content_type=self.content_type, comparar=comparar
+        )
+
+    def ler(self, bucket, caminho: str) -> Iterator[Dict[str, Any]]:
+        import pyarrow.parquet as pq
+
+        with tempfile.NamedTemporaryFile(suffix='.parquet', dir=Config.DIRETORIO_TEMPORARIO) as temporario:
+            bucket.blob(caminho).download_to_filename(temporario.name)
+            arquivo = pq.ParquetFile(temporario.name)
+            metadados = arquivo.schema_arrow.metadata or {}
+            colunas_json = json.loads(metadados.get(METADADO_COLUNAS_JSON.encode(), b'[]'))
+            for lote in arquivo.iter_batches(batch_size=Config.PARQUET_LINHAS_POR_GRUPO):
+                for registro in lote.to_pylist():
+                    for nome in colunas_json:
+                        if registro.get(nome) is not None:
+                            registro[nome] = json.loads(registro[nome])
+                    yield registro
+
+
+class EscritorParticionado:
+    """
+    Partição em partes part-00000{ext}, part-00001{ext}, ... (limites em
+    Config.PARTE_MAX_*), finalizadas em paralelo enquanto a seguinte é
+    escrita, e um _manifest.json gravado por último, que os leitores seguem.
+    Cada parte NDJSON sobe no seu próprio upload resumível durante a escrita.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        caminho: str,
+        formato: "Formato",
+        transformar: Optional[Transformacao] = None,
+        comparar: bool = False,
+    ):
+        self.bucket = bucket
+        self.pasta = pasta_da_particao(caminho)
+        self.caminho = f"{self.pasta}/{ARQUIVO_MANIFESTO}"
+        self.formato = formato
+        self.transformar = transformar
+        self.comparar = comparar
+        self.inalterado = False
+        self.num_registros = 0
+        self._parte = None
+        self._fechadas: List[Tuple[Any, Future]] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _nova_parte(self):
+        return self.formato.criar_escritor(
+            self.bucket,
+            f"{self.pasta}/part-{len(self._fechadas):05d}{self.formato.extensao}",
+            transformar=self.transformar,
+            comparar=self.comparar,
+        )
+
+    def escrever(self, registro: Dict[str, Any]) -> None:
+        if self._parte is None:
+            self._parte = self._nova_parte()
+        self._parte.escrever(registro)
+        self.num_registros += 1
+
+        if self._parte.num_registros >= Config.PARTE_MAX_REGISTROS or self._parte.num_bytes >= Config.PARTE_MAX_BYTES:
+            self._fechar_parte()
+
+    def escrever_todos(self, registros: Iterable[Dict[str, Any]]) -> int:
+        for registro in registros:
+            self.escrever(registro)
+        return self.num_registros
+
+    def _fechar_parte(self) -> None:
+        """Envia a parte atual em segundo plano; espera se já há uploads demais na fila."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=Config.PARTES_UPLOADS_SIMULTANEOS, thread_name_prefix="parte"
+            )
+        self._fechadas.append((self._parte, self._executor.submit(propagar(self._parte.fechar))))
+        self._parte = None
+
+        pendentes = [futuro for _, futuro in self._fechadas if not futuro.done()]
+        if len(pendentes) >= Config.PARTES_UPLOADS_SIMULTANEOS:
+            pendentes[0].result()
+
+    def fechar(self, gravar_metadados: bool = True) -> int:
+        """Espera os uploads e grava o manifesto. Dia sem dados não gera partes nem manifesto."""
+        if self._parte is not None:
+            self._fechar_parte()
+        try:
+            for _, futuro in self._fechadas:
+                futuro.result()
+        finally:
+            self._encerrar_executor()
+
+        if not self._fechadas:
+            return 0
+
+        partes = [descrever_parte(escritor) for escritor, _ in self._fechadas]
+        manifesto_inalterado = gravar_manifesto(self.bucket, self.pasta, self.formato, partes)
+        self.inalterado = self.comparar and manifesto_inalterado and all(
+            escritor.inalterado for escritor, _ in self._fechadas
+        )
+        return self.num_registros
+
+    def _encerrar_executor(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def abortar(self) -> None:
+        """Descarta a parte atual; partes já enviadas ficam órfãs até a próxima execução."""
+        if self._parte is not None:
+            self._parte.abortar()
+            self._parte = None
+        self._encerrar_executor()
+        if self._fechadas:
+            logger.warning(
+                f"Escrita abortada: {self.pasta} ({len(self._fechadas)} partes enviadas sem manifesto)"
+            )
+
+
+def descrever_parte(escritor) -> Dict[str, Any]:
+    """Entrada do manifesto para uma parte já fechada."""
+    return {
+        "arquivo": escritor.caminho.rsplit('/', 1)[1],
+        "num_registros": escritor.num_registros,
+        "bytes": escritor.tamanho,
+        "crc32c": crc32c_base64(escritor.crc32c),
+    }
+
+
+def ler_manifesto(bucket, pasta: str) -> Optional[Dict[str, Any]]:
+    blob = bucket.get_blob(f"{pasta}/{ARQUIVO_MANIFESTO}")
+    if blob is None:
+        return None
+    return json.loads(blob.download_as_bytes())
+
+
+def gravar_manifesto(bucket, pasta: str, formato: "Formato", partes: List[Dict[str, Any]]) -> bool:
+    """
+    Grava o _manifest.json da partição e apaga as partes do manifesto anterior
+    que não estão no novo. O conteúdo não tem data de execução: partição
+    igual gera manifesto igual, que não é regravado (retorna True nesse caso).
+    """
+    manifesto = {
+        "formato": formato.nome,
+        "num_registros": sum(parte["num_registros"] for parte in partes),
+        "num_partes": len(partes),
+        "partes": partes,
+    }
+    anterior = ler_manifesto(bucket, pasta)
+    if anterior == manifesto:
+        return True
+
+    bucket.blob(f"{pasta}/{ARQUIVO_MANIFESTO}").upload_from_string(
+        json.dumps(manifesto, ensure_ascii=False, indent=2), content_type='application/json'
+    )
+
+    atuais = {parte["arquivo"] for parte in partes}
+    for parte in (anterior or {}).get("partes", []):
+        if parte["arquivo"] not in atuais:
+            try:
+                bucket.blob(f"{pasta}/{parte['arquivo']}").delete()
+            except NotFound:
+                pass
+    return False
+
+
+FORMATOS = {
+    'ndjson': FormatoNDJSON('ndjson', '.json', CONTENT_TYPE_NDJSON),
+    'ndjson.gz': FormatoNDJSON('ndjson.gz', '.json.gz', 'application/gzip', compressao='gzip'),
+    'ndjson.zst': FormatoNDJSON('ndjson.zst', '.json.zst', 'application/zstd', compressao='zstd'),
+    'parquet': FormatoParquet('parquet', '.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def obter_formato(pasta: str) -> Formato:
+    """Formato configurado para a pasta (endpoint) em Config.FORMATO_SAIDA."""
+    nome = Config.FORMATO_SAIDA.get(pasta, Config.FORMATO_SAIDA_PADRAO)
+    if nome not in FORMATOS:
+        raise ValueError(f"Formato de saída desconhecido para {pasta}: {nome}")
+    return FORMATOS[nome]
+
+
+def ler_particao(bucket, caminho: str, formato: Formato) -> Iterator[Dict[str, Any]]:
+    """
+    Relê os registros da partição de `caminho` (o data{ext}). No layout em
+    partes, segue o manifesto; sem manifesto, lê o arquivo único.
+    """
+    if particao_em_partes():
+        pasta = pasta_da_particao(caminho)
+        manifesto = ler_manifesto(bucket, pasta)
+        if manifesto is not None:
+            for parte in manifesto["partes"]:
+                yield from formato.ler(bucket, f"{pasta}/{parte['arquivo']}")
+            return
+    yield from formato.ler(bucket, caminho)
+
+
+def salvar_registros(
+    bucket,
+    caminho: str,
+    registros: Iterable[Dict[str, Any]],
+    transformar: Optional[Transformacao] = None,
+    formato: Formato = FORMATOS['ndjson'],
+) -> int:
+    """
+    Grava os registros em `caminho` no formato dado (ou em partes, com
+    Config.LAYOUT_PARTICAO="partes"), sem reenviar conteúdo idêntico ao já
+    gravado (Config.PULAR_INALTERADAS). Retorna o número de registros.
+    """
+    if particao_em_partes():
+        escritor = EscritorParticionado(
+            bucket, caminho, formato, transformar=transformar, comparar=Config.PULAR_INALTERADAS
+        )
+    else:
+        escritor = formato.criar_escritor(
+            bucket, caminho, transformar=transformar, comparar=Config.PULAR_INALTERADAS
+        )
+    try:
+        escritor.escrever_todos(registros)
+        total = escritor.fechar()
+    except Exception:
+        escritor.abortar()
+        raise
+
+    if escritor.comparar and total:
+        registrar_particao(escritor.caminho, escritor.inalterado)
+    return total
@@ -0,0 +1,242 @@
+"""
+Benchmark offline do pipeline de extração.
+
+Sobe um servidor fake do Bling/AnyMarket (benchmarks/servidor_fake.py) e um
+bucket fake em disco (benchmarks/gcs_fake.py), roda os extratores de ponta a
+ponta pelo mesmo orquestrador do /run e reporta registros/s, requisições/s,
+pico de RSS e tempo de parede.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.extracao --paginas 50 --latencia-ms 50 \
+        [--endpoints bling.vendas,bling.nfe,bling.produtos,anymarket.pedidos] \
+        [--motor threads|async] [--taxa-429 0.02 --taxa-401 0.01 --taxa-5xx 0.01] \
+        [--detalhes] [--cache-http /tmp/cache-http] [--saida-json resultados.jsonl]
+
+Com --saida-json cada execução é acrescentada como uma linha JSON (com o
+commit atual), para comparar o desempenho entre versões. Com --cache-http
+o cache de respostas das listagens fica nesse diretório: rodar duas vezes
+com o mesmo diretório mede a reexecução servida pelo cache.
+"""
+import argparse
+import json
+import logging
+import resource
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from benchmarks.gcs_fake import ClienteFake
+from benchmarks.servidor_fake import Cenario, ServidorFake
+
+BUCKET = "benchmark"
+ENDPOINTS_PADRAO = "bling.vendas,bling.nfe,anymarket.pedidos"
+
+
+def _rss_atual_mib() -> float:
+    with open("/proc/self/status") as status:
+        for linha in status:
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1]) / 1024
+    return 0.0
+
+
+def _pico_rss_mib() -> float:
+    # ru_maxrss vem em KiB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configurar(args: argparse.Namespace) -> None:
+    """Aponta o app para os fakes. Precisa rodar antes de criar limitadores e sessões."""
+    from google.cloud import storage
+
+    from app.config import Config
+
+    storage.Client = ClienteFake
+
+    Config.BUCKET_NAME = BUCKET
+    Config.BLING_CLIENT_ID = "benchmark"
+    Config.BLING_CLIENT_SECRET = "benchmark"
+    Config.ANYMARKET_TOKEN = "benchmark"
+    Config.MOTOR_EXTRACAO = args.motor
+    Config.CHECKPOINT_ATIVO = not args.sem_checkpoint
+    Config.LIMITES_REQ_POR_SEGUNDO = {"bling": args.req_por_segundo, "anymarket": args.req_por_segundo}
+    if args.formato:
+        Config.FORMATO_SAIDA = {pasta: args.formato for pasta in Config.FORMATO_SAIDA}
+    Config.HTTP_MAX_RETRIES = args.max_retries
+    Config.LAYOUT_PARTICAO = args.layout
+    Config.ENRIQUECER_DETALHES = args.detalhes
+    if args.cache_http:
+        Config.HTTP_CACHE_ATIVO = True
+        Config.HTTP_CACHE_DIRETORIO = args.cache_http
+
+
+def _montar_tarefas(endpoints: List[str], url: str, data_alvo: str):
+    from app.anymarket.auth import AnymarketAuth
+    from app.anymarket.extract import ExtratorAnymarket
+    from app.bling.auth import BlingAuth
+    from app.bling.extract import ExtratorBling
+    from app.config import Config
+    from app.gcs_handler import GCSHandler
+
+    gcs = GCSHandler(BUCKET)
+    gcs.salvar_json(Config.TOKEN_PATH, {
+        "access_token": "token-inicial",
+        "refresh_token": "refresh-inicial",
+        "expires_in": 21600,
+        "created_at": time.time(),
+    })
+    BlingAuth._cache = None
+
+    ExtratorBling.URL_BASE = f"{url}/Api/v3"
+    ExtratorAnymarket.URL_BASE = f"{url}/v2"
+
+    auth_bling = BlingAuth(gcs)
+    auth_bling.base_url = f"{url}/Api/v3/oauth/token"
+    extratores = {
+        "bling": ExtratorBling(auth_bling, gcs, data_alvo),
+        "anymarket": ExtratorAnymarket(AnymarketAuth(gcs), gcs, data_alvo),
+    }
+    funcoes = {
+        "bling.vendas": extratores["bling"].extrair_vendas,
+        "bling.nfe": extratores["bling"].extrair_nfe,
+        "bling.produtos": extratores["bling"].extrair_produtos,
+        "anymarket.pedidos": extratores["anymarket"].extrair_pedidos,
+    }
+
+    tarefas = {}
+    for nome in endpoints:
+        if nome not in funcoes:
+            raise ValueError(f"Endpoint não suportado: {nome}")
+        tarefas[nome] = (nome.split(".", 1)[0], funcoes[nome])
+    return tarefas
+
+
+def executar(args: argparse.Namespace) -> Dict[str, Any]:
+    cenario = Cenario(
+        paginas=args.paginas,
+        latencia_ms=args.latencia_ms,
+        jitter_ms=args.jitter_ms,
+        tamanho_registro=args.tamanho_registro,
+        taxa_429=args.taxa_429,
+        taxa_401=args.taxa_401,
+        taxa_5xx=args.taxa_5xx,
+        retry_after_s=args.retry_after_s,
+        semente=args.semente,
+    )
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    data_alvo = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    with tempfile.TemporaryDirectory(prefix="bench-gcs-") as raiz, ServidorFake(cenario) as servidor:
+        ClienteFake.raiz = raiz
+        _configurar(args)
+
+        from app.metrics import REGISTRO
+        from app.orchestrator import executar_tarefas
+
+        tarefas = _montar_tarefas(endpoints, servidor.url, data_alvo)
+        rss_inicial = _rss_atual_mib()
+        metricas_antes = REGISTRO.capturar()
+
+        inicio = time.perf_counter()
+        resultados = executar_tarefas(tarefas)
+        duracao = time.perf_counter() - inicio
+
+        pico_rss = _pico_rss_mib()
+        metricas = REGISTRO.resumo(metricas_antes)
+        contadores = requests.get(f"{servidor.url}/_stats", timeout=10).json()["contadores"]
+        objetos = ClienteFake().bucket(BUCKET).listar("raw/")
+
+    registros = sum(r.get("registros", 0) for r in resultados.values())
+    requisicoes = sum(n for chave, n in contadores.items() if not chave.startswith("/_stats"))
+    return {
+        "commit": _commit_atual(),
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "motor": args.motor,
+        "checkpoint": not args.sem_checkpoint,
+        "formato": args.formato or "config",
+        "layout": args.layout,
+        "cache_http": bool(args.cache_http),
+        "endpoints": endpoints,
+        "cenario": asdict(cenario),
+        "tempo_parede_s": round(duracao, 3),
+        "registros": registros,
+        "registros_por_s": round(registros / duracao, 1) if duracao else 0.0,
+        "requisicoes": requisicoes,
+        "requisicoes_por_s": round(requisicoes / duracao, 1) if duracao else 0.0,
+        "rss_inicial_mib": round(rss_inicial, 1),
+        "pico_rss_mib": round(pico_rss, 1),
+        "bytes_gravados": sum(objetos.values()),
+        "respostas": contadores,
+        "tarefas": resultados,
+        "metricas": metricas,
+    }
+
+
+def _imprimir(resultado: Dict[str, Any]) -> None:
+    print(f"commit {resultado['commit']} | motor {resultado['motor']} | checkpoint {resultado['checkpoint']} "
+          f"| formato {resultado['formato']} | layout {resultado['layout']}")
+    for nome, tarefa in resultado["tarefas"].items():
+        detalhe = tarefa.get("registros", tarefa.get("erro"))
+        print(f"  {nome:<20} {tarefa['status']:<8} {detalhe} ({tarefa['duracao_s']}s)")
+    print(f"  tempo de parede    {resultado['tempo_parede_s']:>10.2f} s")
+    print(f"  registros          {resultado['registros']:>10} ({resultado['registros_por_s']:.1f}/s)")
+    print(f"  requisições        {resultado['requisicoes']:>10} ({resultado['requisicoes_por_s']:.1f}/s)")
+    print(f"  RSS inicial / pico {resultado['rss_inicial_mib']:>6.1f} / {resultado['pico_rss_mib']:.1f} MiB")
+    print(f"  bytes gravados     {resultado['bytes_gravados']:>10}")
+    print("  respostas: " + ", ".join(f"{k}: {v}" for k, v in sorted(resultado["respostas"].items())))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline dos extratores Bling/AnyMarket.")
+    parser.add_argument("--endpoints", default=ENDPOINTS_PADRAO)
+    parser.add_argument("--paginas", type=int, default=50, help="Páginas por endpoint (100 registros cada)")
+    parser.add_argument("--latencia-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--tamanho-registro", type=int, default=512, help="Bytes de preenchimento por registro")
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--taxa-401", type=float, default=0.0, help="Só no Bling (token OAuth)")
+    parser.add_argument("--taxa-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after-s", type=float, default=0.5)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--motor", choices=("threads", "async"), default="threads")
+    parser.add_argument("--req-por-segundo", type=float, default=1000.0, help="Teto do limitador de cada API")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--formato", choices=("ndjson", "ndjson.gz", "ndjson.zst", "parquet"))
+    parser.add_argument("--layout", choices=("arquivo", "partes"), default="arquivo")
+    parser.add_argument("--sem-checkpoint", action="store_true")
+    parser.add_argument("--detalhes", action="store_true", help="Liga o enriquecimento Bling (detalhe de cada registro)")
+    parser.add_argument("--cache-http", help="Liga o cache de respostas HTTP neste diretório")
+    parser.add_argument("--saida-json", help="Acrescenta o resultado como uma linha JSON neste arquivo")
+    parser.add_argument("--verboso", action="store_true", help="Mantém os logs INFO do pipeline")
+    args = parser.parse_args(argv)
+
+    if not args.verboso:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("BlingGCS").setLevel(logging.WARNING)
+
+    resultado = executar(args)
+    _imprimir(resultado)
+
+    if args.saida_json:
+        with open(args.saida_json, "a", encoding="utf-8") as saida:
+            saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+
+    return 0 if all(t["status"] == "success" for t in resultado["tarefas"].values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,30 @@
+"""
+Substituto de storage.Client() para os benchmarks.
+
+Os buckets são o backend local do app (app/storage_backend.py: objetos em
+arquivos num diretório temporário, então os dados gravados não inflam o RSS
+medido). Trocar storage.Client, em vez de usar Config.STORAGE_BACKEND,
+mantém no caminho medido a fábrica de clientes do GCS.
+"""
+import threading
+from typing import Dict
+
+from app.storage_backend import BucketLocal
+
+
+class ClienteFake:
+    """Substituto de storage.Client(): todos os clientes do processo veem os mesmos buckets."""
+
+    raiz: str = ""
+    _buckets: Dict[str, BucketLocal] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        if not self.raiz:
+            raise RuntimeError("ClienteFake.raiz não configurada")
+
+    def bucket(self, nome: str) -> BucketLocal:
+        with self._lock:
+            if nome not in self._buckets:
+                self._buckets[nome] = BucketLocal(nome, self.raiz)
+            return self._buckets[nome]
@@ -0,0 +1,178 @@
+"""
+Benchmark de inicialização (cold start) do serviço.
+
+Cada repetição roda num processo Python novo e mede:
+  - import:  `import app.main`, o que o gunicorn faz antes de aceitar tráfego;
+  - storage: import de google.cloud.storage (antes feito no boot, agora no
+             primeiro uso do GCS);
+  - setup:   o preparo do primeiro /run (gerenciador de jobs e
+             montar_tarefas dos pipelines), com os pacotes dos pipelines
+             sendo importados nesse momento;
+  - quantos clientes do storage foram criados no caminho.
+
+O GCS é o bucket fake em disco (benchmarks/gcs_fake.py); cada cliente criado
+espera --latencia-cliente-ms, simulando a descoberta de credenciais do
+storage.Client() (metadata server no Cloud Run).
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.inicializacao [--repeticoes 5] [--pipelines bling,anymarket] \
+        [--latencia-cliente-ms 100] [--importtime 15] [--saida-json resultados.jsonl]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+BUCKET = "benchmark"
+
+
+def _filho(pipelines: List[str], latencia_cliente_ms: float) -> Dict[str, Any]:
+    """Executado no processo novo: mede e devolve os tempos em ms."""
+    inicio = time.perf_counter()
+    import app.main
+    t_import = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    from google.cloud import storage
+    t_storage = time.perf_counter() - inicio
+
+    from benchmarks.gcs_fake import ClienteFake
+
+    clientes = []
+
+    class ClienteContado(ClienteFake):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            time.sleep(latencia_cliente_ms / 1000)
+            clientes.append(self)
+
+    storage.Client = ClienteContado
+    app.main.Config.BUCKET_NAME = BUCKET
+
+    with tempfile.TemporaryDirectory(prefix="bench-init-") as raiz:
+        ClienteFake.raiz = raiz
+        data_alvo = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+        inicio = time.perf_counter()
+        from app.jobs import obter_gerenciador
+        obter_gerenciador()
+        tarefas = app.main.montar_tarefas(pipelines, data_alvo)
+        t_setup = time.perf_counter() - inicio
+
+    return {
+        "import_ms": round(t_import * 1000, 1),
+        "storage_ms": round(t_storage * 1000, 1),
+        "setup_ms": round(t_setup * 1000, 1),
+        "clientes_storage": len(clientes),
+        "tarefas": sorted(tarefas),
+        "modulos_carregados": len(sys.modules),
+    }
+
+
+def _rodar_filho(args: argparse.Namespace) -> Dict[str, Any]:
+    saida = subprocess.run(
+        [sys.executable, "-m", "benchmarks.inicializacao", "--filho",
+         "--pipelines", args.pipelines, "--latencia-cliente-ms", str(args.latencia_cliente_ms)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def _importtime(quantidade: int) -> List[Dict[str, Any]]:
+    """Módulos de topo mais caros de `import app.main` (-X importtime, tempo acumulado)."""
+    erro = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    # Os filhos saem antes do pai: junta os de um nível abaixo até a linha do app.main
+    pendentes: List[Dict[str, Any]] = []
+    for linha in erro.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, nome = linha[len("import time:"):].split("|")
+        if not nome.startswith("  "):
+            if nome.strip() == "app.main":
+                return sorted(pendentes, key=lambda m: -m["acumulado_ms"])[:quantidade]
+            pendentes = []
+        elif not nome.startswith("    "):
+            pendentes.append({"modulo": nome.strip(), "acumulado_ms": round(int(acumulado) / 1000, 1)})
+    return []
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args: argparse.Namespace) -> Dict[str, Any]:
+    amostras = [_rodar_filho(args) for _ in range(args.repeticoes)]
+
+    def mediana(chave: str) -> float:
+        return round(statistics.median(a[chave] for a in amostras), 1)
+
+    return {
+        "commit": _commit_atual(),
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "pipelines": args.pipelines.split(","),
+        "repeticoes": args.repeticoes,
+        "latencia_cliente_ms": args.latencia_cliente_ms,
+        "import_ms": mediana("import_ms"),
+        "storage_ms": mediana("storage_ms"),
+        "setup_ms": mediana("setup_ms"),
+        "clientes_storage": amostras[0]["clientes_storage"],
+        "tarefas": amostras[0]["tarefas"],
+        "importtime": _importtime(args.importtime) if args.importtime else [],
+        "amostras": amostras,
+    }
+
+
+def _imprimir(resultado: Dict[str, Any]) -> None:
+    print(f"commit {resultado['commit']} | pipelines {','.join(resultado['pipelines'])} "
+          f"| {resultado['repeticoes']} processos (medianas)")
+    print(f"  import app.main    {resultado['import_ms']:>10.1f} ms")
+    print(f"  google.cloud.storage {resultado['storage_ms']:>8.1f} ms")
+    print(f"  setup do 1º /run   {resultado['setup_ms']:>10.1f} ms "
+          f"({resultado['clientes_storage']} clientes do storage, {resultado['latencia_cliente_ms']:g} ms cada)")
+    print(f"  tarefas            {', '.join(resultado['tarefas'])}")
+    if resultado["importtime"]:
+        print("  imports mais caros do app.main (acumulado):")
+        for modulo in resultado["importtime"]:
+            print(f"    {modulo['modulo']:<30} {modulo['acumulado_ms']:>8.1f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de cold start do serviço.")
+    parser.add_argument("--pipelines", default="bling,anymarket")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Processos novos medidos")
+    parser.add_argument("--latencia-cliente-ms", type=float, default=100.0,
+                        help="Custo simulado de cada storage.Client() (descoberta de credenciais)")
+    parser.add_argument("--importtime", type=int, default=10, help="Quantos imports listar (0 desliga)")
+    parser.add_argument("--saida-json", help="Acrescenta o resultado como uma linha JSON neste arquivo")
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.filho:
+        # Os logs do pipeline vão para stderr; o stdout leva só o JSON
+        print(json.dumps(_filho(args.pipelines.split(","), args.latencia_cliente_ms)))
+        return 0
+
+    resultado = executar(args)
+    _imprimir(resultado)
+
+    if args.saida_json:
+        with open(args.saida_json, "a", encoding="utf-8") as saida:
+            saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+"""
+Microbenchmark da normalização de chaves do AnyMarket.
+
+Compara, por N pedidos paginados como na API (100 por página):
+  - antes:  json.loads da página + cópia recursiva (_normalizar_chaves) de
+            cada registro;
+  - depois: json.loads com object_pairs_hook (chaves normalizadas durante a
+            decodificação).
+Reporta o CPU da decodificação, o CPU incluindo o json.dumps feito pelo
+writer, e o pico de memória (tracemalloc) ao decodificar uma página.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.normalizacao_chaves [--pedidos 100000] [--repeticoes 3]
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from app.anymarket.normalize import carregar_json, normalizar_chaves
+
+POR_PAGINA = 100
+PAGINAS_DISTINTAS = 20
+
+
+def _pedido(aleatorio: random.Random, id_pedido: int) -> Dict[str, Any]:
+    """Pedido sintético com o formato aninhado do /v2/orders (itens, envio, pagamentos)."""
+    return {
+        "id": id_pedido,
+        "marketPlace": "MERCADO_LIVRE",
+        "marketPlaceId": f"200{id_pedido}",
+        "createdAt": "2026-10-15T13:22:01-03:00",
+        "status": "PAID_WAITING_SHIP",
+        "total": round(aleatorio.uniform(20, 2000), 2),
+        "buyer": {
+            "id": aleatorio.randint(1, 10**6),
+            "name": "Cliente Teste",
+            "document-type": "CPF",
+            "document-number": "00000000000",
+            "phone-number": "11999999999",
+        },
+        "shipping": {
+            "city": "São Paulo",
+            "state": "SP",
+            "zip-code": "01000-000",
+            "promised-shipping-time": "2026-10-20T00:00:00-03:00",
+            "shipping-carrier-normalized": "MERCADO_ENVIOS",
+        },
+        "items": [
+            {
+                "sku": {"id": aleatorio.randint(1, 10**5), "partner-id": f"SKU-{i}", "title": "Produto"},
+                "amount": aleatorio.randint(1, 5),
+                "unit": round(aleatorio.uniform(10, 500), 2),
+                "gross-value": round(aleatorio.uniform(10, 500), 2),
+                "discount-value": 0.0,
+                "order-item-id": f"{id_pedido}-{i}",
+            }
+            for i in range(aleatorio.randint(1, 4))
+        ],
+        "payments": [
+            {
+                "method": "CREDIT_CARD",
+                "status": "APPROVED",
+                "value": round(aleatorio.uniform(20, 2000), 2),
+                "installments": aleatorio.randint(1, 12),
+                "payment-method-normalized": "CARTAO",
+            }
+        ],
+    }
+
+
+def gerar_paginas() -> List[bytes]:
+    """Conjunto pequeno de páginas distintas, reaproveitado em ciclo pelo benchmark."""
+    aleatorio = random.Random(42)
+    return [
+        json.dumps({"content": [_pedido(aleatorio, p * POR_PAGINA + i) for i in range(POR_PAGINA)]}).encode()
+        for p in range(PAGINAS_DISTINTAS)
+    ]
+
+
+def decodificar_antes(pagina: bytes) -> List[Dict[str, Any]]:
+    return [normalizar_chaves(registro) for registro in json.loads(pagina)["content"]]
+
+
+def decodificar_depois(pagina: bytes) -> List[Dict[str, Any]]:
+    return carregar_json(pagina)["content"]
+
+
+def serializar(registros: List[Dict[str, Any]]) -> int:
+    return sum(len(json.dumps(registro, ensure_ascii=False)) for registro in registros)
+
+
+def medir(decodificar: Callable[[bytes], List[Dict]], paginas: List[bytes], total_paginas: int, repeticoes: int) -> Dict[str, float]:
+    def cpu(fluxo: Callable[[bytes], Any]) -> float:
+        # Melhor de N, sem tracemalloc (que distorce o tempo)
+        melhor = float("inf")
+        for _ in range(repeticoes):
+            inicio = time.process_time()
+            for i in range(total_paginas):
+                fluxo(paginas[i % len(paginas)])
+            melhor = min(melhor, time.process_time() - inicio)
+        return melhor
+
+    # Memória: pico acima da linha de base ao decodificar uma página,
+    # com a página bruta e os registros normalizados vivos ao mesmo tempo
+    tracemalloc.start()
+    picos = []
+    for pagina in paginas:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        decodificar(pagina)
+        picos.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {
+        "decodificacao_s": cpu(decodificar),
+        "com_serializacao_s": cpu(lambda pagina: serializar(decodificar(pagina))),
+        "pico_pagina_kib": sum(picos) / len(picos) / 1024,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark da normalização de chaves do AnyMarket.")
+    parser.add_argument("--pedidos", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    paginas = gerar_paginas()
+    total_paginas = max(args.pedidos // POR_PAGINA, 1)
+    assert decodificar_antes(paginas[0]) == decodificar_depois(paginas[0]), "saídas divergentes"
+
+    a = medir(decodificar_antes, paginas, total_paginas, args.repeticoes)
+    d = medir(decodificar_depois, paginas, total_paginas, args.repeticoes)
+
+    print(f"{total_paginas * POR_PAGINA} pedidos, {total_paginas} páginas de {POR_PAGINA}")
+    print(f"{'fluxo':<28} {'decodificação (s)':>18} {'+ json.dumps (s)':>17} {'pico/página (KiB)':>18}")
+    for nome, r in (("antes (cópia recursiva)", a), ("depois (object_pairs_hook)", d)):
+        print(f"{nome:<28} {r['decodificacao_s']:>18.2f} {r['com_serializacao_s']:>17.2f} {r['pico_pagina_kib']:>18.0f}")
+
+    print(
+        f"economia por {total_paginas * POR_PAGINA} pedidos: "
+        f"{a['decodificacao_s'] - d['decodificacao_s']:.2f} s de CPU na decodificação "
+        f"({(1 - d['decodificacao_s'] / a['decodificacao_s']) * 100:.0f}%), "
+        f"{a['com_serializacao_s'] - d['com_serializacao_s']:.2f} s no fluxo completo, "
+        f"{(1 - d['pico_pagina_kib'] / a['pico_pagina_kib']) * 100:.0f}% de pico de memória por página"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
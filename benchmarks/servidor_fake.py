@@ -0,0 +1,320 @@
+"""
+Servidor HTTP local que imita a paginação do Bling (pedidos/vendas, nfe,
+produtos, oauth/token e o detalhe
+{endpoint}/{id}; a nfe respeita o filtro de hora de emissão e produtos o de
+data de alteração) e do AnyMarket (orders), para medir o pipeline sem tocar nas
+APIs de produção.
+
+Roda num processo separado (o RSS medido no benchmark é só o do pipeline).
+GET /_stats devolve os contadores de requisições por rota e status.
+"""
+import json
+import multiprocessing
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class Cenario:
+    """Parâmetros do servidor fake (todas as taxas são probabilidades por requisição)."""
+    paginas: int = 50
+    latencia_ms: float = 50.0
+    jitter_ms: float = 10.0
+    tamanho_registro: int = 512
+    taxa_429: float = 0.0
+    taxa_401: float = 0.0
+    taxa_5xx: float = 0.0
+    retry_after_s: float = 0.5
+    semente: int = 42
+
+
+class _Estado:
+    def __init__(self, cenario: Cenario):
+        self.cenario = cenario
+        self.aleatorio = random.Random(cenario.semente)
+        self.lock = threading.Lock()
+        self.contadores: Dict[str, int] = {}
+
+    def contar(self, rota: str, status: int) -> None:
+        with self.lock:
+            chave = f"{rota} {status}"
+            self.contadores[chave] = self.contadores.get(chave, 0) + 1
+
+    def sortear(self) -> float:
+        with self.lock:
+            return self.aleatorio.random()
+
+
+def _preenchimento(tamanho: int, semente: int) -> str:
+    base = f"{semente:08x}"
+    return (base * (tamanho // len(base) + 1))[:tamanho]
+
+
+def _venda(n: int, tamanho: int) -> Dict[str, Any]:
+    return {
+        "id": 10_000_000 + n,
+        "numero": n,
+        "data": "2026-10-15",
+        "totalProdutos": round(50 + n % 900 + 0.9, 2),
+        "total": round(60 + n % 900 + 0.9, 2),
+        "contato": {"id": 500_000 + n % 7_000, "nome": "Cliente Teste", "tipoPessoa": "F"},
+        "situacao": {"id": 9, "valor": 1},
+        "loja": {"id": 203_000_000 + n % 5},
+        "observacoes": _preenchimento(tamanho, n),
+    }
+
+
+SEGUNDOS_DIA = 86_400
+
+
+def _nfe_hora(n: int, total: int) -> str:
+    """Hora de emissão (HH:MM:SS): NFe espalhadas uniformemente pelo dia, na ordem do número."""
+    segundo = n * SEGUNDOS_DIA // max(total, 1)
+    return f"{segundo // 3600:02d}:{segundo // 60 % 60:02d}:{segundo % 60:02d}"
+
+
+def _nfe(n: int, tamanho: int, total: int) -> Dict[str, Any]:
+    return {
+        "id": 20_000_000 + n,
+        "tipo": 1,
+        "situacao": 5,
+        "numero": f"{n:06d}",
+        "dataEmissao": f"2026-10-15 {_nfe_hora(n, total)}",
+        "chaveAcesso": f"3526{n:040d}",
+        "contato": {"id": 500_000 + n % 7_000, "nome": "Cliente Teste", "numeroDocumento": "00000000000"},
+        "naturezaOperacao": {"id": 1},
+        "loja": {"id": 203_000_000 + n % 5},
+        "xml": _preenchimento(tamanho, n),
+    }
+
+
+def _produto(n: int, tamanho: int) -> Dict[str, Any]:
+    """Catálogo fixo; 1 produto em cada 20 foi alterado em 2026-10-15, os demais no início do ano."""
+    alterado = n % 20 == 0
+    return {
+        "id": 900_000 + n,
+        "codigo": f"SKU-{n}",
+        "nome": f"Produto {n}",
+        "preco": round(10 + n % 500 + (0.5 if alterado else 0.0), 2),
+        "situacao": "A",
+        "dataAlteracao": f"2026-10-15 {_nfe_hora(n, 5_000)}" if alterado else "2026-01-02 10:00:00",
+        "descricaoCurta": _preenchimento(tamanho, n),
+    }
+
+
+def _pedido_anymarket(n: int, tamanho: int) -> Dict[str, Any]:
+    return {
+        "id": 30_000_000 + n,
+        "marketPlace": "MERCADO_LIVRE",
+        "createdAt": "2026-10-15T13:22:01-03:00",
+        "status": "PAID_WAITING_SHIP",
+        "total": round(60 + n % 900 + 0.9, 2),
+        "buyer": {"id": 700_000 + n % 9_000, "name": "Cliente Teste", "document-type": "CPF"},
+        "shipping": {"city": "São Paulo", "zip-code": "01000-000", "promised-shipping-time": "2026-10-20T00:00:00-03:00"},
+        "items": [
+            {"sku": {"partner-id": f"SKU-{n % 300}-{i}"}, "amount": 1 + i, "gross-value": 10.0 * (i + 1)}
+            for i in range(1 + n % 3)
+        ],
+        "payments": [{"method": "CREDIT_CARD", "payment-method-normalized": "CARTAO", "value": 60.0}],
+        "observation": _preenchimento(tamanho, n),
+    }
+
+
+def _detalhe(resumo: Dict[str, Any], n: int) -> Dict[str, Any]:
+    """Detalhe de um documento: o resumo da listagem mais itens e parcelas."""
+    return {
+        **resumo,
+        "itens": [
+            {"produto": {"id": 900_000 + (n + i) % 3_000}, "quantidade": 1 + i, "valor": 10.0 * (i + 1)}
+            for i in range(1 + n % 3)
+        ],
+        "parcelas": [{"dataVencimento": "2026-11-15", "valor": resumo.get("total", 60.0)}],
+    }
+
+
+def _registros(gerador, inicio: int, quantidade: int, total: int, tamanho: int) -> List[Dict[str, Any]]:
+    return [gerador(n, tamanho) for n in range(inicio, min(inicio + quantidade, total))]
+
+
+def _criar_handler(estado: _Estado):
+    cenario = estado.cenario
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, como as APIs reais
+        protocol_version = "HTTP/1.1"
+        # Cabeçalho e corpo saem em writes separados; com Nagle ligado o corpo
+        # espera o ACK atrasado do cliente (~40ms por resposta)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def handle(self) -> None:
+            try:
+                super().handle()
+            except ConnectionResetError:
+                # Cliente fechou a conexão keep-alive (motor async cancelando páginas especulativas)
+                pass
+
+        def _responder(self, rota: str, status: int, corpo: Any, cabecalhos: Optional[Dict[str, str]] = None) -> None:
+            dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            for nome, valor in (cabecalhos or {}).items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            try:
+                self.wfile.write(dados)
+            except (BrokenPipeError, ConnectionResetError):
+                # Cliente desistiu (extração abortada ou página especulativa cancelada)
+                self.close_connection = True
+            estado.contar(rota, status)
+
+        def _falha_injetada(self, rota: str, api: str) -> bool:
+            sorteio = estado.sortear()
+            if sorteio < cenario.taxa_429:
+                self._responder(rota, 429, {"error": "too many requests"}, {"Retry-After": str(cenario.retry_after_s)})
+                return True
+            sorteio -= cenario.taxa_429
+            # 401 só no Bling: o token do AnyMarket é fixo, um 401 lá não é transitório
+            if api == "bling" and sorteio < cenario.taxa_401:
+                self._responder(rota, 401, {"error": {"type": "invalid_token"}})
+                return True
+            sorteio -= cenario.taxa_401
+            if sorteio < cenario.taxa_5xx:
+                self._responder(rota, 503, {"error": "unavailable"})
+                return True
+            return False
+
+        def _esperar(self) -> None:
+            atraso = cenario.latencia_ms + estado.sortear() * cenario.jitter_ms
+            if atraso > 0:
+                time.sleep(atraso / 1000)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            rota = url.path
+
+            if rota == "/_stats":
+                with estado.lock:
+                    contadores = dict(estado.contadores)
+                self._responder(rota, 200, {"contadores": contadores, "cenario": asdict(cenario)})
+                return
+
+            self._esperar()
+
+            if rota == "/Api/v3/pedidos/vendas":
+                if self._falha_injetada(rota, "bling"):
+                    return
+                limite = int(params.get("limite", 100))
+                pagina = int(params.get("pagina", 1))
+                total = cenario.paginas * limite
+                dados = _registros(_venda, (pagina - 1) * limite, limite, total, cenario.tamanho_registro)
+                self._responder(rota, 200, {"data": dados})
+                return
+
+            if rota == "/Api/v3/nfe":
+                if self._falha_injetada(rota, "bling"):
+                    return
+                limite = int(params.get("limite", 100))
+                pagina = int(params.get("pagina", 1))
+                # O volume do dia é fixo (paginas x 100); o filtro de emissão recorta a janela
+                total = cenario.paginas * 100
+                janela = [
+                    n for n in range(total)
+                    if params.get("dataEmissaoInicial", "")[-8:] <= _nfe_hora(n, total)
+                    <= (params.get("dataEmissaoFinal", "")[-8:] or "23:59:59")
+                ]
+                dados = [_nfe(n, cenario.tamanho_registro, total) for n in janela[(pagina - 1) * limite:pagina * limite]]
+                self._responder(rota, 200, {"data": dados})
+                return
+
+            if rota == "/Api/v3/produtos":
+                if self._falha_injetada(rota, "bling"):
+                    return
+                limite = int(params.get("limite", 100))
+                pagina = int(params.get("pagina", 1))
+                catalogo = [_produto(n, cenario.tamanho_registro) for n in range(cenario.paginas * 100)]
+                inicial = params.get("dataAlteracaoInicial", "")
+                final = params.get("dataAlteracaoFinal", "9999")
+                janela = [p for p in catalogo if inicial <= p["dataAlteracao"] <= final]
+                self._responder(rota, 200, {"data": janela[(pagina - 1) * limite:pagina * limite]})
+                return
+
+            partes = rota.rsplit("/", 1)
+            if partes[0] in ("/Api/v3/pedidos/vendas", "/Api/v3/nfe") and partes[1].isdigit():
+                rota_detalhe = f"{partes[0]}/:id"
+                if self._falha_injetada(rota_detalhe, "bling"):
+                    return
+                vendas = partes[0].endswith("vendas")
+                n = int(partes[1]) - (10_000_000 if vendas else 20_000_000)
+                resumo = _venda(n, cenario.tamanho_registro) if vendas else _nfe(n, cenario.tamanho_registro, cenario.paginas * 100)
+                self._responder(rota_detalhe, 200, {"data": _detalhe(resumo, n)})
+                return
+
+            if rota == "/v2/orders":
+                if self._falha_injetada(rota, "anymarket"):
+                    return
+                limite = int(params.get("limit", 100))
+                offset = int(params.get("offset", 0))
+                total = cenario.paginas * limite
+                dados = _registros(_pedido_anymarket, offset, limite, total, cenario.tamanho_registro)
+                self._responder(rota, 200, {"content": dados})
+                return
+
+            self._responder(rota, 404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            rota = urlparse(self.path).path
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if rota == "/Api/v3/oauth/token":
+                self._esperar()
+                self._responder(rota, 200, {
+                    "access_token": f"token-{time.monotonic_ns()}",
+                    "refresh_token": f"refresh-{time.monotonic_ns()}",
+                    "expires_in": 21600,
+                    "token_type": "Bearer",
+                })
+                return
+            self._responder(rota, 404, {"error": "not found"})
+
+    return Handler
+
+
+def _servir(cenario: Cenario, porta, pronto) -> None:
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _criar_handler(_Estado(cenario)))
+    servidor.daemon_threads = True
+    porta.value = servidor.server_address[1]
+    pronto.set()
+    servidor.serve_forever()
+
+
+class ServidorFake:
+    """Sobe o servidor num processo filho; use como context manager."""
+
+    def __init__(self, cenario: Cenario):
+        self.cenario = cenario
+        self._processo: Optional[multiprocessing.Process] = None
+        self.url = ""
+
+    def __enter__(self) -> "ServidorFake":
+        porta = multiprocessing.Value("i", 0)
+        pronto = multiprocessing.Event()
+        self._processo = multiprocessing.Process(target=_servir, args=(self.cenario, porta, pronto), daemon=True)
+        self._processo.start()
+        if not pronto.wait(timeout=10):
+            raise RuntimeError("Servidor fake não subiu em 10s")
+        self.url = f"http://127.0.0.1:{porta.value}"
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._processo is not None:
+            self._processo.terminate()
+            self._processo.join(timeout=5)
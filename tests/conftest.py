@@ -0,0 +1,14 @@
+import pytest
+
+import app.gcs_handler
+from app.config import Config
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """Bucket do backend em memória, novo a cada teste, com escrita em streaming."""
+    monkeypatch.setattr(Config, "STORAGE_BACKEND", "memoria")
+    monkeypatch.setattr(Config, "BUCKET_NAME", "teste")
+    monkeypatch.setattr(Config, "ESCRITA_EM_DISCO", False)
+    monkeypatch.setattr(app.gcs_handler, "_buckets", {})
+    return app.gcs_handler.obter_bucket("teste")
@@ -0,0 +1,114 @@
+import pytest
+
+from app.checkpoint import ExtracaoCheckpointada, particao_completa
+from app.config import Config
+from app.gcs_handler import GCSHandler
+from app.storage_backend import BucketMemoria
+from app.writer import FORMATOS, coletar_particoes
+
+CAMINHO = "raw/bling/pedidos_vendas/data_ref=2024-01-10/data.json"
+
+
+class FalhaNaApi(Exception):
+    pass
+
+
+def paginas(quantidade, alterada=None):
+    return [
+        [{"id": pagina * 10 + i, "versao": 2 if pagina == alterada else 1} for i in range(10)]
+        for pagina in range(quantidade)
+    ]
+
+
+def iterar(lista, falhar_em=None):
+    def iterar_paginas(cursor):
+        for indice in range(cursor - 1, len(lista)):
+            if indice == falhar_em:
+                raise FalhaNaApi(f"erro na página {indice + 1}")
+            yield lista[indice]
+    return iterar_paginas
+
+
+@pytest.fixture
+def enviados(bucket, monkeypatch):
+    """Nomes dos objetos publicados no bucket, na ordem."""
+    nomes = []
+    publicar = BucketMemoria._publicar
+
+    def registrar(self, nome, temporario, metadata):
+        nomes.append(nome)
+        return publicar(self, nome, temporario, metadata)
+
+    monkeypatch.setattr(BucketMemoria, "_publicar", registrar)
+    return nomes
+
+
+def extrair(bucket, lista, falhar_em=None):
+    extracao = ExtracaoCheckpointada(
+        GCSHandler(Config.BUCKET_NAME), bucket, "bling", "pedidos_vendas", "2024-01-10", CAMINHO,
+        formato=FORMATOS["ndjson"],
+    )
+    with coletar_particoes() as particoes:
+        total = extracao.executar(iterar(lista, falhar_em), inicio=1, passo=1, paginas_por_chunk=1)
+    return total, particoes
+
+
+def chunks_enviados(nomes):
+    return [nome.rsplit("/", 1)[1] for nome in nomes if "/chunk-" in nome]
+
+
+def ids_publicados(bucket):
+    return [registro["id"] for registro in FORMATOS["ndjson"].ler(bucket, CAMINHO)]
+
+
+def test_retomada_apos_falha_nao_duplica_registros(bucket, enviados):
+    with pytest.raises(FalhaNaApi):
+        extrair(bucket, paginas(5), falhar_em=3)
+    assert bucket.get_blob(CAMINHO) is None
+    enviados.clear()
+
+    total, _ = extrair(bucket, paginas(5))
+
+    assert total == 50
+    assert ids_publicados(bucket) == list(range(50))
+    assert chunks_enviados(enviados) == ["chunk-00003.json", "chunk-00004.json"]
+    assert particao_completa(GCSHandler(Config.BUCKET_NAME), "bling", "pedidos_vendas", "2024-01-10")
+
+
+def test_reexecucao_com_dados_iguais_nao_regrava(bucket, enviados):
+    extrair(bucket, paginas(4))
+    geracao = bucket.get_blob(CAMINHO).generation
+    enviados.clear()
+
+    total, particoes = extrair(bucket, paginas(4))
+
+    assert total == 40
+    assert particoes["inalteradas"] == [CAMINHO]
+    assert chunks_enviados(enviados) == []
+    assert bucket.get_blob(CAMINHO).generation == geracao
+
+
+def test_chunk_do_meio_alterado_regrava_os_seguintes(bucket, enviados):
+    extrair(bucket, paginas(4))
+    enviados.clear()
+
+    total, particoes = extrair(bucket, paginas(4, alterada=1))
+
+    assert total == 40
+    assert particoes["gravadas"] == [CAMINHO]
+    # O chunk 0 não é reenviado: o prefixo sai da partição publicada
+    assert sorted(chunks_enviados(enviados)) == [
+        "chunk-00001.json", "chunk-00002.json", "chunk-00003.json", "chunk-prefixo.json",
+    ]
+    assert [registro["versao"] for registro in FORMATOS["ndjson"].ler(bucket, CAMINHO)] == [1] * 10 + [2] * 10 + [1] * 20
+
+
+def test_resultado_menor_apaga_chunks_antigos(bucket, enviados):
+    extrair(bucket, paginas(5))
+
+    total, particoes = extrair(bucket, paginas(3))
+
+    assert total == 30
+    assert particoes["gravadas"] == [CAMINHO]
+    assert ids_publicados(bucket) == list(range(30))
+    assert [nome for nome in bucket.listar() if "/chunk-" in nome] == []
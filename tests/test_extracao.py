@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from app.anymarket.extract import ExtratorAnymarket
+from app.backfill import validar_endpoints
+from app.bling.extract import ExtratorBling
+from app.bling.products import IndiceProdutos
+from app.checkpoint import particao_completa
+from app.config import Config
+from app.gcs_handler import GCSHandler
+from app.rate_limiter import LimitadorTaxa
+
+
+class RespostaFake:
+    def __init__(self, status_code, itens=()):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = json.dumps({"data": list(itens)}).encode()
+        self.text = self.content.decode()
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+
+def pagina_cheia(numero):
+    return RespostaFake(200, [{"id": numero * 1000 + i} for i in range(ExtratorBling.LIMITE_POR_PAGINA)])
+
+
+@pytest.fixture
+def sem_limite(monkeypatch):
+    monkeypatch.setattr(Config, "MOTOR_EXTRACAO", "threads")
+    monkeypatch.setattr(Config, "ANYMARKET_CONCORRENCIA", 1)
+    monkeypatch.setattr(Config, "HTTP_CACHE_ATIVO", False)
+    return LimitadorTaxa("teste", taxa_maxima=1000.0)
+
+
+@pytest.mark.parametrize("checkpoint", [True, False])
+def test_bling_4xx_no_meio_da_paginacao_falha_sem_gravar_a_particao(bucket, monkeypatch, sem_limite, checkpoint):
+    monkeypatch.setattr(Config, "CHECKPOINT_ATIVO", checkpoint)
+    monkeypatch.setattr(Config, "CHECKPOINT_PAGINAS_POR_CHUNK", 1)
+    auth = mock.Mock()
+    auth.obter_token_valido.return_value = "token"
+    extrator = ExtratorBling(auth, GCSHandler(Config.BUCKET_NAME), "2024-01-10")
+    extrator.limitador = sem_limite
+    extrator.sessao = mock.Mock()
+    extrator.sessao.get.side_effect = [pagina_cheia(1), pagina_cheia(2), RespostaFake(403)]
+
+    with pytest.raises(RuntimeError, match="403"):
+        extrator._extrair_particao("pedidos/vendas", {}, "pedidos_vendas")
+
+    assert bucket.get_blob(extrator._caminho_particao("pedidos_vendas")) is None
+    assert not particao_completa(extrator.gcs, "bling", "pedidos_vendas", "2024-01-10")
+
+
+def test_anymarket_4xx_no_meio_da_paginacao_falha(bucket, monkeypatch, sem_limite):
+    monkeypatch.setattr(Config, "CHECKPOINT_ATIVO", False)
+    auth = mock.Mock()
+    auth.obter_cabecalhos.return_value = {}
+    extrator = ExtratorAnymarket(auth, GCSHandler(Config.BUCKET_NAME), "2024-01-10")
+    extrator.limitador = sem_limite
+    extrator.sessao = mock.Mock()
+    extrator.sessao.get.side_effect = [pagina_cheia(1), RespostaFake(404)]
+
+    with pytest.raises(RuntimeError, match="404"):
+        extrator.extrair_pedidos()
+
+    assert bucket.get_blob(extrator._caminho_particao("orders")) is None
+
+
+def test_produtos_anteriores_a_marca_dagua_falham_sem_consultar_a_api(bucket, sem_limite):
+    indice = IndiceProdutos(bucket, Config.CAMINHO_INDICE_PRODUTOS)
+    indice.marca_dagua = datetime(2024, 1, 20, 23, 59, 59)
+    indice.salvar()
+    extrator = ExtratorBling(mock.Mock(), GCSHandler(Config.BUCKET_NAME), "2024-01-10")
+    extrator.sessao = mock.Mock()
+
+    with pytest.raises(RuntimeError, match="marca d'água"):
+        extrator.extrair_produtos()
+
+    extrator.sessao.get.assert_not_called()
+
+
+def test_backfill_recusa_produtos():
+    with pytest.raises(ValueError, match="bling.produtos"):
+        validar_endpoints(["bling.vendas", "bling.produtos"])
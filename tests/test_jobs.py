@@ -0,0 +1,29 @@
+import threading
+import time
+
+from app.config import Config
+from app.jobs import GerenciadorJobs
+
+
+def test_batimento_mantem_job_longo_em_andamento(bucket, monkeypatch):
+    monkeypatch.setattr(Config, "JOB_BATIMENTO_S", 0.05)
+    monkeypatch.setattr(Config, "JOB_EXPIRACAO_S", 0.2)
+    liberar = threading.Event()
+    gerenciador = GerenciadorJobs(Config.BUCKET_NAME)
+
+    tarefas = {"bling.vendas": ("bling", lambda: liberar.wait() and 0)}
+
+    id_job, _ = gerenciador.enfileirar(["bling"], "2024-01-10", lambda: tarefas)
+    time.sleep(0.5)
+    estado = gerenciador.gcs.read_json(gerenciador._caminho_job(id_job))
+    liberar.set()
+    gerenciador.aguardar(id_job, timeout=5)
+
+    assert GerenciadorJobs._em_andamento(estado)
+
+
+def test_job_sem_batimento_expira(bucket, monkeypatch):
+    monkeypatch.setattr(Config, "JOB_EXPIRACAO_S", 0.2)
+    estado = {"status": "running", "atualizado_em": time.time() - 1}
+
+    assert not GerenciadorJobs._em_andamento(estado)
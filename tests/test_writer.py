@@ -0,0 +1,121 @@
+import gc
+from unittest import mock
+
+import pytest
+from google.cloud.storage.fileio import BlobWriter
+
+from app.bling.extract import ExtratorBling
+from app.config import Config
+from app.writer import FORMATOS, EscritorNDJSON, EscritorParticionado, ler_manifesto, salvar_registros
+
+
+class FalhaNaApi(Exception):
+    pass
+
+
+def registros_com_falha(quantidade):
+    for i in range(quantidade):
+        yield {"id": i, "descricao": "x" * 100}
+    raise FalhaNaApi("erro na página seguinte")
+
+
+@pytest.mark.parametrize("formato", ["ndjson", "ndjson.gz", "ndjson.zst"])
+def test_extracao_que_falha_no_meio_nao_publica_particao(bucket, monkeypatch, formato):
+    monkeypatch.setattr(Config, "CHECKPOINT_ATIVO", False)
+    monkeypatch.setattr(Config, "FORMATO_SAIDA_PADRAO", formato)
+    extrator = ExtratorBling(None, None, "2024-01-10")
+    monkeypatch.setattr(extrator, "_iterar_registros", lambda endpoint, parametros: registros_com_falha(50))
+
+    with pytest.raises(FalhaNaApi):
+        extrator._extrair_particao("pedidos/vendas", {}, "pedidos")
+    gc.collect()
+
+    assert bucket.get_blob(extrator._caminho_particao("pedidos")) is None
+    assert bucket.listar() == {}
+
+
+def test_abortar_cancela_sessao_resumivel_do_gcs(monkeypatch):
+    monkeypatch.setattr(Config, "ESCRITA_EM_DISCO", False)
+    upload = mock.Mock(resumable_url="https://storage.googleapis.com/upload/sessao")
+    transporte = mock.Mock()
+    blob = mock.Mock()
+    blob._initiate_resumable_upload.return_value = (upload, transporte)
+    blob.bucket.blob.return_value = blob
+    blob.open.side_effect = lambda *args, **kwargs: BlobWriter(blob, chunk_size=256 * 1024)
+
+    escritor = EscritorNDJSON(blob.bucket, "raw/pedidos/data_ref=2024-01-10/data.json", tamanho_chunk=256 * 1024)
+    for i in range(3000):
+        escritor.escrever({"id": i, "descricao": "x" * 100})
+    chunks_enviados = upload.transmit_next_chunk.call_count
+    assert chunks_enviados > 0
+
+    escritor.abortar()
+    gc.collect()
+
+    transporte.delete.assert_called_once_with(upload.resumable_url, timeout=Config.HTTP_TIMEOUT)
+    # O close() do BlobWriter não pode enviar o último chunk (que finalizaria o objeto)
+    assert upload.transmit_next_chunk.call_count == chunks_enviados
+
+
+def test_abortar_antes_do_primeiro_chunk_nao_inicia_sessao(monkeypatch):
+    monkeypatch.setattr(Config, "ESCRITA_EM_DISCO", False)
+    blob = mock.Mock()
+    blob.bucket.blob.return_value = blob
+    blob.open.side_effect = lambda *args, **kwargs: BlobWriter(blob, chunk_size=256 * 1024)
+
+    escritor = FORMATOS["ndjson"].criar_escritor(blob.bucket, "raw/pedidos/data_ref=2024-01-10/data.json")
+    escritor.escrever({"id": 1})
+    escritor.abortar()
+    gc.collect()
+
+    blob._initiate_resumable_upload.assert_not_called()
+
+
+@pytest.mark.parametrize("registros", [
+    pytest.param([{"id": 1, "extra": {}}, {"id": 2, "extra": {}}], id="struct-vazio"),
+    pytest.param([{"id": 1, "valor": 10}, {"id": 2, "valor": "10,5"}], id="int-str-no-lote"),
+    pytest.param([{"id": 1, "valor": 10}, {"id": 2, "valor": 11}, {"id": 3, "valor": "dez"}], id="int-str-entre-lotes"),
+    pytest.param([{"id": 1, "contato": {"nome": "A"}}, {"id": 2, "contato": "A"}], id="dict-str"),
+])
+def test_parquet_com_tipos_conflitantes_grava_texto_json(bucket, monkeypatch, registros):
+    monkeypatch.setattr(Config, "PARQUET_LINHAS_POR_GRUPO", 2)
+    caminho = "raw/pedidos/data_ref=2024-01-10/data.parquet"
+
+    assert salvar_registros(bucket, caminho, registros, formato=FORMATOS["parquet"]) == len(registros)
+
+    assert list(FORMATOS["parquet"].ler(bucket, caminho)) == registros
+
+
+def test_comparar_sem_escrita_em_disco_cancela_upload_de_conteudo_igual(bucket, monkeypatch):
+    caminho = "raw/pedidos/data_ref=2024-01-10/data.json"
+    registros = [{"id": i, "descricao": "x" * 100} for i in range(100)]
+    escritor = EscritorNDJSON(bucket, caminho)
+    escritor.escrever_todos(registros)
+    escritor.fechar()
+    geracao = bucket.get_blob(caminho).generation
+    monkeypatch.setattr("app.writer.arquivo_temporario", mock.Mock(side_effect=AssertionError("spool")))
+
+    igual = EscritorNDJSON(bucket, caminho, comparar=True)
+    igual.escrever_todos(registros)
+    igual.fechar()
+    assert igual.inalterado
+    assert bucket.get_blob(caminho).generation == geracao
+
+    diferente = EscritorNDJSON(bucket, caminho, comparar=True)
+    diferente.escrever_todos(registros[:-1])
+    diferente.fechar()
+    assert not diferente.inalterado
+    assert bucket.get_blob(caminho).generation != geracao
+    assert bucket.get_blob(caminho).metadata == {"num_registros": "99"}
+
+
+def test_partes_ndjson_sobem_sem_temporario(bucket, monkeypatch):
+    monkeypatch.setattr(Config, "PARTE_MAX_REGISTROS", 40)
+    monkeypatch.setattr("app.writer.arquivo_temporario", mock.Mock(side_effect=AssertionError("spool")))
+    pasta = "raw/pedidos/data_ref=2024-01-10"
+
+    escritor = EscritorParticionado(bucket, f"{pasta}/data.json", FORMATOS["ndjson"])
+    escritor.escrever_todos({"id": i} for i in range(100))
+    escritor.fechar()
+
+    assert [parte["num_registros"] for parte in ler_manifesto(bucket, pasta)["partes"]] == [40, 40, 20]